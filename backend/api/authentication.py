@@ -0,0 +1,250 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat
+from django.db.models.fields.files import FieldFile
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from recipes.models import VersionStamp
+from recipes.versions import AUTH_VERSION, auth_version_key
+
+User = get_user_model()
+
+TOKEN_AUTH_CACHE_TTL = getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 60)
+TOKEN_AUTH_CACHE_MAX_SIZE = getattr(settings, 'TOKEN_AUTH_CACHE_MAX_SIZE', 10000)
+TOKEN_AUTH_SHARED_CACHE = getattr(settings, 'TOKEN_AUTH_SHARED_CACHE', False)
+# Как часто процесс сверяет версии; столько же в худшем случае
+# отозванный токен продолжает работать в других процессах
+TOKEN_AUTH_VERSION_CHECK_INTERVAL = getattr(
+    settings, 'TOKEN_AUTH_VERSION_CHECK_INTERVAL', 1
+)
+SHARED_CACHE_PREFIX = 'auth:token:'
+
+
+def _shared_cache_key(token_key):
+    return SHARED_CACHE_PREFIX + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _user_snapshot(user):
+    values = []
+    for field in User._meta.concrete_fields:
+        value = getattr(user, field.attname)
+        if isinstance(value, FieldFile):
+            value = value.name
+        values.append(value)
+    return tuple(values)
+
+
+def _restore_user(snapshot):
+    field_names = [field.attname for field in User._meta.concrete_fields]
+    return User.from_db(DEFAULT_DB_ALIAS, field_names, snapshot)
+
+
+def _version_subquery(key):
+    return Subquery(
+        VersionStamp.objects.filter(key=key).values('version')[:1]
+    )
+
+
+def _auth_versions(user_ids):
+    # Читается из основной БД: на реплике отзыв мог еще не появиться
+    keys = [AUTH_VERSION, *[auth_version_key(user_id) for user_id in user_ids]]
+    stored_versions = dict(
+        VersionStamp.objects.using(DEFAULT_DB_ALIAS).filter(key__in=keys)
+        .values_list('key', 'version')
+    )
+    return stored_versions.get(AUTH_VERSION, 0), {
+        user_id: stored_versions.get(auth_version_key(user_id), 0)
+        for user_id in user_ids
+    }
+
+
+class TokenSnapshotCache:
+    # Ограниченный LRU-кэш «токен → снимок пользователя» с временем жизни.
+    # Каждый запрос получает новый объект User, собранный из снимка.
+    # Кэш у каждого процесса свой, поэтому выход, смена пароля и изменение
+    # пользователя повышают его версию auth:<id>. Раз в
+    # TOKEN_AUTH_VERSION_CHECK_INTERVAL процесс сверяет версии только тех
+    # пользователей, что есть в кэше, и сбрасывает токены изменившихся.
+    # Повышение общей AUTH_VERSION очищает кэш целиком.
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._user_versions = {}
+        self._version = None
+        self._checked_at = None
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < TOKEN_AUTH_VERSION_CHECK_INTERVAL
+        ):
+            return
+        with self._lock:
+            user_ids = list(self._user_versions)
+            if not user_ids:
+                # В пустом кэше нечего сбрасывать; общую версию примет
+                # первая сохраненная запись
+                self._checked_at = now
+                return
+        version, user_versions = _auth_versions(user_ids)
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+                self._keys_by_user.clear()
+                self._user_versions.clear()
+                return
+            for user_id, user_version in user_versions.items():
+                known_version = self._user_versions.get(user_id)
+                if known_version not in (None, user_version):
+                    self._discard_user(user_id)
+
+    def get(self, token_key):
+        self._sync_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token_key)
+            if entry is not None:
+                expires_at, user_id, snapshot = entry
+                if expires_at > now:
+                    self._entries.move_to_end(token_key)
+                    return snapshot
+                self._discard(token_key)
+
+        if TOKEN_AUTH_SHARED_CACHE:
+            shared_entry = cache.get(_shared_cache_key(token_key))
+            if shared_entry is not None:
+                self._store(token_key, *shared_entry)
+                return shared_entry[1]
+        return None
+
+    def set(self, token_key, user_id, snapshot, version, user_version):
+        # version и user_version прочитаны тем же запросом, что и снимок:
+        # снимок до массового сброса не сохраняется, а до изменения
+        # пользователя - сбросится при следующей сверке версий
+        self._store(token_key, user_id, snapshot, version, user_version)
+        if TOKEN_AUTH_SHARED_CACHE:
+            cache.set(
+                _shared_cache_key(token_key),
+                (user_id, snapshot, version, user_version),
+                self.ttl
+            )
+
+    def _store(self, token_key, user_id, snapshot, version, user_version):
+        with self._lock:
+            if not self._entries:
+                self._version = version
+            if version != self._version:
+                return
+            known_version = self._user_versions.get(user_id)
+            if known_version is not None and known_version != user_version:
+                # Сохраненные токены пользователя и новый снимок прочитаны
+                # при разных версиях; какой из них устарел, решит сверка
+                self._discard_user(user_id)
+                return
+            self._discard(token_key)
+            self._entries[token_key] = (
+                time.monotonic() + self.ttl, user_id, snapshot
+            )
+            self._keys_by_user.setdefault(user_id, set()).add(token_key)
+            self._user_versions[user_id] = user_version
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, token_key):
+        entry = self._entries.pop(token_key, None)
+        if entry is None:
+            return
+        user_keys = self._keys_by_user.get(entry[1])
+        if user_keys is not None:
+            user_keys.discard(token_key)
+            if not user_keys:
+                del self._keys_by_user[entry[1]]
+                self._user_versions.pop(entry[1], None)
+
+    def _discard_user(self, user_id):
+        for token_key in set(self._keys_by_user.get(user_id, ())):
+            self._discard(token_key)
+
+    def invalidate_token(self, token_key):
+        with self._lock:
+            self._discard(token_key)
+        if TOKEN_AUTH_SHARED_CACHE:
+            cache.delete(_shared_cache_key(token_key))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            token_keys = set(self._keys_by_user.get(user_id, ()))
+            self._discard_user(user_id)
+        if TOKEN_AUTH_SHARED_CACHE:
+            token_keys.update(
+                Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+            )
+            cache.delete_many([_shared_cache_key(key) for key in token_keys])
+
+
+token_cache = TokenSnapshotCache(TOKEN_AUTH_CACHE_TTL, TOKEN_AUTH_CACHE_MAX_SIZE)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Вместо запроса к authtoken_token на каждый запрос пользователь берется
+    # из кэша. Кэш сбрасывается сигналами из api.signals.
+
+    def authenticate_credentials(self, key):
+        snapshot = token_cache.get(key)
+        if snapshot is not None:
+            user = _restore_user(snapshot)
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.')
+                )
+            # База задается заранее: присваивание user несохраненному
+            # объекту иначе спрашивает роутер о записи и закрепляет запрос
+            # за основной БД
+            token = Token(key=key)
+            token._state.db = DEFAULT_DB_ALIAS
+            token._state.adding = False
+            token.user = user
+            return user, token
+
+        # Промах читается из основной БД одним запросом вместе с версиями,
+        # чтобы снимок и версии относились к одному состоянию
+        try:
+            token = Token.objects.using(DEFAULT_DB_ALIAS).select_related(
+                'user'
+            ).annotate(
+                auth_version=_version_subquery(AUTH_VERSION),
+                user_auth_version=_version_subquery(Concat(
+                    Value(auth_version_key('')),
+                    Cast(OuterRef('user_id'), CharField())
+                )),
+            ).get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        token_cache.set(
+            key, user.id, _user_snapshot(user),
+            token.auth_version or 0, token.user_auth_version or 0
+        )
+        return user, token
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_REQUESTS = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+BATCH_MAX_WORKERS = getattr(settings, 'BATCH_MAX_WORKERS', 4)
+# Подзапросы разрешаются по синхронному urlconf и под ASGI: асинхронные
+# представления foodgram.urls_asgi вернули бы корутину
+BATCH_URLCONF = getattr(settings, 'BATCH_URLCONF', 'foodgram.urls')
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+BATCH_RESPONSE_HEADERS = ('Location', 'ETag', 'Last-Modified', 'Retry-After')
+# Аутентификация общая для всего пакета, тело подзапроса всегда JSON
+BATCH_FORBIDDEN_HEADERS = (
+    'HTTP_AUTHORIZATION', 'HTTP_COOKIE', 'CONTENT_TYPE', 'CONTENT_LENGTH'
+)
+# Заголовки самого пакета, которые не относятся к подзапросам
+BATCH_DROPPED_HEADERS = (
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_X_PROFILE',
+    'HTTP_CONTENT_ENCODING', 'wsgi.input',
+)
+
+
+def _header_key(name):
+    key = name.upper().replace('-', '_')
+    return key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{key}'
+
+
+def build_subrequest(request, item):
+    parts = urlsplit(item['url'])
+    subrequest = HttpRequest()
+    subrequest.method = item['method']
+    subrequest.path = subrequest.path_info = parts.path
+    subrequest.GET = QueryDict(parts.query)
+
+    meta = {
+        key: value for key, value in request.META.items()
+        if key not in BATCH_FORBIDDEN_HEADERS
+        and key not in BATCH_DROPPED_HEADERS
+    }
+    meta.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'HTTP_ACCEPT': 'application/json',
+    })
+    for name, value in item['headers'].items():
+        key = _header_key(name)
+        if key not in BATCH_FORBIDDEN_HEADERS:
+            meta[key] = value
+    subrequest.META = meta
+
+    body = b''
+    if item['body'] is not None:
+        body = json.dumps(item['body'], ensure_ascii=False).encode()
+        meta['CONTENT_TYPE'] = 'application/json'
+    meta['CONTENT_LENGTH'] = str(len(body))
+    subrequest._body = body
+    subrequest._read_started = True
+
+    # Пользователь уже определен при разборе пакета: подзапросы не
+    # повторяют проверку токена
+    subrequest.user = request.user
+    if request.user.is_authenticated:
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def _result(item, status_code):
+    result = {}
+    if item.get('id') is not None:
+        result['id'] = item['id']
+    result['status'] = status_code
+    return result
+
+
+def _response_body(response):
+    if isinstance(response, Response):
+        return response.data
+    if response.streaming or not response.content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return None
+
+
+def collect_response(item, response):
+    result = _result(item, response.status_code)
+    headers = {
+        name: response[name] for name in BATCH_RESPONSE_HEADERS
+        if response.has_header(name)
+    }
+    if headers:
+        result['headers'] = headers
+    result['body'] = _response_body(response)
+    if result['body'] is None and response.streaming:
+        result['body'] = {'errors': 'Потоковый ответ нельзя получить в пакете'}
+    if hasattr(response, 'close'):
+        response.close()
+    return result
+
+
+def _error(item, status_code, message):
+    result = _result(item, status_code)
+    result['body'] = {'errors': message}
+    return result
+
+
+def run_subrequest(request, item):
+    path = urlsplit(item['url']).path
+    try:
+        match = resolve(path, urlconf=BATCH_URLCONF)
+    except Resolver404:
+        return _error(item, 404, 'Страница не найдена')
+    if match.view_name == request.resolver_match.view_name:
+        return _error(item, 400, 'Вложенные пакеты не поддерживаются')
+    if asyncio.iscoroutinefunction(match.func):
+        return _error(
+            item, 400, 'Асинхронные представления не поддерживаются в пакете'
+        )
+
+    subrequest = build_subrequest(request, item)
+    subrequest.resolver_match = match
+    try:
+        response = match.func(subrequest, *match.args, **match.kwargs)
+    except Exception as exc:
+        logger.error(f"Error in batch subrequest {item['method']} {path}: {exc}")
+        return _error(item, 500, 'Внутренняя ошибка сервера')
+    return collect_response(item, response)
+
+
+def _run_in_thread(request, item):
+    try:
+        return run_subrequest(request, item)
+    finally:
+        connections.close_all()
+
+
+def run_batch(request, items, parallel=False):
+    # Подряд идущие GET независимы и при parallel выполняются в потоках;
+    # запросы на запись выполняются по порядку и разделяют такие группы
+    results = [None] * len(items)
+    pending = []
+
+    def flush():
+        concurrent = (
+            parallel and len(pending) > 1
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        )
+        if concurrent:
+            workers = min(BATCH_MAX_WORKERS, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # Контекст копируется для каждого потока, чтобы подзапросы
+                # читали с той же реплики, что и весь пакет
+                futures = [
+                    (index, executor.submit(
+                        copy_context().run, _run_in_thread,
+                        request, items[index]
+                    ))
+                    for index in pending
+                ]
+                for index, future in futures:
+                    results[index] = future.result()
+        else:
+            for index in pending:
+                results[index] = run_subrequest(request, items[index])
+        pending.clear()
+
+    for index, item in enumerate(items):
+        if item['method'] == 'GET':
+            pending.append(index)
+            continue
+        flush()
+        results[index] = run_subrequest(request, item)
+    flush()
+    return results
@@ -0,0 +1,166 @@
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import recipes_created
+from .serializers.recipes import RecipeImportSerializer
+
+logger = logging.getLogger(__name__)
+
+BULK_IMPORT_MAX_ROWS = getattr(settings, 'BULK_IMPORT_MAX_ROWS', 500)
+BULK_IMPORT_BATCH_SIZE = 1000
+
+
+def validate_rows(rows):
+    valid_rows = []
+    errors = []
+    for row_number, row in rows:
+        serializer = RecipeImportSerializer(data=row)
+        if serializer.is_valid():
+            valid_rows.append((row_number, serializer.validated_data))
+        else:
+            errors.append({'row': row_number, 'errors': serializer.errors})
+
+    tag_ids = {tag_id for _, data in valid_rows for tag_id in data['tags']}
+    ingredient_ids = {
+        item['id'] for _, data in valid_rows for item in data['ingredients']
+    }
+    known_tags = set(
+        Tag.objects.filter(id__in=tag_ids).values_list('id', flat=True)
+    ) if tag_ids else set()
+    known_ingredients = set(
+        Ingredient.objects.filter(
+            id__in=ingredient_ids
+        ).values_list('id', flat=True)
+    ) if ingredient_ids else set()
+
+    checked_rows = []
+    for row_number, data in valid_rows:
+        row_errors = {}
+        missing_tags = [
+            tag_id for tag_id in data['tags'] if tag_id not in known_tags
+        ]
+        if missing_tags:
+            row_errors['tags'] = [f'Несуществующие теги: {missing_tags}']
+        missing_ingredients = [
+            item['id'] for item in data['ingredients']
+            if item['id'] not in known_ingredients
+        ]
+        if missing_ingredients:
+            row_errors['ingredients'] = [
+                f'Несуществующие ингредиенты: {missing_ingredients}'
+            ]
+        if row_errors:
+            errors.append({'row': row_number, 'errors': row_errors})
+        else:
+            checked_rows.append((row_number, data))
+    return checked_rows, errors
+
+
+def _bulk_create_recipes(recipes):
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes, batch_size=BULK_IMPORT_BATCH_SIZE)
+        return
+    # Django 3.2 не возвращает id из bulk_create на SQLite. Внутри
+    # транзакции SQLite пишет один процесс, поэтому id идут подряд.
+    Recipe.objects.bulk_create(recipes, batch_size=BULK_IMPORT_BATCH_SIZE)
+    last_id = Recipe.objects.aggregate(last_id=Max('id'))['last_id']
+    first_id = last_id - len(recipes) + 1
+    for offset, recipe in enumerate(recipes):
+        recipe.id = first_id + offset
+        recipe._state.adding = False
+
+
+def save_images(checked_rows):
+    image_field = Recipe._meta.get_field('image')
+    return [
+        image_field.storage.save(
+            image_field.generate_filename(None, data['image'].name),
+            data['image']
+        )
+        for _, data in checked_rows
+    ]
+
+
+def delete_images(image_names):
+    storage = Recipe._meta.get_field('image').storage
+    for image_name in image_names:
+        try:
+            storage.delete(image_name)
+        except OSError as exc:
+            logger.error(f"Error deleting image {image_name}: {exc}")
+
+
+@transaction.atomic
+def insert_rows(author, checked_rows, image_names):
+    recipes = [
+        Recipe(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            image=image_name,
+        )
+        for (_, data), image_name in zip(checked_rows, image_names)
+    ]
+    _bulk_create_recipes(recipes)
+
+    tag_links = []
+    recipe_ingredients = []
+    index_updates = {}
+    for recipe, (_, data) in zip(recipes, checked_rows):
+        tag_links.extend(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for tag_id in data['tags']
+        )
+        recipe_ingredients.extend(
+            RecipeIngredient(
+                recipe_id=recipe.id,
+                ingredient_id=item['id'],
+                amount=item['amount']
+            )
+            for item in data['ingredients']
+        )
+        index_updates[recipe.id] = [item['id'] for item in data['ingredients']]
+    Recipe.tags.through.objects.bulk_create(
+        tag_links, batch_size=BULK_IMPORT_BATCH_SIZE
+    )
+    RecipeIngredient.objects.bulk_create(
+        recipe_ingredients, batch_size=BULK_IMPORT_BATCH_SIZE
+    )
+
+    # bulk_create не отправляет сигналы сохранения
+    recipes_created.send(
+        sender=Recipe,
+        recipe_ids=[recipe.id for recipe in recipes],
+        ingredient_ids=index_updates
+    )
+    return recipes
+
+
+def import_recipes(author, rows):
+    checked_rows, errors = validate_rows(rows)
+    created = []
+    if checked_rows:
+        # Файлы пишутся до транзакции и удаляются, если она не удалась
+        image_names = save_images(checked_rows)
+        try:
+            recipes = insert_rows(author, checked_rows, image_names)
+        except Exception:
+            delete_images(image_names)
+            raise
+        created = [
+            {'row': row_number, 'id': recipe.id}
+            for recipe, (row_number, _) in zip(recipes, checked_rows)
+        ]
+    logger.info(
+        f"Bulk import for user {author.id}: "
+        f"created {len(created)}, rejected {len(errors)}"
+    )
+    return {
+        'created': created,
+        'errors': sorted(errors, key=lambda error: error['row']),
+    }
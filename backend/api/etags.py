@@ -0,0 +1,75 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.cache_purge import SURROGATE_KEY_HEADER
+from recipes.versions import get_versions, user_version_keys
+
+VARY_HEADERS = ('Accept', 'Authorization')
+# Сколько nginx хранит анонимный ответ; раньше срока его удаляет очистка
+# по суррогатным ключам
+SURROGATE_CACHE_TTL = getattr(settings, 'SURROGATE_CACHE_TTL', 3600)
+
+
+def compute_etag(request, version_keys):
+    # ETag строится только из счетчиков версий и параметров запроса,
+    # поэтому его можно проверить, не формируя тело ответа.
+    version_keys = list(version_keys) + user_version_keys(request.user)
+    versions = get_versions(*version_keys)
+    user_id = request.user.id if request.user.is_authenticated else 'anon'
+    etag_source = '|'.join([
+        request.build_absolute_uri(),
+        request.META.get('HTTP_ACCEPT', ''),
+        str(user_id),
+        *[f'{key}={version}' for key, version in zip(version_keys, versions)],
+    ])
+    return 'W/"%s"' % hashlib.sha1(etag_source.encode()).hexdigest()
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def is_not_modified(request, etag, exists=True):
+    # «*» совпадает с любой версией существующего ресурса, поэтому до
+    # проверки существования (exists=False) учитываются только сами ETag
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    client_etags = parse_etags(if_none_match)
+    if '*' in client_etags:
+        return exists
+    return _strip_weak(etag) in {_strip_weak(tag) for tag in client_etags}
+
+
+def patch_conditional_headers(request, response, etag):
+    response['ETag'] = etag
+    patch_vary_headers(response, VARY_HEADERS)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def not_modified_response(request, etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    return patch_conditional_headers(request, response, etag)
+
+
+def patch_surrogate_headers(response, keys):
+    # Вызывается только для ответов, одинаковых для всех анонимных
+    # посетителей; запросы с токеном nginx в кэш не пускает
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    response[SURROGATE_KEY_HEADER] = ' '.join(dict.fromkeys(keys))
+    response['X-Accel-Expires'] = str(SURROGATE_CACHE_TTL)
+    if not response.has_header('Cache-Control'):
+        patch_cache_control(
+            response, public=True, max_age=0, must_revalidate=True
+        )
+    return response
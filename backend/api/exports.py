@@ -0,0 +1,160 @@
+import json
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Subscription, Tag)
+from .renderers import encode_default, orjson
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 500)
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def dumps_line(record):
+    if orjson is not None:
+        return orjson.dumps(
+            record, default=encode_default, option=orjson.OPT_APPEND_NEWLINE
+        )
+    return (
+        json.dumps(record, ensure_ascii=False, default=encode_default) + '\n'
+    ).encode()
+
+
+@contextmanager
+def export_snapshot(using=DEFAULT_DB_ALIAS):
+    # Вся выгрузка читается в одной транзакции: на PostgreSQL это снимок
+    # REPEATABLE READ, и подзапросы по чанкам видят те же данные, что и курсор
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY'
+                )
+        yield
+
+
+def iter_chunks(queryset, chunk_size):
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def recipe_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # iterator() в Django 3.2 игнорирует prefetch_related, поэтому связи
+    # подгружаются отдельно для каждого чанка
+    queryset = queryset.select_related('author').order_by('id')
+    ingredients_prefetch = Prefetch(
+        'recipe_ingredients',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    )
+    for chunk in iter_chunks(queryset, chunk_size):
+        prefetch_related_objects(chunk, 'tags', ingredients_prefetch)
+        for recipe in chunk:
+            yield {
+                'type': 'recipe',
+                'id': recipe.id,
+                'author': recipe.author_id,
+                'author_username': recipe.author.username,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'pub_date': recipe.pub_date,
+                'image': recipe.image.url if recipe.image else None,
+                'tags': [tag.slug for tag in recipe.tags.all()],
+                'ingredients': [
+                    {
+                        'id': item.ingredient_id,
+                        'name': item.ingredient.name,
+                        'measurement_unit': item.ingredient.measurement_unit,
+                        'amount': item.amount,
+                    }
+                    for item in recipe.recipe_ingredients.all()
+                ],
+            }
+
+
+def relation_records(record_type, model, user, chunk_size=EXPORT_CHUNK_SIZE):
+    rows = model.objects.filter(user=user).order_by('id').values_list(
+        'recipe_id', 'recipe__name', 'created_at'
+    )
+    for recipe_id, recipe_name, created_at in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        yield {
+            'type': record_type,
+            'recipe': recipe_id,
+            'recipe_name': recipe_name,
+            'created_at': created_at,
+        }
+
+
+def user_records(user, chunk_size=EXPORT_CHUNK_SIZE):
+    yield {
+        'type': 'user',
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'avatar': user.avatar.url if user.avatar else None,
+    }
+    yield from recipe_records(
+        Recipe.objects.filter(author=user), chunk_size
+    )
+    yield from relation_records('favorite', Favorite, user, chunk_size)
+    yield from relation_records(
+        'shopping_cart', ShoppingCart, user, chunk_size
+    )
+    subscriptions = Subscription.objects.filter(user=user).order_by(
+        'id'
+    ).values_list('author_id', 'author__username')
+    for author_id, author_username in subscriptions.iterator(
+        chunk_size=chunk_size
+    ):
+        yield {
+            'type': 'subscription',
+            'author': author_id,
+            'author_username': author_username,
+        }
+
+
+def catalog_records(author_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    if author_id is None:
+        for tag in Tag.objects.order_by('id').values(
+            'id', 'name', 'color', 'slug'
+        ):
+            yield {'type': 'tag', **tag}
+        ingredients = Ingredient.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit'
+        )
+        for ingredient in ingredients.iterator(chunk_size=chunk_size):
+            yield {'type': 'ingredient', **ingredient}
+        recipes = Recipe.objects.all()
+    else:
+        recipes = Recipe.objects.filter(author_id=author_id)
+    yield from recipe_records(recipes, chunk_size)
+
+
+def stream_ndjson(records):
+    with export_snapshot():
+        for record in records:
+            yield dumps_line(record)
+
+
+def ndjson_response(records, filename):
+    response = StreamingHttpResponse(
+        stream_ndjson(records), content_type=NDJSON_CONTENT_TYPE
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
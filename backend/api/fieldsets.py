@@ -0,0 +1,108 @@
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _split_param(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class FieldSelection:
+    # fields=None - набор полей по умолчанию, в котором все связи
+    # раскрыты, как и раньше. С ?fields= выводятся только перечисленные
+    # поля, а связи - в компактном виде, если их нет в ?expand=
+
+    def __init__(self, fields=None, expand=()):
+        self.fields = fields
+        self.expand = set(expand)
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None:
+            return cls()
+        fields = request.query_params.get(FIELDS_PARAM)
+        return cls(
+            _split_param(fields) if fields is not None else None,
+            _split_param(request.query_params.get(EXPAND_PARAM, ''))
+        )
+
+
+class SparseFieldsetMixin:
+    # optional_fields выводятся только по ?expand=, compact_fields задают
+    # компактное представление связи, когда она не раскрыта
+    optional_fields = ()
+    compact_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self._context.get('all_fields'):
+            return
+        selection = self._context.get('field_selection', FieldSelection())
+        names, expanded = self.resolve_selection(selection)
+        for name in list(self.fields):
+            if name not in names:
+                self.fields.pop(name)
+            elif name not in expanded and name in self.compact_fields:
+                self.fields[name] = self.compact_fields[name]()
+
+    @classmethod
+    def available_fields(cls):
+        if '_available_fields' not in cls.__dict__:
+            cls._available_fields = tuple(
+                cls(context={'all_fields': True}).fields
+            )
+        return cls._available_fields
+
+    @classmethod
+    def resolve_selection(cls, selection):
+        available = cls.available_fields()
+        requested = (selection.fields or set()) | selection.expand
+        unknown = requested - set(available)
+        if unknown:
+            raise serializers.ValidationError({
+                FIELDS_PARAM: [
+                    f'Неизвестные поля: {", ".join(sorted(unknown))}'
+                ]
+            })
+        if selection.fields is None:
+            names = {
+                name for name in available
+                if name not in cls.optional_fields or name in selection.expand
+            }
+            return names, names
+        return requested, selection.expand
+
+    @classmethod
+    def setup_queryset(cls, queryset, names, expanded, user):
+        return queryset
+
+
+class SparseFieldsetViewMixin:
+    # Выбор полей разбирается один раз на запрос; по нему и сериализатор
+    # обрезает вывод, и queryset отказывается от лишних JOIN и подзапросов
+
+    def get_field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            selection = FieldSelection.from_request(self.request)
+            self._field_selection = (
+                selection,
+                self.get_serializer_class().resolve_selection(selection),
+            )
+        return self._field_selection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, SparseFieldsetMixin):
+            context['field_selection'], _ = self.get_field_selection()
+        return context
+
+    def setup_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetMixin):
+            return queryset
+        _, (names, expanded) = self.get_field_selection()
+        return serializer_class.setup_queryset(
+            queryset, names, expanded, self.request.user
+        )
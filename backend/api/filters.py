@@ -1,20 +1,38 @@
 import django_filters as filters
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import (Case, Count, F, FloatField, IntegerField, Q,
+                              When)
+from django.db.models.functions import Cast
 from rest_framework.filters import SearchFilter
 
+from recipes.ingredient_index import ingredient_index
+from recipes.ingredient_search import fuzzy_search
 from recipes.models import Recipe, Tag, Ingredient
 
+INGREDIENT_SEARCH_LIMIT = getattr(settings, 'INGREDIENT_SEARCH_LIMIT', 500)
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(method='filter_name')
+    fuzzy = filters.NumberFilter(method='filter_fuzzy')
     
     def filter_name(self, queryset, name, value):
+        # ?fuzzy=1: префиксные совпадения, затем похожие по триграммам
+        if self.form.cleaned_data.get('fuzzy') == 1:
+            return fuzzy_search(queryset, value)
         filtered_qs = queryset.filter(name__istartswith=value)
         return filtered_qs
 
+    def filter_fuzzy(self, queryset, name, value):
+        return queryset
+
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'fuzzy')
 
 
 class RecipeFilter(filters.FilterSet):
@@ -28,10 +46,13 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
     author = filters.NumberFilter(field_name='author__id')
+    have_ingredients = NumberInFilter(method='filter_have_ingredients')
+    max_missing = filters.NumberFilter(method='filter_max_missing', min_value=0)
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'have_ingredients', 'max_missing')
 
     def filter_is_favorited(self, queryset, name, value):
         current_user = self.request.user
@@ -47,4 +68,49 @@ class RecipeFilter(filters.FilterSet):
         if value == 1 and user_authenticated:
             filtered = queryset.filter(in_shopping_cart__user=current_user)
             return filtered
-        return queryset
\ No newline at end of file
+        return queryset
+
+    def filter_have_ingredients(self, queryset, name, value):
+        max_missing = self.form.cleaned_data.get('max_missing')
+        if max_missing is not None:
+            max_missing = int(max_missing)
+        ingredient_ids = [int(ingredient_id) for ingredient_id in value]
+        ranked = ingredient_index.search(
+            ingredient_ids,
+            max_missing=max_missing,
+            limit=INGREDIENT_SEARCH_LIMIT
+        )
+        if ranked is None:
+            return self.rank_in_database(queryset, ingredient_ids, max_missing)
+        ranked_ids = [recipe_id for recipe_id, _ in ranked]
+        if not ranked_ids:
+            return queryset.none()
+
+        ranking = Case(
+            *[When(id=recipe_id, then=rank)
+              for rank, recipe_id in enumerate(ranked_ids)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(id__in=ranked_ids).order_by(ranking)
+
+    def rank_in_database(self, queryset, ingredient_ids, max_missing):
+        # Пока индекс собирается в фоне, тот же рейтинг считает база
+        queryset = queryset.annotate(
+            matched_count=Count(
+                'recipe_ingredients',
+                filter=Q(recipe_ingredients__ingredient_id__in=ingredient_ids),
+                distinct=True
+            ),
+            ingredients_count=Count('recipe_ingredients', distinct=True),
+        ).filter(matched_count__gt=0)
+        if max_missing is not None:
+            queryset = queryset.filter(
+                ingredients_count__lte=F('matched_count') + max_missing
+            )
+        return queryset.annotate(
+            coverage=Cast('matched_count', FloatField())
+            / Cast('ingredients_count', FloatField())
+        ).order_by('-coverage', '-matched_count', '-id')
+
+    def filter_max_missing(self, queryset, name, value):
+        return queryset
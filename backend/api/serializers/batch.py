@@ -0,0 +1,37 @@
+from urllib.parse import urlsplit
+
+from rest_framework import serializers
+
+from api.batch import BATCH_MAX_REQUESTS, BATCH_METHODS
+
+
+class BatchItemSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False, max_length=64)
+    method = serializers.ChoiceField(choices=BATCH_METHODS, default='GET')
+    url = serializers.CharField(max_length=2048)
+    headers = serializers.DictField(
+        child=serializers.CharField(), required=False, default=dict
+    )
+    body = serializers.JSONField(required=False, default=None)
+
+    def validate_url(self, value):
+        parts = urlsplit(value)
+        if parts.scheme or parts.netloc or not parts.path.startswith('/api/'):
+            raise serializers.ValidationError(
+                'Допускаются только относительные адреса /api/'
+            )
+        return value
+
+    def validate(self, data):
+        if data['method'] == 'GET' and data['body'] is not None:
+            raise serializers.ValidationError(
+                {'body': 'У GET-запроса не может быть тела'}
+            )
+        return data
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(
+        many=True, allow_empty=False, max_length=BATCH_MAX_REQUESTS
+    )
+    parallel = serializers.BooleanField(default=False)
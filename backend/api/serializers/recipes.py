@@ -1,12 +1,15 @@
 from rest_framework import serializers
 from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
 import base64
 from django.core.files.base import ContentFile
 import logging
 
 from recipes.models import (Recipe, Tag, Ingredient, 
                           RecipeIngredient, Favorite,
-                          ShoppingCart, User)
+                          ShoppingCart, Subscription, User)
+from recipes.ingredient_index import ingredient_index
+from api.fieldsets import SparseFieldsetMixin
 from api.serializers.users import UserSerializer
 
 logger = logging.getLogger(__name__)
@@ -39,6 +42,14 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class RecipeIngredientCompactSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient_id')
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'amount')
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
@@ -105,31 +116,76 @@ class RecipeSerializer(serializers.ModelSerializer):
         return None
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients',
         many=True,
         read_only=True
     )
+    tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = serializers.SerializerMethodField()
 
+    # Теги выводятся только по ?expand=tags
+    optional_fields = ('tags',)
+    compact_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'ingredients': lambda: RecipeIngredientCompactSerializer(
+            source='recipe_ingredients', many=True, read_only=True
+        ),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True
+        ),
+    }
+
     class Meta:
         model = Recipe
-        fields = ('id', 'author', 'ingredients',
+        fields = ('id', 'author', 'ingredients', 'tags',
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
-    
+
+    @classmethod
+    def setup_queryset(cls, queryset, names, expanded, user):
+        if 'author' in expanded:
+            queryset = queryset.select_related('author')
+            if user.is_authenticated:
+                queryset = queryset.annotate(author_is_subscribed=Exists(
+                    Subscription.objects.filter(
+                        user=user, author=OuterRef('author')
+                    )
+                ))
+        if 'ingredients' in names:
+            queryset = queryset.prefetch_related(
+                'recipe_ingredients__ingredient' if 'ingredients' in expanded
+                else 'recipe_ingredients'
+            )
+        if 'tags' in names:
+            queryset = queryset.prefetch_related(
+                'tags' if 'tags' in expanded
+                else Prefetch('tags', queryset=Tag.objects.only('id'))
+            )
+        if user.is_authenticated:
+            if 'is_favorited' in names:
+                queryset = queryset.annotate(is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ))
+            if 'is_in_shopping_cart' in names:
+                queryset = queryset.annotate(is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                ))
+        if 'text' not in names:
+            queryset = queryset.defer('text')
+        return queryset
+
     def to_representation(self, instance):
         logger.info(f"Serializing recipe {instance.id}: {instance.name}")
-        representation = super().to_representation(instance)
-        
-        if 'tags' in representation:
-            del representation['tags']
-            
-        return representation
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -143,6 +199,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return None
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             is_fav = False
@@ -155,6 +213,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return is_fav
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             in_cart = False
@@ -211,6 +271,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         RecipeIngredient.objects.bulk_create(ingredients_list)
 
+        ingredient_ids = [ing_data['id'].id for ing_data in ingredients]
+        transaction.on_commit(
+            lambda: ingredient_index.update_recipe(recipe.id, ingredient_ids)
+        )
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
@@ -249,6 +314,41 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ).data
     
 
+class RecipeImportIngredientSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    amount = serializers.IntegerField(min_value=1, max_value=32767)
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    # Проверка одной строки импорта без обращений к БД: существование
+    # тегов и ингредиентов проверяется сразу для всей пачки
+    name = serializers.CharField(max_length=200)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(min_value=1, max_value=32767)
+    image = Base64ImageField()
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        default=list
+    )
+    ingredients = RecipeImportIngredientSerializer(many=True)
+
+    def validate_ingredients(self, value):
+        if len(value) == 0:
+            raise serializers.ValidationError(
+                'Добавьте хотя бы один ингредиент!'
+            )
+        ingredient_ids = [item['id'] for item in value]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться!'
+            )
+        return value
+
+    def validate_tags(self, value):
+        return list(dict.fromkeys(value))
+
+
 class ShortLinkSerializer(serializers.Serializer):
     short_link = serializers.URLField(source='short-link')
 
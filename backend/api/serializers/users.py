@@ -6,7 +6,10 @@ import logging
 import base64
 from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 
+from api.fieldsets import SparseFieldsetMixin
+from recipes.admin_tools import related_count
 from recipes.models import Recipe, Subscription
 
 logger = logging.getLogger(__name__)
@@ -19,7 +22,7 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         fields = ('email', 'id', 'username', 'first_name', 'last_name', 'password')
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(SparseFieldsetMixin, BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
 
@@ -28,6 +31,14 @@ class UserSerializer(BaseUserSerializer):
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'avatar')
 
+    @classmethod
+    def setup_queryset(cls, queryset, names, expanded, user):
+        if 'is_subscribed' in names and user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return queryset
+
     def get_avatar(self, obj):
         has_avatar = obj.avatar and hasattr(obj.avatar, 'url')
         if has_avatar:
@@ -38,6 +49,8 @@ class UserSerializer(BaseUserSerializer):
         return None
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         current_request = self.context.get('request')
         if not current_request or not current_request.user.is_authenticated:
             return False
@@ -69,6 +82,15 @@ class SubscriptionSerializer(UserSerializer):
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count', 'avatar')
 
+    @classmethod
+    def setup_queryset(cls, queryset, names, expanded, user):
+        queryset = super().setup_queryset(queryset, names, expanded, user)
+        if 'recipes_count' in names:
+            queryset = queryset.annotate(
+                recipes_count=related_count(Recipe, 'author')
+            )
+        return queryset
+
     def get_recipes(self, obj):
         current_request = self.context.get('request')
         limit_param = current_request.query_params.get('recipes_limit')
@@ -85,6 +107,8 @@ class SubscriptionSerializer(UserSerializer):
         ).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.versions import auth_version_key, bump_versions
+
+from .authentication import token_cache
+
+User = get_user_model()
+
+
+# Версия пользователя повышается в той же транзакции, что и изменение,
+# поэтому другие процессы сбрасывают его токены не раньше, чем изменение
+# станет видно в БД. Общая версия AUTH_VERSION остается для массовых
+# изменений в обход сигналов (update() по queryset)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate_token(instance.key)
+    bump_versions(auth_version_key(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_changed_user(sender, instance, created, update_fields=None,
+                            raw=False, **kwargs):
+    # У нового пользователя еще нет закэшированных токенов
+    if created or raw:
+        return
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    token_cache.invalidate_user(instance.id)
+    bump_versions(auth_version_key(instance.id))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.id)
+    bump_versions(auth_version_key(instance.id))
@@ -0,0 +1,207 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET_RATES = getattr(settings, 'TOKEN_BUCKET_RATES', {})
+TOKEN_BUCKET_SLOTS = getattr(settings, 'TOKEN_BUCKET_SLOTS', 65536)
+TOKEN_BUCKET_STATE_FILE = getattr(
+    settings, 'TOKEN_BUCKET_STATE_FILE',
+    os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+        'foodgram-throttle.bin'
+    )
+)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Слот: хэш ключа, остаток токенов, время последнего обновления и время,
+# к которому корзина наполнится целиком
+SLOT = struct.Struct('=Qddd')
+SLOTS_PER_GROUP = 4
+
+
+def parse_rate(rate):
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+BUCKET_LIMITS = {
+    scope: {kind: parse_rate(rate) for kind, rate in rates.items() if rate}
+    for scope, rates in TOKEN_BUCKET_RATES.items()
+}
+
+
+def _key_hash(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little'
+    ) or 1
+
+
+class TokenBucketStore:
+    # Таблица корзин в общем mmap-файле: ее видят все воркеры gunicorn и
+    # uvicorn, у которых файл лежит на одном разделе. Группы слотов
+    # блокируются через fcntl на время чтения и записи корзин.
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.groups = max(slots // SLOTS_PER_GROUP, 1)
+        self.group_size = SLOTS_PER_GROUP * SLOT.size
+        self.size = self.groups * self.group_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _ensure_open(self):
+        # После fork у воркера свой дескриптор, иначе блокировки fcntl
+        # будут общими с мастером
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size != self.size:
+            # Файл другого размера записан с другой разметкой слотов
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, self.size)
+        self._map = mmap.mmap(fd, self.size)
+        self._fd = fd
+        self._pid = pid
+
+    def consume(self, key, capacity, refill_rate, cost=1.0):
+        return self.consume_all([(key, capacity, refill_rate)], cost)
+
+    def consume_all(self, buckets, cost=1.0):
+        # Токены списываются из всех корзин, только если их хватает в
+        # каждой: отказ по одной корзине не расходует остальные
+        buckets = [
+            (_key_hash(key), capacity, refill_rate)
+            for key, capacity, refill_rate in buckets
+        ]
+        # Группы блокируются по возрастанию смещения, чтобы два процесса
+        # не ждали друг друга
+        group_offsets = sorted({
+            (key_hash % self.groups) * self.group_size
+            for key_hash, _, _ in buckets
+        })
+
+        with self._lock:
+            self._ensure_open()
+            for group_offset in group_offsets:
+                fcntl.lockf(
+                    self._fd, fcntl.LOCK_EX, self.group_size, group_offset
+                )
+            try:
+                now = time.time()
+                states = []
+                for key_hash, capacity, refill_rate in buckets:
+                    group_offset = (key_hash % self.groups) * self.group_size
+                    offset, tokens, updated_at = self._find_slot(
+                        group_offset, key_hash, capacity, now,
+                        taken={state[0] for state in states}
+                    )
+                    tokens = min(
+                        capacity,
+                        tokens + max(now - updated_at, 0) * refill_rate
+                    )
+                    states.append([offset, tokens, capacity, refill_rate])
+                wait = max(
+                    (cost - tokens) / refill_rate
+                    for _, tokens, _, refill_rate in states
+                )
+                if wait <= 0:
+                    wait = 0
+                    for state in states:
+                        state[1] -= cost
+                for (key_hash, _, _), state in zip(buckets, states):
+                    offset, tokens, capacity, refill_rate = state
+                    full_at = now + (capacity - tokens) / refill_rate
+                    SLOT.pack_into(
+                        self._map, offset, key_hash, tokens, now, full_at
+                    )
+            finally:
+                for group_offset in reversed(group_offsets):
+                    fcntl.lockf(
+                        self._fd, fcntl.LOCK_UN, self.group_size, group_offset
+                    )
+        return wait == 0, wait
+
+    def _find_slot(self, group_offset, key_hash, capacity, now, taken=()):
+        # taken - слоты других корзин того же вызова, их вытеснять нельзя
+        stalest = None
+        for index in range(SLOTS_PER_GROUP):
+            offset = group_offset + index * SLOT.size
+            if offset in taken:
+                continue
+            slot_hash, tokens, updated_at, full_at = SLOT.unpack_from(
+                self._map, offset
+            )
+            if slot_hash == key_hash:
+                return offset, tokens, updated_at
+            if slot_hash == 0 or full_at <= now:
+                # Пустой слот или наполнившаяся корзина: вытеснение ничего
+                # не меняет для ее владельца
+                return offset, capacity, 0
+            if stalest is None or updated_at < stalest[1]:
+                stalest = (offset, updated_at)
+        # Группа занята неполными корзинами: вытесняется та, что дольше всех
+        # не менялась, а новая начинается пустой. Иначе перебором ключей
+        # из той же группы можно было бы сбрасывать чужую корзину до полной
+        return stalest[0], 0, now
+
+
+token_bucket_store = TokenBucketStore(
+    TOKEN_BUCKET_STATE_FILE, TOKEN_BUCKET_SLOTS
+)
+
+
+class ActionTokenBucketThrottle(BaseThrottle):
+    # Область ограничения берется из view.throttle_scopes по имени действия.
+    # Для каждой области есть отдельные корзины на пользователя и на IP.
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        limits = BUCKET_LIMITS.get(scope)
+        if not limits:
+            return True
+
+        buckets = [('ip', self.get_ident(request))]
+        if request.user and request.user.is_authenticated:
+            buckets.append(('user', request.user.pk))
+
+        checked = [
+            (kind, ident, *limits[kind])
+            for kind, ident in buckets if kind in limits
+        ]
+        if not checked:
+            return True
+        allowed, wait = token_bucket_store.consume_all([
+            (f'{scope}:{kind}:{ident}', capacity, refill_rate)
+            for kind, ident, capacity, refill_rate in checked
+        ])
+        if not allowed:
+            idents = ', '.join(
+                f'{kind} {ident}' for kind, ident, *_ in checked
+            )
+            logger.info(f"Throttled {scope} for {idents}, wait {wait:.1f}s")
+            self._wait = wait
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
@@ -1,11 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from .views.batch import BatchViewSet
+from .views.changes import ChangeViewSet
+from .views.exports import ExportViewSet
 from .views.recipes import RecipeViewSet, IngredientViewSet, TagViewSet
-from .views.users import UserViewSet  
-
-import logging
-logger = logging.getLogger(__name__)
+from .views.users import UserViewSet
 
 app_name = 'api'
 
@@ -14,14 +14,12 @@ router_v1.register('recipes', RecipeViewSet, basename='recipes')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
 router_v1.register('tags', TagViewSet, basename='tags')
 router_v1.register('users', UserViewSet, basename='users')
-
-for route in router_v1.urls:
-    logger.info(f"Registered route: {route}")
+router_v1.register('exports', ExportViewSet, basename='exports')
+router_v1.register('changes', ChangeViewSet, basename='changes')
+router_v1.register('batch', BatchViewSet, basename='batch')
 
 urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include(router_v1.urls)),
-]
-
-logger.info(f"API URL patterns: {urlpatterns}")
\ No newline at end of file
+]
\ No newline at end of file
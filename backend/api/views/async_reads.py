@@ -0,0 +1,145 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import NotAcceptable, NotFound
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from recipes.cache_purge import INGREDIENTS_KEY, TAGS_KEY
+from recipes.models import Ingredient, ShortLink, Tag
+from ..etags import patch_surrogate_headers
+from .recipes import IngredientViewSet, TagViewSet
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+ingredient_list_view = IngredientViewSet.as_view({'get': 'list'})
+ingredient_detail_view = IngredientViewSet.as_view({'get': 'retrieve'})
+tag_list_view = TagViewSet.as_view({'get': 'list'})
+tag_detail_view = TagViewSet.as_view({'get': 'retrieve'})
+
+
+def _render_view(view, request, **kwargs):
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+async def _call_view(view, request, **kwargs):
+    # Чтение выполняется в общем пуле потоков параллельно с другими
+    # запросами, запись — в основном потоке, как у обычных sync-вью.
+    thread_sensitive = request.method not in SAFE_METHODS
+    return await sync_to_async(
+        _render_view, thread_sensitive=thread_sensitive
+    )(view, request, **kwargs)
+
+
+def _renders_json(request):
+    # Сами асинхронные вью отдают только JSON; другие форматы (msgpack,
+    # Browsable API) согласует и формирует синхронная вью DRF
+    renderers = [
+        renderer_class()
+        for renderer_class in api_settings.DEFAULT_RENDERER_CLASSES
+    ]
+    try:
+        renderer, _ = DefaultContentNegotiation().select_renderer(
+            Request(request), renderers
+        )
+    except NotAcceptable:
+        return False
+    return renderer.media_type == 'application/json'
+
+
+def _is_async_read(request):
+    return (
+        request.method in ('GET', 'HEAD') and _renders_json(request)
+    )
+
+
+def _json_response(data, status=200):
+    response = JsonResponse(
+        data, safe=False, status=status, json_dumps_params=JSON_DUMPS_PARAMS
+    )
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _not_found():
+    return _json_response({'detail': str(NotFound.default_detail)}, 404)
+
+
+@sync_to_async(thread_sensitive=False)
+def _fetch_values(queryset, *fields):
+    return list(queryset.values(*fields))
+
+
+@sync_to_async(thread_sensitive=False)
+def _fetch_one(queryset, **lookup):
+    return queryset.filter(**lookup).first()
+
+
+async def ingredient_list(request):
+    # Нечеткий поиск выполняет IngredientFilter; через nginx такие запросы
+    # сюда не попадают
+    if not _is_async_read(request) or 'fuzzy' in request.GET:
+        return await _call_view(ingredient_list_view, request)
+    ingredients = Ingredient.objects.all()
+    name_prefix = request.GET.get('name')
+    if name_prefix:
+        ingredients = ingredients.filter(name__istartswith=name_prefix)
+    ingredient_data = await _fetch_values(
+        ingredients, 'id', 'name', 'measurement_unit'
+    )
+    return patch_surrogate_headers(
+        _json_response(ingredient_data), [INGREDIENTS_KEY]
+    )
+
+
+async def ingredient_detail(request, pk):
+    if not _is_async_read(request):
+        return await _call_view(ingredient_detail_view, request, pk=pk)
+    ingredient_data = await _fetch_values(
+        Ingredient.objects.filter(pk=pk), 'id', 'name', 'measurement_unit'
+    )
+    if not ingredient_data:
+        return _not_found()
+    return patch_surrogate_headers(
+        _json_response(ingredient_data[0]), [INGREDIENTS_KEY]
+    )
+
+
+async def tag_list(request):
+    if not _is_async_read(request):
+        return await _call_view(tag_list_view, request)
+    tag_data = await _fetch_values(
+        Tag.objects.all(), 'id', 'name', 'color', 'slug'
+    )
+    return patch_surrogate_headers(_json_response(tag_data), [TAGS_KEY])
+
+
+async def tag_detail(request, pk):
+    if not _is_async_read(request):
+        return await _call_view(tag_detail_view, request, pk=pk)
+    tag_data = await _fetch_values(
+        Tag.objects.filter(pk=pk), 'id', 'name', 'color', 'slug'
+    )
+    if not tag_data:
+        return _not_found()
+    return patch_surrogate_headers(
+        _json_response(tag_data[0]), [TAGS_KEY]
+    )
+
+
+async def redirect_short_link(request, short_id):
+    link_object = await _fetch_one(
+        ShortLink.objects.only('recipe_id'), short_id=short_id
+    )
+    if link_object is None:
+        raise Http404
+    return HttpResponseRedirect(f'/recipes/{link_object.recipe_id}/')
@@ -0,0 +1,34 @@
+from rest_framework import viewsets
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from ..batch import run_batch
+from ..serializers.batch import BatchSerializer
+from ..throttling import ActionTokenBucketThrottle
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BatchViewSet(viewsets.ViewSet):
+    # Подзапросы выполняются внутри процесса с пользователем пакета;
+    # права и ограничения частоты каждого эндпоинта действуют как обычно
+    permission_classes = (AllowAny,)
+    throttle_classes = (ActionTokenBucketThrottle,)
+    throttle_scopes = {
+        'create': 'batch',
+    }
+
+    def create(self, request):
+        try:
+            serializer = BatchSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            responses = run_batch(
+                request._request,
+                serializer.validated_data['requests'],
+                serializer.validated_data['parallel']
+            )
+            return Response({'responses': responses})
+        except Exception as exc:
+            logger.error(f"Error in batch create: {exc}")
+            raise
@@ -0,0 +1,44 @@
+from rest_framework import status, viewsets
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from recipes.changes import (CHANGE_LOG_PAGE_SIZE, ChangeLogExpired,
+                             changes_since, latest_cursor, parse_cursor)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeViewSet(viewsets.ViewSet):
+    # Без since возвращается текущий курсор: клиент запоминает его перед
+    # полной загрузкой и дальше запрашивает только изменения
+    permission_classes = (AllowAny,)
+
+    def list(self, request):
+        try:
+            since = request.query_params.get('since')
+            if since is None:
+                return Response(
+                    {'cursor': latest_cursor(), 'has_more': False, 'changes': []}
+                )
+            limit = request.query_params.get('limit', str(CHANGE_LOG_PAGE_SIZE))
+            position = parse_cursor(since)
+            if position is None or not limit.isdigit() or int(limit) < 1:
+                error_msg = {'errors': 'Некорректный курсор или лимит'}
+                return Response(error_msg, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                page = changes_since(
+                    request.user, position,
+                    min(int(limit), CHANGE_LOG_PAGE_SIZE)
+                )
+            except ChangeLogExpired:
+                error_msg = {
+                    'errors': 'Курсор устарел, выполните полную синхронизацию',
+                    'cursor': latest_cursor(),
+                }
+                return Response(error_msg, status=status.HTTP_410_GONE)
+            return Response(page)
+        except Exception as exc:
+            logger.error(f"Error in changes list: {exc}")
+            raise
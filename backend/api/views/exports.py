@@ -0,0 +1,50 @@
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ..exports import catalog_records, ndjson_response, user_records
+from ..throttling import ActionTokenBucketThrottle
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExportViewSet(viewsets.ViewSet):
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (ActionTokenBucketThrottle,)
+    throttle_scopes = {
+        'me': 'data_export',
+        'catalog': 'data_export',
+    }
+
+    @action(detail=False, methods=['get'])
+    def me(self, request):
+        try:
+            return ndjson_response(
+                user_records(request.user),
+                f'foodgram-user-{request.user.id}.ndjson'
+            )
+        except Exception as exc:
+            logger.error(f"Error in export me action: {exc}")
+            raise
+
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        try:
+            author_id = request.query_params.get('author')
+            if author_id is not None:
+                if not author_id.isdigit():
+                    error_msg = {'errors': 'Некорректный идентификатор автора'}
+                    return Response(
+                        error_msg, status=status.HTTP_400_BAD_REQUEST
+                    )
+                author_id = int(author_id)
+            filename = (
+                f'foodgram-author-{author_id}.ndjson' if author_id
+                else 'foodgram-catalog.ndjson'
+            )
+            return ndjson_response(catalog_records(author_id), filename)
+        except Exception as exc:
+            logger.error(f"Error in export catalog action: {exc}")
+            raise
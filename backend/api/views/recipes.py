@@ -1,33 +1,59 @@
-from django.db.models import Sum
-from django.http import HttpResponse, Http404
+from django.db.models import F
+from django.http import FileResponse, HttpResponse, Http404
 from django.shortcuts import get_object_or_404, redirect
 from rest_framework import status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 
+from recipes.cache_purge import (INGREDIENTS_KEY, RECIPES_KEY, SIMILAR_KEY,
+                                 TAGS_KEY, author_key, recipe_key)
 from recipes.models import (Recipe, Ingredient, Tag, 
                           Favorite, ShoppingCart,
-                          RecipeIngredient, ShortLink)
+                          ShortLink, BackgroundTask)
+from recipes.feed import get_feed_page
+from recipes.shopping_list import ShoppingListArtifact
+from recipes.similarity import SIMILAR_RECIPES_COUNT, similar_recipe_ids
+from recipes.task_queue import enqueue
+from recipes.versions import (CATALOG_VERSION, RECIPES_VERSION,
+                              SIMILARITY_VERSION, recipe_version_key)
 from ..serializers.recipes import (RecipeListSerializer, RecipeCreateSerializer,
                                 TagSerializer, IngredientSerializer,
                                 FavoriteSerializer, ShoppingCartSerializer,
                                 RecipeSerializer)
-from ..pagination import CustomPagination
+from ..pagination import CustomPagination, TrendingCursorPagination
 from ..permissions import IsAuthorOrReadOnly
+from ..throttling import ActionTokenBucketThrottle
+from ..bulk_import import BULK_IMPORT_MAX_ROWS, import_recipes
 from ..filters import RecipeFilter, IngredientFilter
+from ..etags import (compute_etag, is_not_modified, not_modified_response,
+                     patch_conditional_headers, patch_surrogate_headers)
+from ..fieldsets import SparseFieldsetViewMixin
 import logging
 
 logger = logging.getLogger(__name__)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'patch', 'delete']
+    throttle_classes = (ActionTokenBucketThrottle,)
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'destroy': 'recipe_write',
+        'get_link': 'get_link',
+        'bulk_import': 'recipe_import',
+        'download_shopping_cart': 'shopping_list_export',
+        'favorite': 'user_lists',
+        'shopping_cart': 'user_lists',
+    }
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -41,11 +67,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeCreateSerializer
 
     def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            # ?fields= и ?expand= определяют, какие связи и подзапросы нужны
+            return self.setup_queryset(Recipe.objects.all())
         query = Recipe.objects.all().prefetch_related(
             'tags', 'recipe_ingredients__ingredient'
         ).select_related('author')
         return query
 
+    def surrogate_keys(self, recipes):
+        keys = [TAGS_KEY, INGREDIENTS_KEY]
+        for recipe in recipes:
+            keys += [recipe_key(recipe.id), author_key(recipe.author_id)]
+        return keys
+
     def get_object(self):
         try:
             return super().get_object()
@@ -55,7 +90,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def retrieve(self, request, *args, **kwargs):
         try:
-            result = super().retrieve(request, *args, **kwargs)
+            etag = compute_etag(request, [
+                recipe_version_key(kwargs.get(self.lookup_field)),
+                CATALOG_VERSION,
+            ])
+            if is_not_modified(request, etag, exists=False):
+                return not_modified_response(request, etag)
+
+            instance = self.get_object()
+            if is_not_modified(request, etag):
+                return not_modified_response(request, etag)
+            result = Response(self.get_serializer(instance).data)
+            result = patch_conditional_headers(request, result, etag)
+            if not request.user.is_authenticated:
+                patch_surrogate_headers(result, self.surrogate_keys([instance]))
             return result
         except Exception as exc:
             logger.error(f"Error in retrieve: {exc}")
@@ -63,7 +111,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         try:
+            etag = compute_etag(request, [RECIPES_VERSION, CATALOG_VERSION])
+            if is_not_modified(request, etag):
+                return not_modified_response(request, etag)
+
             result = super().list(request, *args, **kwargs)
+            result = patch_conditional_headers(request, result, etag)
+            if not request.user.is_authenticated:
+                page = getattr(self.paginator, 'page', None) or []
+                patch_surrogate_headers(
+                    result, [RECIPES_KEY, *self.surrogate_keys(page)]
+                )
             return result
         except Exception as exc:
             logger.error(f"Error in list: {exc}")
@@ -180,41 +238,175 @@ class RecipeViewSet(viewsets.ModelViewSet):
             logger.error(f"Error in shopping_cart action: {exc}")
             raise
 
+    @action(detail=False, methods=['get'], url_path='trending',
+            pagination_class=TrendingCursorPagination)
+    def trending(self, request):
+        try:
+            trending_queryset = self.get_queryset().filter(
+                trending_score__isnull=False
+            ).annotate(trending=F('trending_score__score'))
+            trending_queryset = self.filter_queryset(trending_queryset)
+
+            page = self.paginate_queryset(trending_queryset)
+            trending_serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(trending_serializer.data)
+        except Exception as exc:
+            logger.error(f"Error in trending action: {exc}")
+            raise
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        # Списки соседей посчитаны заранее (команда refresh_similar и
+        # задачи воркера), здесь только выборка по индексу
+        try:
+            etag = compute_etag(request, [
+                RECIPES_VERSION, CATALOG_VERSION, SIMILARITY_VERSION
+            ])
+            if is_not_modified(request, etag, exists=False):
+                return not_modified_response(request, etag)
+
+            if not pk.isdigit():
+                raise NotFound
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            if is_not_modified(request, etag):
+                return not_modified_response(request, etag)
+            limit = request.query_params.get('limit', '')
+            limit = (
+                min(int(limit), SIMILAR_RECIPES_COUNT) if limit.isdigit()
+                else SIMILAR_RECIPES_COUNT
+            )
+            similar_ids = similar_recipe_ids(pk, limit)
+            similar_recipes = self.get_queryset().in_bulk(similar_ids)
+            similar_recipes = [
+                similar_recipes[recipe_id] for recipe_id in similar_ids
+                if recipe_id in similar_recipes
+            ]
+
+            result = Response(
+                self.get_serializer(similar_recipes, many=True).data
+            )
+            result = patch_conditional_headers(request, result, etag)
+            if not request.user.is_authenticated:
+                patch_surrogate_headers(result, [
+                    SIMILAR_KEY, recipe_key(pk),
+                    *self.surrogate_keys(similar_recipes)
+                ])
+            return result
+        except Exception as exc:
+            logger.error(f"Error in similar action: {exc}")
+            raise
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        try:
+            page_size = CustomPagination().get_page_size(request)
+            try:
+                recipe_ids, next_cursor = get_feed_page(
+                    request.user, page_size, request.query_params.get('cursor')
+                )
+            except ValueError as exc:
+                raise NotFound(str(exc))
+
+            recipes_by_id = self.get_queryset().in_bulk(recipe_ids)
+            feed_recipes = [
+                recipes_by_id[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes_by_id
+            ]
+            feed_serializer = self.get_serializer(feed_recipes, many=True)
+
+            next_url = None
+            if next_cursor:
+                next_url = replace_query_param(
+                    request.build_absolute_uri(), 'cursor', next_cursor
+                )
+            return Response({'next': next_url, 'results': feed_serializer.data})
+        except Exception as exc:
+            logger.error(f"Error in feed action: {exc}")
+            raise
+
     @action(detail=False, permission_classes=[IsAuthenticated],
             url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
         current_user = request.user
         try:
-            cart_exists = ShoppingCart.objects.filter(user=current_user).exists()
-            if not cart_exists:
+            artifact = ShoppingListArtifact.for_user(current_user.id)
+            if artifact.is_empty:
                 logger.error(f"Shopping cart is empty for user {current_user.id}")
                 error_msg = {'errors': 'Список покупок пуст!'}
                 return Response(error_msg, status=status.HTTP_400_BAD_REQUEST)
 
-            ingredients_list = RecipeIngredient.objects.filter(
-                recipe__in_shopping_cart__user=current_user
-            ).values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
-            ).annotate(total_amount=Sum('amount'))
-
-            content = 'Список покупок:\n\n'
-            for ingredient in ingredients_list:
-                content += (
-                    f"{ingredient['ingredient__name']} "
-                    f"({ingredient['ingredient__measurement_unit']}) — "
-                    f"{ingredient['total_amount']}\n"
+            export_key = f'export:{current_user.id}:{artifact.digest}'
+            # Если фоновая сборка уже завершилась, а файла нет (ошибка или
+            # файл удален), список формируется в запросе
+            build_in_background = (
+                not artifact.exists() and artifact.is_large
+                and not BackgroundTask.objects.filter(
+                    idempotency_key=export_key,
+                    status__in=(BackgroundTask.DONE, BackgroundTask.FAILED)
+                ).exists()
+            )
+            if build_in_background:
+                enqueue(
+                    'exports.build_shopping_list',
+                    {'user_id': current_user.id,
+                     'export_format': artifact.export_format},
+                    idempotency_key=export_key
                 )
+                if not artifact.exists():
+                    return Response(
+                        {'status': 'Список покупок формируется'},
+                        status=status.HTTP_202_ACCEPTED,
+                        headers={
+                            'Location': request.build_absolute_uri(),
+                            'Retry-After': '2',
+                        }
+                    )
 
-            file_response = HttpResponse(content, content_type='text/plain')
+            artifact.build()
+            if artifact.x_accel_url:
+                file_response = HttpResponse(content_type=artifact.content_type)
+                file_response['X-Accel-Redirect'] = artifact.x_accel_url
+            else:
+                file_response = FileResponse(
+                    open(artifact.path, 'rb'),
+                    content_type=artifact.content_type
+                )
             file_response['Content-Disposition'] = (
-                'attachment; filename="shopping_cart.txt"'
+                f'attachment; filename="{artifact.download_name}"'
             )
             return file_response
         except Exception as exc:
             logger.error(f"Error in download_shopping_cart action: {exc}")
             raise
             
+    @action(detail=False, methods=['post'], url_path='bulk',
+            permission_classes=[IsAuthenticated])
+    def bulk_import(self, request):
+        try:
+            rows = request.data
+            if isinstance(rows, dict):
+                rows = rows.get('recipes')
+            if not isinstance(rows, list) or not rows:
+                error_msg = {'errors': 'Ожидается непустой список рецептов'}
+                return Response(error_msg, status=status.HTTP_400_BAD_REQUEST)
+            if len(rows) > BULK_IMPORT_MAX_ROWS:
+                error_msg = {
+                    'errors': f'Не больше {BULK_IMPORT_MAX_ROWS} рецептов '
+                              f'за один запрос'
+                }
+                return Response(error_msg, status=status.HTTP_400_BAD_REQUEST)
+
+            report = import_recipes(request.user, list(enumerate(rows)))
+            response_status = (
+                status.HTTP_201_CREATED if report['created']
+                else status.HTTP_400_BAD_REQUEST
+            )
+            return Response(report, status=response_status)
+        except Exception as exc:
+            logger.error(f"Error in bulk_import action: {exc}")
+            raise
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         current_recipe = self.get_object()
@@ -271,11 +463,16 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.info(f"Serialized data count: {len(result_serializer.data)}")
                 if len(result_serializer.data) > 0:
                     logger.info(f"First item preview: {result_serializer.data[0]}")
-                return self.get_paginated_response(result_serializer.data)
+                return patch_surrogate_headers(
+                    self.get_paginated_response(result_serializer.data),
+                    [INGREDIENTS_KEY]
+                )
 
             result_serializer = self.get_serializer(filtered_queryset, many=True)
             logger.info(f"Serialized data count (no pagination): {len(result_serializer.data)}")
-            return Response(result_serializer.data)
+            return patch_surrogate_headers(
+                Response(result_serializer.data), [INGREDIENTS_KEY]
+            )
         except Exception as exc:
             logger.error(f"Error in list: {exc}", exc_info=True)
             raise
@@ -283,7 +480,7 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         try:
             result = super().retrieve(request, *args, **kwargs)
-            return result
+            return patch_surrogate_headers(result, [INGREDIENTS_KEY])
         except Exception as exc:
             logger.error(f"Error in IngredientViewSet retrieve: {exc}")
             raise
@@ -298,7 +495,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     def list(self, request, *args, **kwargs):
         try:
             result = super().list(request, *args, **kwargs)
-            return result
+            return patch_surrogate_headers(result, [TAGS_KEY])
         except Exception as exc:
             logger.error(f"Error in TagViewSet list: {exc}")
             raise
@@ -306,7 +503,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         try:
             result = super().retrieve(request, *args, **kwargs)
-            return result
+            return patch_surrogate_headers(result, [TAGS_KEY])
         except Exception as exc:
             logger.error(f"Error in TagViewSet retrieve: {exc}")
             raise
\ No newline at end of file
@@ -8,22 +8,32 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from ..serializers.users import (UserSerializer, SubscriptionSerializer,
                               SubscribeSerializer, AvatarSerializer, 
                               User, Subscription)
+from ..fieldsets import FieldSelection, SparseFieldsetViewMixin
 from ..pagination import CustomPagination
+from ..throttling import ActionTokenBucketThrottle
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(SparseFieldsetViewMixin, DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPagination
+    throttle_classes = (ActionTokenBucketThrottle,)
+    throttle_scopes = {
+        'create': 'signup',
+        'subscribe': 'user_lists',
+        'avatar': 'user_lists',
+    }
     
     def get_instance(self):
         return self.request.user
     
     def get_queryset(self):
         user_objects = User.objects.all()
+        if self.action in ('list', 'retrieve'):
+            user_objects = self.setup_queryset(user_objects)
         return user_objects
     
     def get_permissions(self):
@@ -85,21 +95,29 @@ class UserViewSet(DjoserUserViewSet):
     def subscriptions(self, request):
         try:
             current_user = request.user
-            user_subscriptions = User.objects.filter(
-                subscribers__user=current_user
-            ).prefetch_related('subscribers')
+            selection = FieldSelection.from_request(request)
+            names, expanded = SubscriptionSerializer.resolve_selection(
+                selection
+            )
+            user_subscriptions = SubscriptionSerializer.setup_queryset(
+                User.objects.filter(subscribers__user=current_user),
+                names, expanded, current_user
+            )
+            serializer_context = {
+                'request': request, 'field_selection': selection
+            }
             
             paginated_subscriptions = self.paginate_queryset(user_subscriptions)
             if paginated_subscriptions is not None:
                 subscription_data = SubscriptionSerializer(
                     paginated_subscriptions, many=True, 
-                    context={'request': request}
+                    context=serializer_context
                 )
                 return self.get_paginated_response(subscription_data.data)
             
             subscription_data = SubscriptionSerializer(
                 user_subscriptions, many=True, 
-                context={'request': request}
+                context=serializer_context
             )
             return Response(subscription_data.data)
         except Exception as exc:
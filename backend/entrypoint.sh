@@ -7,10 +7,6 @@ until nc -z $DB_HOST $DB_PORT; do
 done
 echo "PostgreSQL запущен и готов к работе"
 
-echo "Генерация миграций..."
-python manage.py makemigrations --noinput
-python manage.py makemigrations recipes --noinput
-
 echo "Применение миграций..."
 python manage.py migrate recipes --noinput
 python manage.py migrate --noinput
@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma}={value}')
+
+
+@receiver(connection_created)
+def tune_postgresql_connection(sender, connection, **kwargs):
+    # Порог оператора %> в нечетком поиске ингредиентов; параметр можно
+    # задать и до загрузки расширения pg_trgm
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SET pg_trgm.word_similarity_threshold = %s',
+            [settings.INGREDIENT_FUZZY_THRESHOLD]
+        )
+
+
+DB_CONN_HEALTH_CHECK_IDLE = getattr(settings, 'DB_CONN_HEALTH_CHECK_IDLE', 30)
+
+
+def check_persistent_connections(**kwargs):
+    # Аналог CONN_HEALTH_CHECKS из Django 4.1: переиспользуемое соединение
+    # проверяется в начале запроса и закрывается, если сервер его оборвал.
+    # Пингуется только соединение, простоявшее без запросов дольше
+    # DB_CONN_HEALTH_CHECK_IDLE секунд: недавно работавшее соединение
+    # сервер оборвать почти не успевает.
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is None:
+            continue
+        if not conn.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        released_at = getattr(conn, 'released_at', None)
+        if (
+            released_at is not None
+            and now - released_at < DB_CONN_HEALTH_CHECK_IDLE
+        ):
+            continue
+        if not conn.is_usable():
+            conn.close()
+
+
+def mark_released_connections(**kwargs):
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is not None:
+            conn.released_at = now
+
+
+request_started.connect(
+    check_persistent_connections,
+    dispatch_uid='foodgram.db.check_persistent_connections'
+)
+request_finished.connect(
+    mark_released_connections,
+    dispatch_uid='foodgram.db.mark_released_connections'
+)
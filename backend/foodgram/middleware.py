@@ -0,0 +1,76 @@
+import asyncio
+
+from django.conf import settings
+from django.core import signing
+from django.utils.decorators import sync_and_async_middleware
+
+from .routers import finish_request, start_request
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Отметка о записи хранится у клиента: кэш Django у каждого процесса
+# свой, а следующий запрос может попасть в другой воркер или в api-async
+STICKY_COOKIE_NAME = 'replica_sticky'
+STICKY_COOKIE_SALT = 'foodgram.middleware.replica_sticky'
+
+
+def _is_sticky(request):
+    value = request.COOKIES.get(STICKY_COOKIE_NAME)
+    if not value:
+        return False
+    try:
+        signing.TimestampSigner(salt=STICKY_COOKIE_SALT).unsign(
+            value, max_age=settings.REPLICA_STICKY_SECONDS
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _start(request):
+    use_replica = request.method in SAFE_METHODS and not _is_sticky(request)
+    return start_request(use_replica)
+
+
+def _finish(request, response, token):
+    state = finish_request(token)
+    if state.wrote or request.method not in SAFE_METHODS:
+        response.set_cookie(
+            STICKY_COOKIE_NAME,
+            signing.TimestampSigner(salt=STICKY_COOKIE_SALT).sign('1'),
+            max_age=settings.REPLICA_STICKY_SECONDS,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    # Клиент, который только что писал в БД, на REPLICA_STICKY_SECONDS
+    # закрепляется за основной БД, чтобы видеть свои изменения.
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not settings.REPLICA_DATABASES:
+                return await get_response(request)
+            token = _start(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                finish_request(token)
+                raise
+            return _finish(request, response, token)
+    else:
+        def middleware(request):
+            if not settings.REPLICA_DATABASES:
+                return get_response(request)
+            token = _start(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                finish_request(token)
+                raise
+            return _finish(request, response, token)
+
+    return middleware
@@ -0,0 +1,209 @@
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+import traceback
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+PROFILER_HEADER = 'HTTP_X_PROFILE'
+PROFILER_QUERY_PARAM = '_profile'
+PROFILER_OUTPUT_DIR = Path(getattr(
+    settings, 'PROFILER_OUTPUT_DIR', Path(settings.MEDIA_ROOT).parent / 'profiles'
+))
+PROFILER_TOP_FUNCTIONS = 30
+PROFILER_TOP_ALLOCATIONS = 20
+PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def _is_triggered(request):
+    return (
+        PROFILER_HEADER in request.META
+        # Непустое значение, как и в map $arg__profile в nginx.conf
+        or bool(request.GET.get(PROFILER_QUERY_PARAM))
+    )
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # Токен проверяется здесь же: аутентификация DRF выполняется позже,
+    # уже внутри представления
+    from api.authentication import CachedTokenAuthentication
+
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return False
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            auth[1].decode()
+        )
+    except (AuthenticationFailed, UnicodeError):
+        return False
+    return user.is_staff
+
+
+def _query_origin():
+    # Три ближайших к запросу кадра из кода проекта; исходные строки не
+    # читаются, чтобы не засорять снимок tracemalloc кэшем linecache
+    origin = []
+    for frame, lineno in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(PROJECT_ROOT)
+            and 'site-packages' not in filename
+            and filename != __file__
+        ):
+            origin.append(
+                f'{Path(filename).relative_to(PROJECT_ROOT)}:{lineno} '
+                f'in {frame.f_code.co_name}'
+            )
+            if len(origin) == 3:
+                break
+    return origin[::-1]
+
+
+class QueryRecorder:
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'many': many,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'origin': _query_origin(),
+            })
+
+    @property
+    def total_ms(self):
+        return sum(query['duration_ms'] for query in self.queries)
+
+
+def _top_functions(profiler):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(PROFILER_TOP_FUNCTIONS)
+    return stream.getvalue()
+
+
+def _top_allocations(snapshot):
+    return [
+        {
+            'location': str(stat.traceback),
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:PROFILER_TOP_ALLOCATIONS]
+    ]
+
+
+def _save_artifacts(profile_id, profiler, report):
+    PROFILER_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(PROFILER_OUTPUT_DIR / f'{profile_id}.prof')
+    with open(PROFILER_OUTPUT_DIR / f'{profile_id}.json', 'w') as output:
+        json.dump(report, output, ensure_ascii=False, indent=2, default=str)
+
+
+def _profile_request(request, get_response):
+    profile_id = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    total_ms = (time.perf_counter() - started) * 1000
+
+    _, memory_peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ))
+    if started_tracing:
+        tracemalloc.stop()
+
+    report = {
+        'id': profile_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'total_ms': round(total_ms, 3),
+        'memory_peak_kb': round(memory_peak / 1024, 1),
+        'sql_count': len(recorder.queries),
+        'sql_ms': round(recorder.total_ms, 3),
+        'queries': recorder.queries,
+        'top_functions': _top_functions(profiler),
+        'top_allocations': _top_allocations(snapshot),
+    }
+    try:
+        _save_artifacts(profile_id, profiler, report)
+    except OSError as exc:
+        logger.error(f"Error saving profile {profile_id}: {exc}")
+
+    response['X-Profile'] = (
+        f'id={profile_id}; total={total_ms:.1f}ms; '
+        f'sql={len(recorder.queries)}/{recorder.total_ms:.1f}ms; '
+        f'mem_peak={memory_peak / 1024:.0f}KB'
+    )
+    logger.info(f"Profiled {request.method} {request.path}: {response['X-Profile']}")
+    return response
+
+
+@sync_and_async_middleware
+def request_profiler_middleware(get_response):
+    # Профилирование включается заголовком X-Profile или параметром
+    # ?_profile=1 и доступно только персоналу. Без флага — одна проверка
+    # строки запроса.
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            # cProfile видит только поток цикла событий, а ORM работает
+            # в пуле потоков, поэтому такие запросы nginx отправляет на
+            # синхронный бэкенд. Остальным флаг профилирования ничего не
+            # сообщает
+            if _is_triggered(request) and await sync_to_async(_is_staff)(
+                request
+            ):
+                response['X-Profile'] = 'skipped=asgi'
+            return response
+    else:
+        def middleware(request):
+            if _is_triggered(request) and _is_staff(request):
+                return _profile_request(request, get_response)
+            return get_response(request)
+
+    return middleware
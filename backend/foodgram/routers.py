@@ -0,0 +1,51 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_routing_state = ContextVar('replica_routing_state', default=None)
+
+
+class RoutingState:
+
+    def __init__(self, use_replica):
+        self.replica = None
+        if use_replica and settings.REPLICA_DATABASES:
+            self.replica = random.choice(settings.REPLICA_DATABASES)
+        self.wrote = False
+
+
+def start_request(use_replica):
+    return _routing_state.set(RoutingState(use_replica))
+
+
+def finish_request(token):
+    state = _routing_state.get()
+    _routing_state.reset(token)
+    return state
+
+
+class PrimaryReplicaRouter:
+    # Вне запроса (команды, фоновые задачи) все обращения идут в основную
+    # БД. В запросе чтение уходит на реплику, пока не было записи.
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        known_aliases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in known_aliases and obj2._state.db in known_aliases:
+            return True
+        return None
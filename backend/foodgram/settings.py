@@ -1,3 +1,4 @@
+from importlib.util import find_spec
 from pathlib import Path
 import os
 import sys
@@ -6,9 +7,15 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-i6p4v!25k36dx53j_)qk)@6g62(a^4rp=pbo@%e)l4vz3h8&+m')
 
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'False').lower() in ('true', '1', 'yes')
 
-ALLOWED_HOSTS = ['127.0.0.1', 'localhost', '*']
+# Вне DEBUG список хостов задается только окружением: без ALLOWED_HOSTS
+# Django отвечает 400 на любой запрос
+ALLOWED_HOSTS = [
+    host.strip() for host in os.environ.get(
+        'ALLOWED_HOSTS', '127.0.0.1,localhost' if DEBUG else ''
+    ).split(',') if host.strip()
+]
 
 DJANGO_APPS = [
     'django.contrib.admin',
@@ -35,10 +42,12 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + PROJECT_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.middleware.replica_routing_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.profiling.request_profiler_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,15 +72,65 @@ TEMPLATES = [TEMPLATE_CONFIG]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
-DB_CONFIG = {
-    'ENGINE': 'django.db.backends.sqlite3',
-    'NAME': PROJECT_ROOT / 'db.sqlite3',
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DB_CONFIG = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', PROJECT_ROOT / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 20,
+        },
+    }
+else:
+    DB_CONFIG = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', 'postgres'),
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+    }
+
+DB_CONFIG['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+DB_CONFIG['CONN_HEALTH_CHECKS'] = DB_CONN_MAX_AGE != 0
+# Сколько секунд соединение может простаивать между запросами без проверки
+DB_CONN_HEALTH_CHECK_IDLE = int(
+    os.environ.get('DB_CONN_HEALTH_CHECK_IDLE', 30)
+)
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'busy_timeout': 20000,
 }
 
 DATABASES = {
     'default': DB_CONFIG
 }
 
+DB_REPLICAS = [
+    replica for replica in os.environ.get('DB_REPLICAS', '').split(',') if replica
+]
+
+for replica_number, replica in enumerate(DB_REPLICAS, start=1):
+    replica_config = dict(DB_CONFIG)
+    if DB_ENGINE == 'django.db.backends.sqlite3':
+        replica_config['NAME'] = replica
+    else:
+        replica_config['HOST'] = replica
+    replica_config['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{replica_number}'] = replica_config
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+DATABASE_ROUTERS = ['foodgram.routers.PrimaryReplicaRouter']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -99,6 +158,12 @@ STATIC_ROOT = PROJECT_ROOT / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = PROJECT_ROOT / 'media'
 
+SHOPPING_LIST_EXPORT_ROOT = PROJECT_ROOT / 'exports'
+SHOPPING_LIST_X_ACCEL_PREFIX = os.environ.get('SHOPPING_LIST_X_ACCEL_PREFIX', '')
+SHOPPING_LIST_ASYNC_THRESHOLD = int(
+    os.environ.get('SHOPPING_LIST_ASYNC_THRESHOLD', 200)
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'recipes.User'
@@ -108,15 +173,95 @@ REST_FRAMEWORK_CONFIG = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 1)),
 }
 
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK_CONFIG['DEFAULT_RENDERER_CLASSES'].insert(
+        1, 'api.renderers.MessagePackRenderer'
+    )
+    REST_FRAMEWORK_CONFIG['DEFAULT_PARSER_CLASSES'].insert(
+        1, 'api.parsers.MessagePackParser'
+    )
+
 REST_FRAMEWORK = REST_FRAMEWORK_CONFIG
 
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60))
+TOKEN_AUTH_CACHE_MAX_SIZE = 10000
+TOKEN_AUTH_VERSION_CHECK_INTERVAL = float(
+    os.environ.get('TOKEN_AUTH_VERSION_CHECK_INTERVAL', 1)
+)
+TOKEN_AUTH_SHARED_CACHE = os.environ.get(
+    'TOKEN_AUTH_SHARED_CACHE', 'False'
+).lower() in ('true', '1', 'yes')
+
+TOKEN_BUCKET_RATES = {
+    'recipe_write': {'user': '30/min', 'ip': '60/min'},
+    'get_link': {'user': '30/min', 'ip': '60/min'},
+    'shopping_list_export': {'user': '10/min', 'ip': '30/min'},
+    'user_lists': {'user': '120/min', 'ip': '240/min'},
+    'signup': {'ip': '10/hour'},
+    'recipe_import': {'user': '20/hour'},
+    'data_export': {'user': '10/hour', 'ip': '30/hour'},
+    'batch': {'user': '60/min', 'ip': '120/min'},
+}
+TOKEN_BUCKET_SLOTS = 65536
+if os.environ.get('TOKEN_BUCKET_STATE_FILE'):
+    TOKEN_BUCKET_STATE_FILE = os.environ['TOKEN_BUCKET_STATE_FILE']
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+BULK_IMPORT_MAX_ROWS = 500
+EXPORT_CHUNK_SIZE = 500
+
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+NGINX_CACHE_PURGE = os.environ.get(
+    'NGINX_CACHE_PURGE', 'False'
+).lower() in ('true', '1', 'yes')
+NGINX_CACHE_PATH = os.environ.get('NGINX_CACHE_PATH', '')
+CACHE_PURGE_REPEAT_DELAY = int(os.environ.get('CACHE_PURGE_REPEAT_DELAY', 120))
+SURROGATE_CACHE_TTL = int(os.environ.get('SURROGATE_CACHE_TTL', 3600))
+
+SIMILAR_RECIPES_COUNT = 12
+SIMILAR_TAG_WEIGHT = 0.5
+
+INGREDIENT_FUZZY_LIMIT = 20
+INGREDIENT_FUZZY_THRESHOLD = 0.5
+
+PROFILER_OUTPUT_DIR = PROJECT_ROOT / 'profiles'
+
+TASK_QUEUE_EAGER = os.environ.get(
+    'TASK_QUEUE_EAGER', 'False'
+).lower() in ('true', '1', 'yes')
+TASK_QUEUE_BATCH_SIZE = int(os.environ.get('TASK_QUEUE_BATCH_SIZE', 10))
+TASK_QUEUE_POLL_INTERVAL = float(
+    os.environ.get('TASK_QUEUE_POLL_INTERVAL', 1.0)
+)
+TASK_QUEUE_LOCK_TIMEOUT = 600
+TASK_QUEUE_RETRY_BASE_DELAY = 5
+TASK_QUEUE_RETRY_MAX_DELAY = 3600
+TASK_QUEUE_RETENTION_DAYS = 7
+
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30))
+CHANGE_LOG_COMPACT_AFTER_MINUTES = 60
+CHANGE_LOG_PAGE_SIZE = 500
+
 DJOSER_CONFIG = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -1,12 +1,9 @@
-import logging
 from django.contrib import admin
 from django.conf import settings
 from django.urls import include, path
 from django.conf.urls.static import static
 from api.views.recipes import redirect_short_link
 
-logger = logging.getLogger(__name__)
-
 api_patterns = [
     path('', include('api.urls')),
 ]
@@ -19,8 +16,6 @@ url_config = [
 
 urlpatterns = url_config
 
-logger.info(f"Основные URL-маршруты настроены: {len(urlpatterns)} маршрутов")
-
 if settings.DEBUG:
     media_patterns = static(
         settings.MEDIA_URL,
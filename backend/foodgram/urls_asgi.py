@@ -0,0 +1,17 @@
+from django.urls import path
+
+from api.views import async_reads
+from .urls import urlpatterns as sync_urlpatterns
+
+# Рецепты остаются в синхронном urlconf: в Django 3.2 нет асинхронного ORM,
+# и сериализаторы DRF все равно выполнялись бы в потоке. Nginx направляет
+# в api-async только GET и HEAD по этим путям.
+async_urlpatterns = [
+    path('api/ingredients/', async_reads.ingredient_list),
+    path('api/ingredients/<int:pk>/', async_reads.ingredient_detail),
+    path('api/tags/', async_reads.tag_list),
+    path('api/tags/<int:pk>/', async_reads.tag_detail),
+    path('s/<str:short_id>/', async_reads.redirect_short_link),
+]
+
+urlpatterns = async_urlpatterns + sync_urlpatterns
@@ -0,0 +1,50 @@
+import logging
+import time
+
+from django.db import DatabaseError, connections
+from django.urls import URLResolver, get_resolver
+
+from recipes.ingredient_index import ingredient_index
+from recipes.ingredient_search import ingredient_name_index, uses_name_index
+
+logger = logging.getLogger(__name__)
+
+
+def _populate_resolver(resolver):
+    resolver.reverse_dict
+    for url_pattern in resolver.url_patterns:
+        if isinstance(url_pattern, URLResolver):
+            _populate_resolver(url_pattern)
+
+
+def warm_up():
+    timings = {}
+
+    started = time.perf_counter()
+    _populate_resolver(get_resolver())
+    timings['url_resolver'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    try:
+        ingredient_index.build()
+    except DatabaseError as exc:
+        logger.warning(f'Индекс ингредиентов не прогрет: {exc}')
+    timings['ingredient_index'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    try:
+        if uses_name_index():
+            ingredient_name_index.ensure_fresh()
+    except DatabaseError as exc:
+        logger.warning(f'Индекс названий ингредиентов не прогрет: {exc}')
+    timings['ingredient_name_index'] = time.perf_counter() - started
+
+    # Соединения, открытые в мастер-процессе, не должны достаться
+    # форкнутым воркерам.
+    connections.close_all()
+
+    logger.info(
+        'Прогрев завершен: '
+        + ', '.join(f'{name} {seconds * 1000:.1f} мс' for name, seconds in timings.items())
+    )
+    return timings
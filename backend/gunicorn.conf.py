@@ -0,0 +1,24 @@
+import gc
+import os
+
+wsgi_app = 'foodgram.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+# Потоковые выгрузки NDJSON отдаются дольше стандартных 30 секунд
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Приложение импортируется и прогревается один раз в мастер-процессе,
+# воркеры получают его копией страниц памяти при fork.
+preload_app = True
+
+
+def when_ready(server):
+    from foodgram.warmup import warm_up
+
+    warm_up()
+
+
+def pre_fork(server, worker):
+    # Объекты мастер-процесса переносятся в постоянное поколение GC, чтобы
+    # сборщик мусора в воркерах не трогал их и не копировал страницы.
+    gc.freeze()
@@ -1,12 +1,15 @@
 from django.contrib import admin
-from django.db.models import Count
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin
 
+from .admin_tools import (
+    AutocompleteFilter, EstimatedCountPaginator,
+    ScalableAdminMixin, related_count
+)
 from .models import (
     User, Tag, Ingredient, Recipe,
     RecipeIngredient, Favorite, ShoppingCart,
-    ShortLink, Subscription
+    ShortLink, Subscription, BackgroundTask
 )
 
 
@@ -19,6 +22,8 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     ordering = ('id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = UserAdmin.fieldsets + (
         ('Аватар пользователя', {'fields': ('avatar',)}),
@@ -67,7 +72,9 @@ class IngredientAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.annotate(recipes_using_count=Count('recipes'))
+        return qs.annotate(
+            recipes_using_count=related_count(RecipeIngredient, 'ingredient')
+        )
     
     def recipes_using(self, obj):
         return obj.recipes_using_count
@@ -82,20 +89,25 @@ class IngredientInlineAdmin(admin.TabularInline):
     autocomplete_fields = ['ingredient']
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         'id', 'name', 'author', 
         'favorites_count', 'ingredient_count', 'show_image'
     )
     search_fields = ('name', 'author__username', 'author__email')
-    list_filter = ('author', 'tags', 'pub_date')
+    list_filter = (('author', AutocompleteFilter), 'tags', 'pub_date')
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
     readonly_fields = ('pub_date', 'show_image')
     filter_horizontal = ('tags',)
     inlines = (IngredientInlineAdmin,)
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.annotate(fav_count=Count('in_favorites'))
+        return qs.annotate(
+            fav_count=related_count(Favorite, 'recipe'),
+            ingredients_total=related_count(RecipeIngredient, 'recipe'),
+        )
     
     def favorites_count(self, obj):
         return obj.fav_count
@@ -103,8 +115,9 @@ class RecipeAdmin(admin.ModelAdmin):
     favorites_count.admin_order_field = 'fav_count'
     
     def ingredient_count(self, obj):
-        return obj.recipe_ingredients.count()
+        return obj.ingredients_total
     ingredient_count.short_description = 'Количество ингредиентов'
+    ingredient_count.admin_order_field = 'ingredients_total'
     
     def show_image(self, obj):
         if obj.image:
@@ -116,47 +129,57 @@ class RecipeAdmin(admin.ModelAdmin):
     show_image.short_description = 'Изображение'
 
 
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
     search_fields = ('recipe__name', 'ingredient__name')
-    list_filter = ('recipe', 'ingredient')
+    list_filter = (
+        ('recipe', AutocompleteFilter), ('ingredient', AutocompleteFilter)
+    )
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
 
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user', 'recipe')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'recipe')
+    list_filter = (('user', AutocompleteFilter), ('recipe', AutocompleteFilter))
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user', 'recipe')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'recipe')
+    list_filter = (('user', AutocompleteFilter), ('recipe', AutocompleteFilter))
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
-class ShortLinkAdmin(admin.ModelAdmin):
+class ShortLinkAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'short_id', 'recipe', 'created_at')
     search_fields = ('short_id', 'recipe__name')
     list_filter = ('created_at',)
+    list_select_related = ('recipe',)
+    autocomplete_fields = ('recipe',)
     readonly_fields = ('short_id', 'created_at')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('recipe')
 
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
     search_fields = ('user__username', 'author__username')
-    list_filter = ('user', 'author')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'author')
+    list_filter = (('user', AutocompleteFilter), ('author', AutocompleteFilter))
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+
+
+class BackgroundTaskAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'attempts',
+        'run_at', 'locked_by', 'finished_at'
+    )
+    search_fields = ('name', 'idempotency_key')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'locked_at', 'locked_by', 'finished_at')
 
 
 admin.site.register(User, CustomUserAdmin)
@@ -167,4 +190,5 @@ admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(ShortLink, ShortLinkAdmin)
-admin.site.register(Subscription, SubscriptionAdmin)
\ No newline at end of file
+admin.site.register(Subscription, SubscriptionAdmin)
+admin.site.register(BackgroundTask, BackgroundTaskAdmin)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import logging
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = getattr(
+    settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000
+)
+
+
+def related_count(model, field_name):
+    # Коррелированный подзапрос вместо GROUP BY по всей таблице:
+    # считается только для строк текущей страницы
+    counts = (
+        model.objects
+        .filter(**{field_name: OuterRef('pk')})
+        .order_by()
+        .values(field_name)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def estimate_table_rows(model, using):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+    except DatabaseError as exc:
+        logger.warning(
+            f"Не удалось оценить размер {model._meta.db_table}: {exc}"
+        )
+        return None
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    # Для больших таблиц без фильтров берем оценку планировщика
+    # вместо COUNT(*) по всей таблице
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if (
+                estimate is not None
+                and estimate >= ADMIN_ESTIMATED_COUNT_THRESHOLD
+            ):
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    template = 'admin/recipes/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+        self.title = field.verbose_name
+        self.widget_id = f'autocomplete-filter-{field_path}'
+        form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+        )
+        try:
+            selected = form_field.clean(self.lookup_val)
+        except ValidationError:
+            selected = None
+        self.rendered_widget = form_field.widget.render(
+            name=self.lookup_kwarg,
+            value=selected.pk if selected else None,
+            attrs={'id': self.widget_id, 'style': 'width: 100%'},
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.lookup_kwarg]
+            ),
+            'display': 'Все',
+        }
+
+
+class ScalableAdminMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
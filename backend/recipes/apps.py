@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
-    verbose_name = 'Рецепты'
\ No newline at end of file
+    verbose_name = 'Рецепты'
+
+    def ready(self):
+        from foodgram import db  # noqa: F401
+        from . import signals  # noqa: F401
+        autodiscover_modules('tasks')
\ No newline at end of file
@@ -0,0 +1,136 @@
+import logging
+import os
+
+from django.conf import settings
+
+from .task_queue import enqueue_batch_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Задачи очистки ставят процессы, которые меняют данные; файлы удаляет
+# воркер, которому подключен каталог proxy_cache nginx
+NGINX_CACHE_PURGE = getattr(settings, 'NGINX_CACHE_PURGE', False)
+NGINX_CACHE_PATH = getattr(settings, 'NGINX_CACHE_PATH', '')
+# Очистки транзакций за это число секунд объединяются в одну задачу
+CACHE_PURGE_WINDOW = getattr(settings, 'CACHE_PURGE_WINDOW', 1)
+# Запрос, прочитавший данные до фиксации, может сохранить в кэш старый
+# ответ уже после очистки. Повторная очистка через время, за которое
+# бэкенд гарантированно отвечает, удаляет и такие ответы
+CACHE_PURGE_REPEAT_DELAY = getattr(settings, 'CACHE_PURGE_REPEAT_DELAY', 120)
+CACHE_PURGE_SCHEDULE = (
+    (0, CACHE_PURGE_WINDOW),
+    (CACHE_PURGE_REPEAT_DELAY, CACHE_PURGE_WINDOW),
+)
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+# Служебный заголовок файла кэша, строка KEY и заголовки ответа бэкенда
+# помещаются в начало файла
+CACHE_HEADER_READ_SIZE = 16384
+
+RECIPES_KEY = 'recipes'
+TAGS_KEY = 'tags'
+INGREDIENTS_KEY = 'ingredients'
+SIMILAR_KEY = 'similar'
+
+
+def recipe_key(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def purge_keys_on_commit(*keys):
+    if NGINX_CACHE_PURGE and keys:
+        enqueue_batch_on_commit(
+            'cache.purge_surrogate_keys', 'keys', keys, CACHE_PURGE_SCHEDULE
+        )
+
+
+def cached_entry_keys(path):
+    with open(path, 'rb') as cache_file:
+        head = cache_file.read(CACHE_HEADER_READ_SIZE)
+    # Заголовки ответа идут после строки KEY и заканчиваются пустой строкой
+    start = head.find(b'\nKEY: ')
+    if start == -1:
+        return set()
+    end = head.find(b'\r\n\r\n', start)
+    header_lines = head[start:end if end != -1 else None].split(b'\r\n')
+    prefix = SURROGATE_KEY_HEADER.lower().encode() + b':'
+    for line in header_lines:
+        if line.lower().startswith(prefix):
+            return set(line[len(prefix):].decode('latin-1').split())
+    return set()
+
+
+def _cache_files(directory):
+    # Тип и inode берутся из записей каталога, без stat и чтения файлов.
+    # Пустые подкаталоги nginx удаляет сам
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _cache_files(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+            yield entry.path, entry.inode()
+
+
+class CacheEntryIndex:
+    # Ключи файлов кэша в памяти воркера. Заголовок файла читается один
+    # раз: обновленный ответ nginx записывает в новый файл, и у пути
+    # меняется inode
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._entries = {}
+
+    def refresh(self):
+        entries = {}
+        for path, inode in _cache_files(self.cache_path):
+            known = self._entries.get(path)
+            if known is not None and known[0] == inode:
+                entries[path] = known
+                continue
+            try:
+                entries[path] = (inode, cached_entry_keys(path))
+            except FileNotFoundError:
+                continue
+            except OSError as exc:
+                logger.error(f"Error reading cache entry {path}: {exc}")
+        self._entries = entries
+
+    def purge(self, keys):
+        self.refresh()
+        purged = 0
+        for path, (_, entry_keys) in list(self._entries.items()):
+            if not keys & entry_keys:
+                continue
+            del self._entries[path]
+            try:
+                os.remove(path)
+                purged += 1
+            except FileNotFoundError:
+                continue
+            except OSError as exc:
+                logger.error(f"Error purging cache entry {path}: {exc}")
+        return purged
+
+
+_indexes = {}
+
+
+def purge_cache_entries(keys, cache_path=None):
+    # Удаленный файл nginx считает промахом и заново запрашивает бэкенд,
+    # поэтому модуль очистки кэша для nginx не нужен
+    cache_path = cache_path or NGINX_CACHE_PATH
+    keys = set(keys)
+    if not cache_path or not keys:
+        return 0
+    index = _indexes.get(cache_path)
+    if index is None:
+        index = _indexes[cache_path] = CacheEntryIndex(cache_path)
+    purged = index.purge(keys)
+    logger.info(f"Purged {purged} cache entries for {sorted(keys)}")
+    return purged
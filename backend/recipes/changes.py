@@ -0,0 +1,233 @@
+import logging
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import BigIntegerField, Exists, Func, OuterRef, Q
+from django.utils import timezone
+
+from .models import ChangeLogEntry, VersionStamp
+from .versions import get_versions
+
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG_RETENTION_DAYS = getattr(settings, 'CHANGE_LOG_RETENTION_DAYS', 30)
+CHANGE_LOG_COMPACT_AFTER = timedelta(
+    minutes=getattr(settings, 'CHANGE_LOG_COMPACT_AFTER_MINUTES', 60)
+)
+CHANGE_LOG_PAGE_SIZE = getattr(settings, 'CHANGE_LOG_PAGE_SIZE', 500)
+# Позиция последней записи, удаленной по сроку хранения: курсоры до нее
+# устарели. Позиция - номер транзакции и id записи
+CHANGE_LOG_HORIZON = 'changes:horizon'
+CHANGE_LOG_HORIZON_TRANSACTION = 'changes:horizon_transaction'
+CURSOR_PATTERN = re.compile(r'^(?:(\d+)-)?(\d+)$')
+
+
+class ChangeLogExpired(Exception):
+    pass
+
+
+class TransactionId(Func):
+    template = 'txid_current()'
+    output_field = BigIntegerField()
+
+
+class SnapshotXmin(Func):
+    # Все транзакции с номером меньше xmin снимка уже завершены
+    template = 'txid_snapshot_xmin(txid_current_snapshot())'
+    output_field = BigIntegerField()
+
+
+def format_cursor(position):
+    transaction_id, entry_id = position
+    return f'{transaction_id}-{entry_id}'
+
+
+def parse_cursor(value):
+    # Курсор без номера транзакции выдавался до его появления в журнале:
+    # такие записи хранятся с номером 0
+    match = CURSOR_PATTERN.match(value)
+    if match is None:
+        return None
+    return int(match.group(1) or 0), int(match.group(2))
+
+
+def _after(position):
+    transaction_id, entry_id = position
+    return Q(transaction_id__gt=transaction_id) | Q(
+        transaction_id=transaction_id, id__gt=entry_id
+    )
+
+
+def _finished(queryset):
+    # id берется из последовательности при вставке, а транзакции
+    # фиксируются в другом порядке: запись с меньшим id может стать видна
+    # позже. В PostgreSQL отдаются только записи завершенных транзакций,
+    # упорядоченные по номеру транзакции, - все, что появится позже, будет
+    # после курсора. Долгая транзакция задерживает выдачу, но не теряет
+    # события. В SQLite запись блокирует базу до фиксации, и порядок id
+    # совпадает с порядком фиксации
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset
+    return queryset.filter(transaction_id__lt=SnapshotXmin())
+
+
+def record_changes(entity, object_ids, action=ChangeLogEntry.UPSERT,
+                   user_id=None):
+    # Записи добавляются в той же транзакции, что и изменения: откат
+    # убирает их вместе с данными, а ошибка записи в журнал отменяет
+    # изменение
+    object_ids = list(dict.fromkeys(object_ids))
+    if not object_ids:
+        return
+    using = router.db_for_write(ChangeLogEntry)
+    transaction_id = (
+        TransactionId() if connections[using].vendor == 'postgresql' else 0
+    )
+    ChangeLogEntry.objects.using(using).bulk_create([
+        ChangeLogEntry(
+            entity=entity, object_id=object_id, user_id=user_id,
+            action=action, transaction_id=transaction_id,
+        )
+        for object_id in object_ids
+    ])
+
+
+def record_change(entity, object_id, action=ChangeLogEntry.UPSERT,
+                  user_id=None):
+    record_changes(entity, [object_id], action, user_id)
+
+
+def _horizon():
+    horizon_transaction, horizon = get_versions(
+        CHANGE_LOG_HORIZON_TRANSACTION, CHANGE_LOG_HORIZON
+    )
+    return horizon_transaction, horizon
+
+
+def latest_position():
+    # Журнал может быть пуст после удаления по сроку хранения
+    last = _finished(ChangeLogEntry.objects.all()).order_by(
+        '-transaction_id', '-id'
+    ).values_list('transaction_id', 'id').first()
+    return max(last or (0, 0), _horizon())
+
+
+def latest_cursor():
+    return format_cursor(latest_position())
+
+
+def changes_since(user, since, limit=CHANGE_LOG_PAGE_SIZE):
+    if since < _horizon():
+        raise ChangeLogExpired
+
+    # Позиция берется до выборки: транзакция, завершившаяся между двумя
+    # запросами, не попадет ни в страницу, ни под курсор
+    latest = latest_position()
+    visible = Q(user__isnull=True)
+    if user is not None and user.is_authenticated:
+        visible |= Q(user=user)
+    rows = list(
+        _finished(ChangeLogEntry.objects.filter(visible, _after(since)))
+        .order_by('transaction_id', 'id')
+        .values_list(
+            'transaction_id', 'id', 'entity', 'object_id', 'action'
+        )[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        position = rows[-1][:2]
+    else:
+        # Чужие изменения пропускаются, чтобы не сканировать их повторно:
+        # позиция берется только среди завершенных транзакций
+        position = max(since, latest)
+
+    # Внутри страницы по каждому объекту достаточно последнего события
+    events = {}
+    for _, _, entity, object_id, action in rows:
+        events.pop((entity, object_id), None)
+        events[(entity, object_id)] = action
+    return {
+        'cursor': format_cursor(position),
+        'has_more': has_more,
+        'changes': [
+            {'type': entity, 'id': object_id, 'op': action}
+            for (entity, object_id), action in events.items()
+        ],
+    }
+
+
+def changed_object_ids(entity, since, limit=CHANGE_LOG_PAGE_SIZE):
+    # Объекты общих событий после позиции since для кэшей в памяти
+    # процессов: при has_more кэш дешевле построить заново
+    if since < _horizon():
+        raise ChangeLogExpired
+    latest = latest_position()
+    rows = list(
+        _finished(ChangeLogEntry.objects.filter(
+            _after(since), entity=entity, user__isnull=True
+        ))
+        .order_by('transaction_id', 'id')
+        .values_list('transaction_id', 'id', 'object_id')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    position = rows[-1][:2] if rows else max(since, latest)
+    return {object_id for _, _, object_id in rows}, position, has_more
+
+
+def _superseded(entries, same_owner):
+    newer = ChangeLogEntry.objects.filter(
+        same_owner,
+        entity=OuterRef('entity'),
+        object_id=OuterRef('object_id'),
+    ).filter(
+        Q(transaction_id__gt=OuterRef('transaction_id'))
+        | Q(transaction_id=OuterRef('transaction_id'), id__gt=OuterRef('id'))
+    )
+    return entries.filter(Exists(newer))
+
+
+def compact_change_log(now=None):
+    now = now or timezone.now()
+    stats = {'expired': 0, 'compacted': 0}
+
+    # Срок хранения: клиенты с более старым курсором получат 410 и
+    # выполнят полную синхронизацию
+    expired = ChangeLogEntry.objects.filter(
+        created_at__lt=now - timedelta(days=CHANGE_LOG_RETENTION_DAYS)
+    )
+    horizon = expired.order_by('-transaction_id', '-id').values_list(
+        'transaction_id', 'id'
+    ).first()
+    if horizon is not None:
+        with transaction.atomic():
+            for key, version in zip(
+                (CHANGE_LOG_HORIZON_TRANSACTION, CHANGE_LOG_HORIZON), horizon
+            ):
+                VersionStamp.objects.update_or_create(
+                    key=key, defaults={'version': version}
+                )
+            stats['expired'], _ = ChangeLogEntry.objects.exclude(
+                _after(horizon)
+            ).delete()
+
+    # Уплотнение: старые события, после которых по тому же объекту было
+    # более новое, ничего не меняют для клиента с любым курсором
+    old_entries = ChangeLogEntry.objects.filter(
+        created_at__lt=now - CHANGE_LOG_COMPACT_AFTER
+    )
+    for entries, same_owner in (
+        (old_entries.filter(user__isnull=True), Q(user__isnull=True)),
+        (old_entries.filter(user__isnull=False), Q(user=OuterRef('user'))),
+    ):
+        deleted, _ = _superseded(entries, same_owner).delete()
+        stats['compacted'] += deleted
+
+    logger.info(
+        f"Change log compacted: expired {stats['expired']}, "
+        f"superseded {stats['compacted']}"
+    )
+    return stats
@@ -0,0 +1,132 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import FeedEntry, Recipe, Subscription
+
+FEED_FANOUT_MAX_SUBSCRIBERS = getattr(
+    settings, 'FEED_FANOUT_MAX_SUBSCRIBERS', 1000
+)
+FEED_BACKFILL_LIMIT = getattr(settings, 'FEED_BACKFILL_LIMIT', 200)
+FEED_BATCH_SIZE = 1000
+
+
+def is_heavy_author(author_id):
+    subscribers_count = Subscription.objects.filter(author_id=author_id).count()
+    return subscribers_count > FEED_FANOUT_MAX_SUBSCRIBERS
+
+
+def fan_out_recipe(recipe):
+    # Рецепты автора с большим числом подписчиков не раздаются по лентам
+    # и остаются с fanned_out=False: они подмешиваются при чтении, даже
+    # когда подписчиков у автора станет меньше порога
+    if recipe.fanned_out or is_heavy_author(recipe.author_id):
+        return 0
+
+    subscriber_ids = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    entries = [
+        FeedEntry(
+            user_id=subscriber_id,
+            recipe_id=recipe.id,
+            author_id=recipe.author_id,
+            pub_date=recipe.pub_date
+        )
+        for subscriber_id in subscriber_ids.iterator()
+    ]
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True
+    )
+    Recipe.objects.filter(id=recipe.id).update(fanned_out=True)
+    return len(entries)
+
+
+def backfill_subscription(user_id, author_id):
+    # Копируются последние рецепты независимо от fanned_out: рассылка
+    # могла идти одновременно с подпиской, а повтор при чтении
+    # отбрасывается
+    latest_recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date').values_list('id', 'pub_date')[:FEED_BACKFILL_LIMIT]
+    entries = [
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date
+        )
+        for recipe_id, pub_date in latest_recipes
+    ]
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def trim_subscription(user_id, author_id):
+    deleted_count, _ = FeedEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+    return deleted_count
+
+
+def encode_feed_cursor(pub_date, recipe_id):
+    raw_cursor = f'{pub_date.isoformat()}|{recipe_id}'
+    return base64.urlsafe_b64encode(raw_cursor.encode()).decode()
+
+
+def decode_feed_cursor(cursor):
+    try:
+        raw_cursor = base64.urlsafe_b64decode(cursor.encode()).decode()
+        raw_date, raw_id = raw_cursor.split('|')
+        pub_date = parse_datetime(raw_date)
+        recipe_id = int(raw_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Некорректный курсор')
+    if pub_date is None:
+        raise ValueError('Некорректный курсор')
+    return pub_date, recipe_id
+
+
+def _before(position, date_field, id_field):
+    pub_date, recipe_id = position
+    return (
+        Q(**{f'{date_field}__lt': pub_date})
+        | Q(**{date_field: pub_date, f'{id_field}__lt': recipe_id})
+    )
+
+
+def get_feed_page(user, limit, cursor=None):
+    position = decode_feed_cursor(cursor) if cursor else None
+
+    timeline = FeedEntry.objects.filter(user=user)
+    if position:
+        timeline = timeline.filter(_before(position, 'pub_date', 'recipe_id'))
+    rows = set(
+        timeline.order_by('-pub_date', '-recipe_id')
+        .values_list('pub_date', 'recipe_id')[:limit + 1]
+    )
+
+    # Неразосланные рецепты авторов из подписок: авторы с большим числом
+    # подписчиков и рецепты, рассылка которых еще в очереди
+    read_side = Recipe.objects.filter(
+        fanned_out=False,
+        author_id__in=Subscription.objects.filter(user=user).values('author')
+    )
+    if position:
+        read_side = read_side.filter(_before(position, 'pub_date', 'id'))
+    rows.update(
+        read_side.order_by('-pub_date', '-id')
+        .values_list('pub_date', 'id')[:limit + 1]
+    )
+
+    ordered_rows = sorted(rows, reverse=True)
+    page_rows = ordered_rows[:limit]
+    next_cursor = None
+    if len(ordered_rows) > limit:
+        next_cursor = encode_feed_cursor(*page_rows[-1])
+    return [recipe_id for _, recipe_id in page_rows], next_cursor
@@ -0,0 +1,283 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import RecipeIngredient
+from .versions import RECIPE_INGREDIENTS_VERSION, bump_versions, get_versions
+
+logger = logging.getLogger(__name__)
+
+INGREDIENT_INDEX_TTL = getattr(settings, 'INGREDIENT_INDEX_TTL', 600)
+INGREDIENT_INDEX_CHECK_INTERVAL = getattr(
+    settings, 'INGREDIENT_INDEX_CHECK_INTERVAL', 5
+)
+INGREDIENT_INDEX_CHUNK_SIZE = 10000
+COVERAGE_PRECISION_BITS = 31
+MATCHED_BITS = 16
+
+
+class IngredientIndex:
+    # Инвертированный индекс ингредиент → отсортированный массив позиций
+    # рецептов. Позиция рецепта — индекс в массивах _recipe_ids и _sizes
+    # и в списке _ingredients с ингредиентами рецепта.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._checked_at = None
+        self._version = None
+        self._rebuild_thread = None
+        self._postings = {}
+        self._positions = {}
+        self._ingredients = []
+        self._recipe_ids = np.empty(0, dtype=np.int64)
+        self._sizes = np.empty(0, dtype=np.int32)
+        self._count = 0
+
+    def _load_pairs(self):
+        pairs = RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        )
+        flat = np.fromiter(
+            (
+                value
+                for pair in pairs.iterator(chunk_size=INGREDIENT_INDEX_CHUNK_SIZE)
+                for value in pair
+            ),
+            dtype=np.int64
+        )
+        return flat[0::2], flat[1::2]
+
+    def build(self):
+        # Версия читается до данных: изменение, закоммиченное во время
+        # загрузки, в худшем случае вызовет лишнюю пересборку
+        version, = get_versions(RECIPE_INGREDIENTS_VERSION)
+        recipe_column, ingredient_column = self._load_pairs()
+        recipe_ids, positions, sizes = np.unique(
+            recipe_column, return_inverse=True, return_counts=True
+        )
+        order = np.lexsort((positions, ingredient_column))
+        sorted_ingredients = ingredient_column[order]
+        sorted_positions = positions[order].astype(np.int32)
+        ingredient_ids, starts = np.unique(sorted_ingredients, return_index=True)
+        bounds = np.append(starts, len(sorted_ingredients))
+        order = np.lexsort((ingredient_column, positions))
+        recipe_ingredients = np.split(
+            ingredient_column[order], np.cumsum(sizes)[:-1]
+        ) if len(recipe_ids) else []
+
+        with self._lock:
+            self._postings = {
+                int(ingredient_id): sorted_positions[bounds[i]:bounds[i + 1]]
+                for i, ingredient_id in enumerate(ingredient_ids)
+            }
+            self._recipe_ids = recipe_ids.astype(np.int64)
+            self._sizes = sizes.astype(np.int32)
+            self._count = len(recipe_ids)
+            self._positions = {
+                int(recipe_id): position
+                for position, recipe_id in enumerate(recipe_ids)
+            }
+            self._ingredients = recipe_ingredients
+            self._built_at = time.monotonic()
+            self._checked_at = self._built_at
+            self._version = version
+
+    def _is_stale(self):
+        # Версия в базе сверяется не чаще раза в
+        # INGREDIENT_INDEX_CHECK_INTERVAL секунд, а не при каждом поиске
+        now = time.monotonic()
+        if now - self._built_at > INGREDIENT_INDEX_TTL:
+            return True
+        if now - self._checked_at < INGREDIENT_INDEX_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        version, = get_versions(RECIPE_INGREDIENTS_VERSION)
+        return version != self._version
+
+    def _background_build(self):
+        try:
+            self.build()
+        except Exception as exc:
+            logger.error(f"Error rebuilding ingredient index: {exc}")
+        finally:
+            connections.close_all()
+
+    def is_ready(self):
+        return self._built_at is not None
+
+    def ensure_fresh(self):
+        # Сборка всегда идет в фоновом потоке: до первой сборки (без
+        # прогрева в gunicorn) поиск возвращает None, а до окончания
+        # пересборки запросы обслуживает прежняя копия индекса.
+        # Синхронно индекс собирает только прогрев.
+        if self._built_at is not None and not self._is_stale():
+            return
+        with self._lock:
+            if self._rebuild_thread and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._background_build,
+                name='ingredient-index-build', daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def _allocate_position(self, recipe_id):
+        position = self._positions.get(recipe_id)
+        if position is not None:
+            return position
+        if self._count == len(self._recipe_ids):
+            capacity = max(16, len(self._recipe_ids) * 2)
+            self._recipe_ids = np.resize(self._recipe_ids, capacity)
+            self._sizes = np.resize(self._sizes, capacity)
+        position = self._count
+        self._recipe_ids[position] = recipe_id
+        self._sizes[position] = 0
+        self._positions[recipe_id] = position
+        self._ingredients.append(np.empty(0, dtype=np.int64))
+        self._count += 1
+        return position
+
+    def _remove_from_postings(self, position):
+        for ingredient_id in self._ingredients[position]:
+            ingredient_id = int(ingredient_id)
+            posting = self._postings.get(ingredient_id)
+            if posting is None:
+                continue
+            offset = np.searchsorted(posting, position)
+            if offset < len(posting) and posting[offset] == position:
+                self._postings[ingredient_id] = np.delete(posting, offset)
+        self._ingredients[position] = np.empty(0, dtype=np.int64)
+
+    def _mark_synced(self):
+        # Собственные изменения процесс уже применил, поэтому повышение
+        # общей версии не должно приводить к его полной пересборке.
+        # Если между сборкой и этим изменением версию повысил другой
+        # процесс, индекс остается устаревшим и пересобирается.
+        previous_version = self._version
+        current_version = bump_ingredient_index_version()
+        if current_version == previous_version + 1:
+            self._version = current_version
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        with self._lock:
+            if self._built_at is None:
+                bump_ingredient_index_version()
+                return
+            position = self._allocate_position(recipe_id)
+            self._remove_from_postings(position)
+            for ingredient_id in set(ingredient_ids):
+                posting = self._postings.get(
+                    ingredient_id, np.empty(0, dtype=np.int32)
+                )
+                offset = np.searchsorted(posting, position)
+                self._postings[ingredient_id] = np.insert(
+                    posting, offset, position
+                ).astype(np.int32)
+            self._sizes[position] = len(set(ingredient_ids))
+            self._ingredients[position] = np.array(
+                sorted(set(ingredient_ids)), dtype=np.int64
+            )
+            self._mark_synced()
+
+    def update_recipes(self, recipe_ingredients):
+        # Пакетный вариант update_recipe для импорта: позиции добавляются
+        # в каждый список одним слиянием, а не вставкой по одной
+        with self._lock:
+            if self._built_at is None:
+                bump_ingredient_index_version()
+                return
+            additions = defaultdict(list)
+            for recipe_id, ingredient_ids in recipe_ingredients.items():
+                position = self._allocate_position(recipe_id)
+                self._remove_from_postings(position)
+                unique_ids = set(ingredient_ids)
+                for ingredient_id in unique_ids:
+                    additions[ingredient_id].append(position)
+                self._sizes[position] = len(unique_ids)
+                self._ingredients[position] = np.array(
+                    sorted(unique_ids), dtype=np.int64
+                )
+            for ingredient_id, positions in additions.items():
+                posting = self._postings.get(
+                    ingredient_id, np.empty(0, dtype=np.int32)
+                )
+                self._postings[ingredient_id] = np.union1d(
+                    posting, np.array(positions, dtype=np.int32)
+                ).astype(np.int32)
+            self._mark_synced()
+
+    def remove_recipe(self, recipe_id):
+        with self._lock:
+            position = self._positions.get(recipe_id)
+            if position is None:
+                bump_ingredient_index_version()
+                return
+            self._remove_from_postings(position)
+            self._sizes[position] = 0
+            self._mark_synced()
+
+    def search(self, ingredient_ids, max_missing=None, limit=None):
+        self.ensure_fresh()
+        if not self.is_ready():
+            return None
+        with self._lock:
+            postings = [
+                self._postings[ingredient_id]
+                for ingredient_id in set(ingredient_ids)
+                if ingredient_id in self._postings
+            ]
+            if not postings:
+                return []
+            matched = np.bincount(
+                np.concatenate(postings), minlength=self._count
+            )[:self._count]
+            sizes = self._sizes[:self._count]
+            candidates = np.flatnonzero(matched)
+            candidate_matched = matched[candidates]
+            candidate_sizes = sizes[candidates]
+            recipe_ids = self._recipe_ids[candidates]
+
+        if max_missing is not None:
+            keep = candidate_sizes - candidate_matched <= max_missing
+            candidate_matched = candidate_matched[keep]
+            candidate_sizes = candidate_sizes[keep]
+            recipe_ids = recipe_ids[keep]
+
+        # Покрытие в фиксированной точке и число совпадений упакованы в
+        # один int64-ключ, чтобы отбирать top-k через argpartition,
+        # а полную сортировку выполнять только для отобранных рецептов.
+        coverage_fixed = (
+            candidate_matched.astype(np.int64) << COVERAGE_PRECISION_BITS
+        ) // candidate_sizes
+        rank_keys = (coverage_fixed << MATCHED_BITS) | candidate_matched
+        if limit is not None and limit < len(rank_keys):
+            top = np.argpartition(-rank_keys, limit - 1)[:limit]
+        else:
+            top = np.arange(len(rank_keys))
+        order = top[np.lexsort((-recipe_ids[top], -rank_keys[top]))]
+        return [
+            (
+                int(recipe_ids[i]),
+                float(candidate_matched[i]) / float(candidate_sizes[i])
+            )
+            for i in order
+        ]
+
+
+def bump_ingredient_index_version():
+    # Сообщает другим процессам, что их копии индекса устарели. Строка
+    # версии заблокирована до конца транзакции, поэтому прочитанное
+    # значение - результат именно этого повышения.
+    with transaction.atomic():
+        bump_versions(RECIPE_INGREDIENTS_VERSION)
+        version, = get_versions(RECIPE_INGREDIENTS_VERSION)
+    return version
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,220 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+from django.conf import settings
+from django.contrib.postgres.lookups import PostgresOperatorLookup
+from django.db import connections, router
+from django.db.models import (Case, CharField, F, FloatField, Func,
+                              IntegerField, Q, Value, When)
+
+from .models import Ingredient
+from .versions import INGREDIENTS_VERSION, get_versions
+
+logger = logging.getLogger(__name__)
+
+INGREDIENT_FUZZY_LIMIT = getattr(settings, 'INGREDIENT_FUZZY_LIMIT', 20)
+# Доля триграмм запроса, найденных в названии; в PostgreSQL это
+# pg_trgm.word_similarity_threshold, его выставляет foodgram.db
+INGREDIENT_FUZZY_THRESHOLD = getattr(
+    settings, 'INGREDIENT_FUZZY_THRESHOLD', 0.5
+)
+INGREDIENT_NAME_INDEX_TTL = getattr(settings, 'INGREDIENT_NAME_INDEX_TTL', 600)
+INGREDIENT_NAME_CHUNK_SIZE = 10000
+SCORE_PRECISION = 1 << 20
+WORD_PATTERN = re.compile(r'\w+')
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    # name %> запрос: в названии есть фрагмент, похожий на запрос целиком.
+    # В Django 3.2 такого lookup еще нет, GIN-индекс gin_trgm_ops его
+    # поддерживает
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
+
+
+class WordSimilarity(Func):
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+
+def normalize(value):
+    return value.lower().strip()
+
+
+def trigrams(value):
+    # Как в pg_trgm: каждое слово дополняется двумя пробелами слева и
+    # одним справа
+    grams = set()
+    for word in WORD_PATTERN.findall(normalize(value)):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class IngredientNameIndex:
+    # Отсортированные названия для поиска по префиксу и инвертированный
+    # индекс триграмма → позиции ингредиентов для нечеткого поиска.
+    # Позиция ингредиента - индекс в _names и _ingredient_ids.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._version = None
+        self._rebuild_thread = None
+        self._names = []
+        self._ingredient_ids = np.empty(0, dtype=np.int64)
+        self._sizes = np.empty(0, dtype=np.int32)
+        self._postings = {}
+
+    def build(self):
+        version, = get_versions(INGREDIENTS_VERSION)
+        rows = Ingredient.objects.order_by().values_list('id', 'name')
+        entries = sorted(
+            (normalize(name), ingredient_id)
+            for ingredient_id, name in rows.iterator(
+                chunk_size=INGREDIENT_NAME_CHUNK_SIZE
+            )
+        )
+        postings = {}
+        sizes = np.zeros(len(entries), dtype=np.int32)
+        for position, (name, _) in enumerate(entries):
+            grams = trigrams(name)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+
+        with self._lock:
+            self._names = [name for name, _ in entries]
+            self._ingredient_ids = np.array(
+                [ingredient_id for _, ingredient_id in entries],
+                dtype=np.int64
+            )
+            self._sizes = sizes
+            self._postings = {
+                gram: np.array(positions, dtype=np.int32)
+                for gram, positions in postings.items()
+            }
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def _is_stale(self):
+        if time.monotonic() - self._built_at > INGREDIENT_NAME_INDEX_TTL:
+            return True
+        version, = get_versions(INGREDIENTS_VERSION)
+        return version != self._version
+
+    def _background_build(self):
+        try:
+            self.build()
+        except Exception as exc:
+            logger.error(f"Error rebuilding ingredient name index: {exc}")
+        finally:
+            connections.close_all()
+
+    def ensure_fresh(self):
+        # Первая сборка выполняется сразу (обычно при прогреве), последующие -
+        # в фоновом потоке, а запросы до ее окончания обслуживает прежняя
+        # копия индекса
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.build()
+            return
+        if not self._is_stale():
+            return
+        with self._lock:
+            if self._rebuild_thread and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._background_build,
+                name='ingredient-name-index-build', daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def search(self, query, limit=INGREDIENT_FUZZY_LIMIT):
+        # Пустой запрос - префикс любого названия, а не поиск
+        query = normalize(query)
+        if not query:
+            return []
+        self.ensure_fresh()
+        with self._lock:
+            start = bisect_left(self._names, query)
+            end = bisect_left(self._names, query + '\U0010ffff')
+            prefix_positions = np.arange(start, min(end, start + limit))
+            result = [int(i) for i in self._ingredient_ids[prefix_positions]]
+            remaining = limit - len(result)
+
+            grams = trigrams(query)
+            postings = [
+                self._postings[gram] for gram in grams
+                if gram in self._postings
+            ]
+            if remaining <= 0 or not postings:
+                return result
+            shared = np.bincount(
+                np.concatenate(postings), minlength=len(self._names)
+            )
+            shared[start:end] = 0
+            candidates = np.flatnonzero(
+                shared >= INGREDIENT_FUZZY_THRESHOLD * len(grams)
+            )
+            candidate_shared = shared[candidates]
+            ingredient_ids = self._ingredient_ids[candidates]
+            candidate_sizes = self._sizes[candidates]
+
+        # Сначала доля найденных триграмм запроса (аналог word_similarity),
+        # затем сходство с названием целиком; оба значения упакованы в
+        # один ключ для отбора top-k через argpartition
+        coverage = candidate_shared * SCORE_PRECISION // len(grams)
+        similarity = candidate_shared * SCORE_PRECISION // (
+            len(grams) + candidate_sizes - candidate_shared
+        )
+        rank_keys = coverage.astype(np.int64) * (SCORE_PRECISION + 1) + similarity
+        if remaining < len(rank_keys):
+            top = np.argpartition(-rank_keys, remaining - 1)[:remaining]
+        else:
+            top = np.arange(len(rank_keys))
+        # При равном ключе позиция сохраняет алфавитный порядок
+        order = top[np.lexsort((candidates[top], -rank_keys[top]))]
+        return result + [int(i) for i in ingredient_ids[order]]
+
+
+ingredient_name_index = IngredientNameIndex()
+
+
+def uses_name_index():
+    # В PostgreSQL поиск выполняет GIN-индекс по триграммам
+    connection = connections[router.db_for_read(Ingredient)]
+    return connection.vendor != 'postgresql'
+
+
+def fuzzy_search(queryset, query, limit=INGREDIENT_FUZZY_LIMIT):
+    # Сначала совпадения по префиксу, затем похожие по триграммам
+    if not normalize(query):
+        return queryset.none()
+    if not uses_name_index():
+        prefix = Q(name__istartswith=query)
+        return queryset.filter(
+            prefix | Q(name__trigram_word_similar=query)
+        ).annotate(
+            prefix_rank=Case(
+                When(prefix, then=Value(0)), default=Value(1),
+                output_field=IntegerField()
+            ),
+            word_similarity=WordSimilarity(Value(query), F('name')),
+        ).order_by('prefix_rank', '-word_similarity', 'name')[:limit]
+
+    ranked_ids = ingredient_name_index.search(query, limit)
+    if not ranked_ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(id=ingredient_id, then=rank)
+          for rank, ingredient_id in enumerate(ranked_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(id__in=ranked_ids).order_by(ranking)
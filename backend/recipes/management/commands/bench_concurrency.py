@@ -0,0 +1,194 @@
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name=а',
+    '/api/ingredients/?name=мо',
+)
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+async def _read_chunked(reader):
+    while True:
+        size_line = await reader.readline()
+        chunk_size = int(size_line.split(b';')[0].strip(), 16)
+        await reader.readexactly(chunk_size + 2)
+        if chunk_size == 0:
+            return
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Соединение закрыто сервером')
+    version, status_code = status_line.split()[:2]
+    status_code = int(status_code)
+    content_length = None
+    chunked = False
+    keep_alive = version == b'HTTP/1.1'
+    while True:
+        header_line = await reader.readline()
+        if header_line in (b'\r\n', b'\n', b''):
+            break
+        header_name, _, header_value = header_line.decode('latin-1').partition(':')
+        header_name = header_name.strip().lower()
+        header_value = header_value.strip().lower()
+        if header_name == 'content-length':
+            content_length = int(header_value)
+        elif header_name == 'transfer-encoding':
+            chunked = 'chunked' in header_value
+        elif header_name == 'connection':
+            keep_alive = header_value == 'keep-alive' or (
+                keep_alive and header_value != 'close'
+            )
+    if chunked:
+        await _read_chunked(reader)
+    elif content_length is not None:
+        await reader.readexactly(content_length)
+    else:
+        # Без длины тело заканчивается закрытием соединения
+        await reader.read()
+        keep_alive = False
+    return status_code, keep_alive
+
+
+async def _virtual_client(host, port, paths, offset, deadline, results):
+    reader = writer = None
+    request_number = offset
+    while time.monotonic() < deadline:
+        # Путь кодируется, иначе кириллица в строке запроса дает 400
+        path = quote(paths[request_number % len(paths)], safe='/?&=%:')
+        request_number += 1
+        started = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+                f'Accept: application/json\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            status_code, keep_alive = await asyncio.wait_for(
+                _read_response(reader), max(deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            # Ответ не успел прийти до конца замера
+            results['unfinished'] += 1
+            break
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            results['connection_errors'] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+            continue
+        results['latencies'].append(time.monotonic() - started)
+        results['statuses'][status_code] += 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_benchmark(base_url, paths, concurrency, duration):
+    url_parts = urlsplit(base_url)
+    host = url_parts.hostname
+    port = url_parts.port or 80
+    results = {
+        'latencies': [], 'statuses': Counter(),
+        'connection_errors': 0, 'unfinished': 0,
+    }
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        _virtual_client(host, port, paths, offset, deadline, results)
+        for offset in range(concurrency)
+    ))
+    return results
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Нагрузочный замер чтения API при заданном числе одновременных '
+        'соединений. Запускается поочередно против WSGI '
+        '(gunicorn foodgram.wsgi) и ASGI (uvicorn foodgram.asgi) развертывания'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'base_url',
+            type=str,
+            help='Адрес сервера, например http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=500,
+            help='Количество одновременных соединений'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность замера в секундах'
+        )
+        parser.add_argument(
+            '--path',
+            dest='paths',
+            action='append',
+            help='Запрашиваемый путь, можно указать несколько раз'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Файл для сохранения результатов в формате JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('Число соединений должно быть положительным')
+        paths = options.get('paths') or list(DEFAULT_PATHS)
+        results = asyncio.run(run_benchmark(
+            options['base_url'], paths,
+            options['concurrency'], options['duration']
+        ))
+
+        latencies = sorted(results['latencies'])
+        summary = {
+            'base_url': options['base_url'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'requests': len(latencies),
+            'statuses': {
+                str(status): count
+                for status, count in sorted(results['statuses'].items())
+            },
+            'connection_errors': results['connection_errors'],
+            'unfinished': results['unfinished'],
+            'throughput': round(len(latencies) / options['duration'], 2),
+            'latency_ms': {
+                'mean': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+                'p50': round(_percentile(latencies, 50) * 1000, 2) if latencies else None,
+                'p95': round(_percentile(latencies, 95) * 1000, 2) if latencies else None,
+                'p99': round(_percentile(latencies, 99) * 1000, 2) if latencies else None,
+            },
+        }
+
+        if options.get('output'):
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                json.dump(summary, output_file, ensure_ascii=False, indent=2)
+        self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
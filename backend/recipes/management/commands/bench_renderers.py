@@ -0,0 +1,125 @@
+import base64
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from api.parsers import FastJSONParser, MessagePackParser, msgpack, orjson
+from api.renderers import FastJSONRenderer, MessagePackRenderer
+
+RECIPE_TEXT = (
+    'Разогрейте духовку до 180 градусов. Смешайте муку, сахар и соль, '
+    'добавьте яйца и молоко, тщательно вымешайте тесто. '
+) * 8
+
+
+def _recipe_list_page(recipes_count, ingredients_per_recipe):
+    results = ReturnList(serializer=None)
+    for recipe_id in range(1, recipes_count + 1):
+        results.append(OrderedDict([
+            ('id', recipe_id),
+            ('author', OrderedDict([
+                ('email', f'author{recipe_id % 17}@example.com'),
+                ('id', recipe_id % 17),
+                ('username', f'author{recipe_id % 17}'),
+                ('first_name', 'Александра'),
+                ('last_name', 'Погроманова'),
+                ('is_subscribed', recipe_id % 3 == 0),
+                ('avatar', f'http://localhost/media/users/avatars/{recipe_id}.png'),
+            ])),
+            ('ingredients', [
+                OrderedDict([
+                    ('id', ingredient_id),
+                    ('name', f'ингредиент номер {ingredient_id}'),
+                    ('measurement_unit', 'г'),
+                    ('amount', ingredient_id * 10),
+                ])
+                for ingredient_id in range(1, ingredients_per_recipe + 1)
+            ]),
+            ('is_favorited', recipe_id % 2 == 0),
+            ('is_in_shopping_cart', recipe_id % 5 == 0),
+            ('name', f'Пирог с яблоками №{recipe_id}'),
+            ('image', f'http://localhost/media/recipes/images/{recipe_id}.jpg'),
+            ('text', RECIPE_TEXT),
+            ('cooking_time', 45),
+        ]))
+    return ReturnDict([
+        ('count', recipes_count * 50),
+        ('next', 'http://localhost/api/recipes/?limit=100&page=2'),
+        ('previous', None),
+        ('results', results),
+    ], serializer=None)
+
+
+def _recipe_post_body(image_bytes):
+    return {
+        'ingredients': [{'id': ingredient_id, 'amount': 10} for ingredient_id in range(1, 13)],
+        'tags': [1, 2],
+        'name': 'Пирог с яблоками',
+        'image': 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode(),
+        'text': RECIPE_TEXT,
+        'cooking_time': 45,
+    }
+
+
+def _measure(callable_obj, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        callable_obj()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+class Command(BaseCommand):
+
+    help = 'Сравнение скорости рендереров и парсеров API на типичных данных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=10)
+        parser.add_argument('--image-kb', type=int, default=300)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        page = _recipe_list_page(options['recipes'], options['ingredients'])
+        post_body = _recipe_post_body(os.urandom(options['image_kb'] * 1024))
+
+        renderers = [('stdlib json', JSONRenderer())]
+        parsers = [('stdlib json', JSONParser(), JSONRenderer().render(post_body))]
+        if orjson is not None:
+            renderers.append(('orjson', FastJSONRenderer()))
+            parsers.append(('orjson', FastJSONParser(), JSONRenderer().render(post_body)))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+            parsers.append(('msgpack', MessagePackParser(), MessagePackRenderer().render(post_body)))
+
+        reference = json.loads(JSONRenderer().render(page))
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Рендеринг страницы из {options["recipes"]} рецептов:'
+        ))
+        for name, renderer in renderers:
+            rendered = renderer.render(page)
+            if renderer.format == 'json':
+                assert json.loads(rendered) == reference, name
+            elapsed = _measure(lambda: renderer.render(page), iterations)
+            self.stdout.write(
+                f'  {name:<12} {elapsed:8.3f} мс  {len(rendered) / 1024:8.1f} КБ'
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Разбор тела POST с изображением {options["image_kb"]} КБ:'
+        ))
+        for name, parser, body in parsers:
+            elapsed = _measure(
+                lambda: parser.parse(io.BytesIO(body), parser_context={}),
+                iterations
+            )
+            self.stdout.write(
+                f'  {name:<12} {elapsed:8.3f} мс  {len(body) / 1024:8.1f} КБ'
+            )
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.query_plans import (FULL_SCAN_PATTERNS, build_queries, explain,
+                                 full_scans)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Проверка планов выполнения горячих запросов на текущей базе: '
+        'ни один из них не должен читать таблицу целиком. На тестовой базе '
+        'то же проверяет recipes.tests.test_query_plans'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            default=1,
+            help='id пользователя, от имени которого строятся запросы'
+        )
+        parser.add_argument(
+            '--author',
+            type=int,
+            default=1,
+            help='id автора для фильтра и подписок'
+        )
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='Вывести планы всех запросов'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(
+                f'Проверка планов для {connection.vendor} не поддерживается'
+            )
+
+        user = User(pk=options['user'])
+        failures = []
+        for name, queryset in build_queries(user, options['author']).items():
+            plan = explain(queryset)
+            scanned = full_scans(plan)
+            if options['show_plans']:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: полный проход по {", ".join(scanned)}'
+                ))
+            else:
+                self.stdout.write(f'{name}: OK')
+
+        if failures:
+            raise CommandError(
+                f'Запросы без подходящего индекса: {", ".join(failures)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
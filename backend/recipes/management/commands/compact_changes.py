@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.changes import compact_change_log
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Уплотнение журнала изменений: удаление событий старше срока '
+        'хранения и событий, перекрытых более новыми по тому же объекту'
+    )
+
+    def handle(self, *args, **options):
+        stats = compact_change_log()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Журнал изменений уплотнен: удалено по сроку хранения '
+                f'{stats["expired"]}, перекрытых событий {stats["compacted"]}'
+            )
+        )
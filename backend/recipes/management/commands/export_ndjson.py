@@ -0,0 +1,69 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import (EXPORT_CHUNK_SIZE, catalog_records, stream_ndjson,
+                         user_records)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+
+    help = 'Потоковая выгрузка данных в формате NDJSON'
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument(
+            '--user',
+            help='Email пользователя: профиль, рецепты, избранное, корзина, подписки'
+        )
+        target.add_argument(
+            '--catalog',
+            action='store_true',
+            help='Весь каталог: теги, ингредиенты и рецепты'
+        )
+        target.add_argument(
+            '--author',
+            type=int,
+            help='Рецепты одного автора по его id'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для записи (по умолчанию stdout)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Размер чанка серверного курсора'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+            records = user_records(user, chunk_size)
+        else:
+            records = catalog_records(options['author'], chunk_size)
+
+        output_path = options['output']
+        output = (
+            sys.stdout.buffer if output_path == '-'
+            else open(output_path, 'wb')
+        )
+        lines_count = 0
+        try:
+            for line in stream_ndjson(records):
+                output.write(line)
+                lines_count += 1
+        finally:
+            if output_path != '-':
+                output.close()
+        self.stderr.write(
+            self.style.SUCCESS(f'Выгружено записей: {lines_count}')
+        )
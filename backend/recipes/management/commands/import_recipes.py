@@ -0,0 +1,83 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bulk_import import import_recipes
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+
+    help = 'Пакетный импорт рецептов из JSONL-файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'jsonl_path',
+            type=str,
+            help='Путь к файлу: один рецепт в формате JSON на строку'
+        )
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Email или username автора импортируемых рецептов'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество рецептов в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(email=options['author']).first() or (
+            User.objects.filter(username=options['author']).first()
+        )
+        if author is None:
+            raise CommandError(f'Автор {options["author"]} не найден')
+
+        batch_size = options['batch_size']
+        created_count = 0
+        error_count = 0
+        try:
+            with open(options['jsonl_path'], encoding='utf-8') as source:
+                batch = []
+                for line_number, line in enumerate(source, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append((line_number, json.loads(line)))
+                    except json.JSONDecodeError as exc:
+                        error_count += 1
+                        self._report_error(line_number, f'Некорректный JSON: {exc}')
+                        continue
+                    if len(batch) >= batch_size:
+                        created, errors = self._import_batch(author, batch)
+                        created_count += created
+                        error_count += errors
+                        batch = []
+                if batch:
+                    created, errors = self._import_batch(author, batch)
+                    created_count += created
+                    error_count += errors
+        except OSError as exc:
+            raise CommandError(f'Не удалось прочитать файл: {exc}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Импорт завершен: добавлено {created_count} рецептов, '
+                f'отклонено {error_count} строк'
+            )
+        )
+
+    def _import_batch(self, author, batch):
+        report = import_recipes(author, batch)
+        for error in report['errors']:
+            self._report_error(error['row'], json.dumps(
+                error['errors'], ensure_ascii=False
+            ))
+        return len(report['created']), len(report['errors'])
+
+    def _report_error(self, line_number, message):
+        self.stderr.write(f'Строка {line_number}: {message}')
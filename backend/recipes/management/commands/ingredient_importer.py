@@ -5,7 +5,11 @@ from collections import defaultdict
 from django.db import transaction
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from recipes.models import Ingredient
+from django.db.models import Max
+from recipes.cache_purge import INGREDIENTS_KEY, purge_keys_on_commit
+from recipes.changes import record_changes
+from recipes.models import ChangeLogEntry, Ingredient
+from recipes.versions import INGREDIENTS_VERSION, bump_versions
 
 
 class Command(BaseCommand):
@@ -47,11 +51,20 @@ class Command(BaseCommand):
             self.stdout.write(f'В базе данных уже имеется {len(existing_items)} ингредиентов')
             
             with transaction.atomic():
+                last_id = Ingredient.objects.aggregate(last_id=Max('id'))['last_id'] or 0
                 imported_count = self._process_ingredients(
                     ingredient_list, 
                     existing_items, 
                     chunk_size
                 )
+                # bulk_create не отправляет сигналы: новые ингредиенты
+                # попадают в журнал изменений и поисковый индекс здесь
+                record_changes(
+                    ChangeLogEntry.INGREDIENT,
+                    Ingredient.objects.filter(id__gt=last_id).values_list('id', flat=True)
+                )
+                purge_keys_on_commit(INGREDIENTS_KEY)
+                bump_versions(INGREDIENTS_VERSION)
             
             self.stdout.write(
                 self.style.SUCCESS(
@@ -0,0 +1,171 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.load_testing import (
+    DEFAULT_SCENARIOS, LOAD_TEST_COLLECTION, build_report, build_scenarios,
+    load_collection, prepare_fixtures, remove_fixtures, run_load_test
+)
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Нагрузочный тест по сценариям из Postman-коллекции. Виртуальные '
+        'пользователи выбирают сценарии с заданными весами; отчет с '
+        'пропускной способностью, p50/p95/p99 и долей ошибок по каждому '
+        'эндпоинту сохраняется в JSON. Ограничения частоты сервера '
+        '(TOKEN_BUCKET_RATES, DEFAULT_THROTTLE_RATES) действуют и здесь: '
+        'ответы 429 считаются отдельно от ошибок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'base_url',
+            type=str,
+            nargs='?',
+            default='http://127.0.0.1:8000',
+            help='Адрес сервера, например http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Количество виртуальных пользователей'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=60,
+            help='Длительность теста в секундах'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            help='Количество тестовых учетных записей (по умолчанию '
+                 'равно числу виртуальных пользователей)'
+        )
+        parser.add_argument(
+            '--recipes-per-user',
+            type=int,
+            default=3,
+            help='Сколько рецептов создать каждой тестовой учетной записи'
+        )
+        parser.add_argument(
+            '--collection',
+            type=str,
+            default=str(LOAD_TEST_COLLECTION),
+            help='Путь к Postman-коллекции'
+        )
+        parser.add_argument(
+            '--scenarios',
+            type=str,
+            help='JSON-файл со сценариями в формате DEFAULT_SCENARIOS'
+        )
+        parser.add_argument(
+            '--weight',
+            dest='weights',
+            action='append',
+            default=[],
+            help='Вес сценария в виде name=N, N=0 исключает сценарий'
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            default=0,
+            help='Пауза между шагами сценария в секундах'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Начальное значение генератора для воспроизводимых прогонов'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='load_test_report.json',
+            help='Файл для отчета в формате JSON'
+        )
+        parser.add_argument(
+            '--cleanup',
+            action='store_true',
+            help='Удалить тестовые учетные записи и их данные и выйти'
+        )
+
+    def load_scenarios(self, options):
+        scenarios = DEFAULT_SCENARIOS
+        if options.get('scenarios'):
+            with open(options['scenarios'], encoding='utf-8') as source:
+                scenarios = json.load(source)
+        scenarios = {
+            name: dict(scenario) for name, scenario in scenarios.items()
+        }
+        for weight in options['weights']:
+            name, _, value = weight.partition('=')
+            if name not in scenarios or not value.isdigit():
+                raise CommandError(f'Неверный вес сценария: {weight}')
+            scenarios[name]['weight'] = int(value)
+        scenarios = {
+            name: scenario for name, scenario in scenarios.items()
+            if scenario.get('weight', 1) > 0
+        }
+        if not scenarios:
+            raise CommandError('Не выбран ни один сценарий')
+        return scenarios
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted = remove_fixtures()
+            self.stdout.write(
+                self.style.SUCCESS(f'Удалено тестовых объектов: {deleted}')
+            )
+            return
+        if options['concurrency'] < 1:
+            raise CommandError('Число пользователей должно быть положительным')
+
+        try:
+            requests, variables = load_collection(options['collection'])
+            scenarios = build_scenarios(
+                requests, self.load_scenarios(options)
+            )
+            fixtures = prepare_fixtures(
+                requests, variables,
+                options.get('users') or options['concurrency'],
+                options['recipes_per_user']
+            )
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            f'Подготовлено пользователей: {len(fixtures["users"])}, '
+            f'рецептов: {len(fixtures["recipe_ids"])}. '
+            f'Нагрузка {options["concurrency"]} пользователей '
+            f'в течение {options["duration"]} с...'
+        )
+        run = asyncio.run(run_load_test(
+            options['base_url'], scenarios, fixtures, variables,
+            options['concurrency'], options['duration'],
+            think_time=options['think_time'], seed=options.get('seed')
+        ))
+        report = build_report(run, scenarios, options)
+
+        with open(options['output'], 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+
+        for endpoint, stats in report['endpoints'].items():
+            latency = stats['latency_ms']
+            self.stdout.write(
+                f'{endpoint:<55} {stats["requests"]:>7} '
+                f'p50={latency["p50"]} p95={latency["p95"]} '
+                f'p99={latency["p99"]} ошибок={stats["error_rate"]:.2%} '
+                f'429={stats["throttled_rate"]:.2%}'
+            )
+        total = report['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {total["requests"]} запросов, '
+            f'{total["throughput_rps"]} запр/с, '
+            f'ошибок {total["error_rate"]:.2%}, '
+            f'отказов ограничителей (429) {total["throttled_rate"]:.2%}. '
+            f'Отчет сохранен в {options["output"]}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import (rebuild_similar_recipes,
+                                refresh_similar_recipes)
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Пересчет списков похожих рецептов. Изменения рецептов учитываются '
+        'воркером автоматически; полный пересчет нужен после первого '
+        'развертывания и после удаления тегов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe',
+            dest='recipe_ids',
+            type=int,
+            action='append',
+            default=[],
+            help='Пересчитать только затронутые изменением рецепта списки'
+        )
+
+    def handle(self, *args, **options):
+        if options['recipe_ids']:
+            stats = refresh_similar_recipes(options['recipe_ids'])
+            message = f'Обновлено списков: {stats["refreshed"]}'
+        else:
+            stats = rebuild_similar_recipes()
+            message = f'Списки пересчитаны для {stats["recipes"]} рецептов'
+        self.stdout.write(self.style.SUCCESS(message))
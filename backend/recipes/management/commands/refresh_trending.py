@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import refresh_trending_scores
+
+
+class Command(BaseCommand):
+
+    help = 'Пересчет рейтинга популярных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Полностью пересобрать рейтинг вместо инкрементального обновления'
+        )
+
+    def handle(self, *args, **options):
+        stats = refresh_trending_scores(full=options.get('full'))
+        mode = 'полный' if stats['full'] else 'инкрементальный'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчет рейтинга ({mode}) завершен: '
+                f'обновлено {stats["updated"]}, добавлено {stats["created"]}, '
+                f'удалено {stats["pruned"]}'
+            )
+        )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from recipes.task_queue import (TASK_QUEUE_BATCH_SIZE,
+                                TASK_QUEUE_POLL_INTERVAL, run_worker)
+
+
+class Command(BaseCommand):
+
+    help = 'Обработчик фоновых задач из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TASK_QUEUE_BATCH_SIZE,
+            help='Сколько задач забирать из очереди за один раз'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=TASK_QUEUE_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунды'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Обработать готовые задачи и завершиться'
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=None,
+            help='Имя обработчика (по умолчанию хост:pid)'
+        )
+
+    def handle(self, *args, **options):
+        stats = run_worker(
+            worker_id=options['worker_id'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработчик остановлен: выполнено {stats["done"]}, '
+                f'с ошибкой {stats["failed"]}'
+            )
+        )
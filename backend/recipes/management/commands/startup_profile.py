@@ -0,0 +1,149 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILE_SCRIPT = r'''
+import json
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+
+from django.apps import AppConfig
+
+app_timings = {{}}
+original_create = AppConfig.create.__func__
+
+
+def _timed(app_label, phase, method):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = method(*args, **kwargs)
+        app_timings.setdefault(app_label, {{}})[phase] = time.perf_counter() - started
+        return result
+    return wrapper
+
+
+def timed_create(cls, entry):
+    app_config = original_create(cls, entry)
+    app_config.import_models = _timed(
+        app_config.label, 'models', app_config.import_models
+    )
+    app_config.ready = _timed(app_config.label, 'ready', app_config.ready)
+    return app_config
+
+
+AppConfig.create = classmethod(timed_create)
+
+phases = {{}}
+started = time.perf_counter()
+import django
+django.setup()
+phases['django_setup'] = time.perf_counter() - started
+
+started = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+phases['urlconf'] = time.perf_counter() - started
+
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+phases['wsgi_application'] = time.perf_counter() - started
+
+if {warm_up!r}:
+    from foodgram.warmup import warm_up
+    for name, seconds in warm_up().items():
+        phases[f'warm_up.{{name}}'] = seconds
+
+print(json.dumps({{'phases': phases, 'apps': app_timings}}))
+'''
+
+
+def _parse_importtime(stderr):
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module_name = line[len('import time:'):].split('|')
+        modules.append({
+            'module': module_name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        })
+    return modules
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Профилирование запуска: время импорта модулей, загрузки моделей и '
+        'ready() каждого приложения, URLconf и прогрева'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=25,
+            help='Сколько самых медленных модулей показать'
+        )
+        parser.add_argument(
+            '--no-warm-up',
+            dest='warm_up',
+            action='store_false',
+            help='Не выполнять прогрев кэшей'
+        )
+        parser.add_argument(
+            '--json',
+            dest='as_json',
+            action='store_true',
+            help='Вывести результат в формате JSON'
+        )
+
+    def handle(self, *args, **options):
+        script = PROFILE_SCRIPT.format(
+            settings_module=settings.SETTINGS_MODULE,
+            warm_up=options['warm_up'],
+        )
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True,
+            text=True,
+            cwd=str(settings.PROJECT_ROOT),
+        )
+        if process.returncode != 0:
+            raise CommandError(f'Ошибка профилирования:\n{process.stderr[-2000:]}')
+
+        report = json.loads(process.stdout.strip().splitlines()[-1])
+        modules = sorted(
+            _parse_importtime(process.stderr),
+            key=lambda module: module['self_ms'],
+            reverse=True
+        )
+        report['modules'] = modules[:options['top']]
+
+        if options['as_json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Этапы запуска:'))
+        for phase, seconds in report['phases'].items():
+            self.stdout.write(f'  {phase:<32} {seconds * 1000:9.1f} мс')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Приложения (models / ready):'))
+        for app_label, app_timing in report['apps'].items():
+            self.stdout.write(
+                f'  {app_label:<32} {app_timing.get("models", 0) * 1000:9.1f} мс'
+                f' {app_timing.get("ready", 0) * 1000:9.1f} мс'
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Самые медленные импорты (self / cumulative):'))
+        for module in report['modules']:
+            self.stdout.write(
+                f'  {module["module"]:<48} {module["self_ms"]:9.1f} мс'
+                f' {module["cumulative_ms"]:9.1f} мс'
+            )
@@ -0,0 +1,528 @@
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+from collections import Counter, defaultdict, namedtuple
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+
+from api.bulk_import import import_recipes
+from recipes.models import Ingredient, Recipe
+
+User = get_user_model()
+
+LOAD_TEST_COLLECTION = Path(getattr(
+    settings, 'LOAD_TEST_COLLECTION',
+    Path(settings.PROJECT_ROOT).parent
+    / 'postman_collection' / 'foodgram.postman_collection.json'
+))
+LOAD_TEST_USER_PREFIX = 'loadtest-user-'
+
+VARIABLE_PATTERN = re.compile(r'{{(\w+)}}')
+
+PostmanRequest = namedtuple(
+    'PostmanRequest', 'name method url body content_type auth_header'
+)
+
+# Сценарии составлены из запросов коллекции; шаги ссылаются на конец
+# пути запроса в дереве папок. Каждый сценарий возвращает данные в
+# исходное состояние, поэтому виртуальный пользователь повторяет его
+# без ошибок «уже добавлено».
+DEFAULT_SCENARIOS = {
+    'anonymous_browse': {
+        'weight': 50,
+        'steps': [
+            'get_recipes/get_recipes_list // No Auth',
+            'get_recipes/get_recipe_detail // No Auth',
+            'get_ingradients/get_ingredients_list // No Auth',
+            'get_recipe_short_link/get_recipe_short_link // No Auth',
+        ],
+    },
+    'user_browse': {
+        'weight': 25,
+        'steps': [
+            'get_recipes/get_recipes_list // User',
+            'get_recipes/get_recipes_list_with_author_param // User',
+            'get_recipes/get_recipe_detail // User',
+            'get_ingredients_list_with_name_filter // User',
+            'get_user_info/users_me // User',
+        ],
+    },
+    'favorites_and_cart': {
+        'weight': 12,
+        'steps': [
+            'add_to_favorite/add_to_favorite // User',
+            'get_recipes_list_with_is_favorited_param // User',
+            'add_to_shopping_cart/add_to_shopping_cart // User',
+            'get_recipes_list_with_is_in_shopping_cart_param // User',
+            'download_shopping_cart/download_shopping_cart // User',
+            'remove_from_shopping_cart // User',
+            'remove_from_favorite // User',
+        ],
+    },
+    'subscriptions': {
+        'weight': 8,
+        'steps': [
+            'create_subscription_with_recipes_limit_param // User',
+            'get_subscription_list_with_recipes_limit_param // User',
+            'delete_second_subscription // User',
+        ],
+    },
+    'authoring': {
+        'weight': 5,
+        'steps': [
+            {
+                'request': 'create_first_recipe // Second User',
+                'capture': {'firstRecipeId': 'id'},
+            },
+            'update_recipe // Second User',
+            'delete_first_recipe // Second User',
+        ],
+    },
+}
+
+
+def render(template, variables):
+    return VARIABLE_PATTERN.sub(
+        lambda match: str(variables.get(match.group(1), match.group(0))),
+        template
+    )
+
+
+def _request_auth_header(auth):
+    if not auth or auth.get('type') != 'apikey':
+        return None
+    options = {item['key']: item['value'] for item in auth['apikey']}
+    return options.get('key', 'Authorization'), options.get('value', '')
+
+
+def _walk_items(items, path, inherited_auth):
+    for item in items:
+        item_path = f'{path}/{item["name"]}' if path else item['name']
+        if 'item' in item:
+            yield from _walk_items(
+                item['item'], item_path, item.get('auth') or inherited_auth
+            )
+            continue
+        request = item['request']
+        url = request['url']
+        body = request.get('body') or {}
+        language = body.get('options', {}).get('raw', {}).get('language')
+        yield PostmanRequest(
+            name=item_path,
+            method=request['method'],
+            url=(url['raw'] if isinstance(url, dict) else url).replace(
+                '{{baseUrl}}', ''
+            ),
+            body=body.get('raw') if body.get('mode') == 'raw' else None,
+            content_type='application/json' if language == 'json' else None,
+            auth_header=_request_auth_header(
+                request.get('auth') or inherited_auth
+            ),
+        )
+
+
+def load_collection(path=LOAD_TEST_COLLECTION):
+    with open(path, encoding='utf-8') as collection_file:
+        collection = json.load(collection_file)
+    requests = list(_walk_items(
+        collection['item'], '', collection.get('auth')
+    ))
+    variables = {
+        variable['key']: variable['value']
+        for variable in collection.get('variable', [])
+    }
+    return requests, variables
+
+
+def resolve_request(requests, reference):
+    matches = [
+        request for request in requests
+        if request.name == reference
+        or request.name.endswith(f'/{reference}')
+    ]
+    if len(matches) != 1:
+        found = ', '.join(request.name for request in matches) or 'нет'
+        raise ValueError(
+            f'Шаг «{reference}» должен указывать ровно на один запрос '
+            f'коллекции, найдено: {found}'
+        )
+    return matches[0]
+
+
+def build_scenarios(requests, scenarios):
+    built = {}
+    for name, scenario in scenarios.items():
+        steps = []
+        for step in scenario['steps']:
+            if isinstance(step, str):
+                step = {'request': step}
+            steps.append({
+                'request': resolve_request(requests, step['request']),
+                'capture': step.get('capture', {}),
+            })
+        built[name] = {'weight': scenario.get('weight', 1), 'steps': steps}
+    return built
+
+
+def endpoint_key(request):
+    url = VARIABLE_PATTERN.sub(r'{\1}', request.url)
+    return f'{request.method} {url}'
+
+
+def prepare_fixtures(requests, base_variables, users_count, recipes_per_user):
+    # Пользователи, токены и рецепты создаются напрямую в БД, с которой
+    # работает сервер: так подготовка не упирается в ограничения частоты
+    ingredients = list(
+        Ingredient.objects.order_by('id').values_list('id', 'name')[:50]
+    )
+    if len(ingredients) < 2:
+        raise ValueError(
+            'Для нагрузочного теста нужно хотя бы два ингредиента, '
+            'загрузите их командой ingredient_importer'
+        )
+
+    existing = set(User.objects.filter(
+        username__startswith=LOAD_TEST_USER_PREFIX
+    ).values_list('username', flat=True))
+    new_users = []
+    for number in range(users_count):
+        username = f'{LOAD_TEST_USER_PREFIX}{number}'
+        if username in existing:
+            continue
+        user = User(
+            username=username,
+            email=f'{username}@loadtest.local',
+            first_name='Load',
+            last_name=f'Test {number}',
+        )
+        user.set_unusable_password()
+        new_users.append(user)
+    User.objects.bulk_create(new_users)
+
+    users = list(User.objects.filter(
+        username__in=[
+            f'{LOAD_TEST_USER_PREFIX}{number}' for number in range(users_count)
+        ]
+    ).order_by('id'))
+    tokens = dict(Token.objects.filter(user__in=users).values_list(
+        'user_id', 'key'
+    ))
+    new_tokens = [
+        Token(user=user, key=Token.generate_key())
+        for user in users if user.id not in tokens
+    ]
+    Token.objects.bulk_create(new_tokens)
+    tokens.update((token.user_id, token.key) for token in new_tokens)
+
+    # Рецепты собираются из тела запроса создания рецепта из коллекции
+    create_request = resolve_request(
+        requests, 'create_first_recipe // Second User'
+    )
+    authors_with_recipes = set(Recipe.objects.filter(
+        author__in=users
+    ).values_list('author_id', flat=True))
+    for user in users:
+        if user.id in authors_with_recipes:
+            continue
+        rows = []
+        for number in range(recipes_per_user):
+            first, second = random.sample(ingredients, 2)
+            row = json.loads(render(create_request.body, {
+                **base_variables,
+                'firstIndredientId': first[0],
+                'secondIndredientId': second[0],
+            }))
+            row['name'] = f'{row["name"]} #{number + 1}'
+            rows.append((number + 1, row))
+        result = import_recipes(user, rows)
+        if result['errors']:
+            raise ValueError(
+                f'Не удалось создать рецепты для {user.username}: '
+                f'{result["errors"]}'
+            )
+
+    return {
+        'users': [(user.id, tokens[user.id]) for user in users],
+        'recipe_ids': list(Recipe.objects.filter(
+            author__in=users
+        ).values_list('id', flat=True)),
+        'ingredients': ingredients,
+    }
+
+
+def remove_fixtures():
+    deleted, _ = User.objects.filter(
+        username__startswith=LOAD_TEST_USER_PREFIX
+    ).delete()
+    return deleted
+
+
+def iteration_variables(base_variables, fixtures, user_index, rng):
+    user_id, token = fixtures['users'][user_index]
+    other_users = [
+        other_id for other_id, _ in fixtures['users'] if other_id != user_id
+    ]
+    second_user, third_user = (
+        rng.sample(other_users, 2) if len(other_users) >= 2
+        else (other_users * 2 or [user_id, user_id])[:2]
+    )
+    (first_id, first_name), (second_id, _) = rng.sample(
+        fixtures['ingredients'], 2
+    )
+    return {
+        **base_variables,
+        'userId': user_id,
+        'userToken': token,
+        # Рецепты в сценарии авторства создает и удаляет сам пользователь
+        'secondUserToken': token,
+        'secondUserId': second_user,
+        'thirdUserId': third_user,
+        'firstRecipeId': rng.choice(fixtures['recipe_ids']),
+        'firstIndredientId': first_id,
+        'secondIndredientId': second_id,
+        'ingredientNameFirstLatter': first_name[:1],
+    }
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Соединение закрыто сервером')
+    status_code = int(status_line.split()[1])
+    headers = {}
+    while True:
+        header_line = await reader.readline()
+        if header_line in (b'\r\n', b'\n', b''):
+            break
+        header_name, _, header_value = header_line.decode(
+            'latin-1'
+        ).partition(':')
+        headers[header_name.strip().lower()] = header_value.strip()
+
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return status_code, body, keep_alive
+
+
+class VirtualUser:
+
+    def __init__(self, host, port, fixtures, user_index, base_variables,
+                 think_time, rng):
+        self.host = host
+        self.port = port
+        self.fixtures = fixtures
+        self.user_index = user_index
+        self.base_variables = base_variables
+        self.think_time = think_time
+        self.rng = rng
+        self.reader = None
+        self.writer = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def send(self, request, variables):
+        path = quote(render(request.url, variables), safe="/?=&%:+,")
+        headers = [
+            f'{request.method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Accept: application/json',
+        ]
+        if request.auth_header is not None:
+            header_name, header_value = request.auth_header
+            headers.append(f'{header_name}: {render(header_value, variables)}')
+        body = b''
+        if request.body is not None:
+            body = render(request.body, variables).encode()
+            if request.content_type:
+                headers.append(f'Content-Type: {request.content_type}')
+        headers.append(f'Content-Length: {len(body)}')
+        payload = ('\r\n'.join(headers) + '\r\n\r\n').encode() + body
+
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self.writer.write(payload)
+        await self.writer.drain()
+        status_code, response_body, keep_alive = await _read_response(
+            self.reader
+        )
+        if not keep_alive:
+            self.close()
+        return status_code, response_body
+
+    async def run_scenario(self, scenario, results):
+        variables = iteration_variables(
+            self.base_variables, self.fixtures, self.user_index, self.rng
+        )
+        completed = True
+        for step in scenario['steps']:
+            request = step['request']
+            key = endpoint_key(request)
+            started = time.monotonic()
+            try:
+                status_code, body = await self.send(request, variables)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError,
+                    ValueError, IndexError):
+                self.close()
+                results[key]['statuses']['transport_error'] += 1
+                status_code, body = None, b''
+            else:
+                results[key]['latencies'].append(time.monotonic() - started)
+                results[key]['statuses'][str(status_code)] += 1
+            if status_code is None or status_code >= 400:
+                completed = False
+                # Как и Postman, продолжаем со следующего шага: он обычно
+                # откатывает изменения. Без сохраненного id продолжать нельзя.
+                if step['capture']:
+                    return False
+                continue
+            if step['capture']:
+                try:
+                    data = json.loads(body)
+                    for variable, field in step['capture'].items():
+                        variables[variable] = data[field]
+                except (ValueError, KeyError, TypeError):
+                    return False
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+        return completed
+
+
+async def run_load_test(base_url, scenarios, fixtures, base_variables,
+                        concurrency, duration, think_time=0, seed=None):
+    url_parts = urlsplit(base_url)
+    host = url_parts.hostname
+    port = url_parts.port or 80
+    results = defaultdict(lambda: {'latencies': [], 'statuses': Counter()})
+    iterations = Counter()
+    failed_iterations = Counter()
+    names = list(scenarios)
+    weights = [scenarios[name]['weight'] for name in names]
+    deadline = time.monotonic() + duration
+
+    async def virtual_user(user_index):
+        rng = random.Random(None if seed is None else seed + user_index)
+        user = VirtualUser(
+            host, port, fixtures, user_index % len(fixtures['users']),
+            base_variables, think_time, rng
+        )
+        try:
+            # Сценарий доигрывается до конца и после истечения времени,
+            # иначе у пользователя останутся незакрытые подписки и корзина
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                completed = await user.run_scenario(scenarios[name], results)
+                iterations[name] += 1
+                if not completed:
+                    failed_iterations[name] += 1
+                    await asyncio.sleep(0.05)
+        finally:
+            user.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(virtual_user(index) for index in range(concurrency)))
+    elapsed = time.monotonic() - started
+    return {
+        'elapsed': elapsed,
+        'endpoints': results,
+        'iterations': iterations,
+        'failed_iterations': failed_iterations,
+    }
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(
+        len(sorted_values) - 1, int(len(sorted_values) * percent / 100)
+    )
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, elapsed):
+    # 429 - отказ ограничителей частоты самого приложения
+    # (TOKEN_BUCKET_RATES, DEFAULT_THROTTLE_RATES), а не сбой: такие ответы
+    # считаются отдельно и в ошибки не входят
+    latencies = sorted(latencies)
+    requests = sum(statuses.values())
+    throttled = statuses.get('429', 0)
+    errors = sum(
+        count for status, count in statuses.items()
+        if status == 'transport_error' or int(status) >= 400
+    ) - throttled
+
+    def milliseconds(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0,
+        'throttled': throttled,
+        'throttled_rate': round(throttled / requests, 4) if requests else 0,
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else 0,
+        'statuses': dict(sorted(statuses.items())),
+        'latency_ms': {
+            'mean': milliseconds(
+                statistics.mean(latencies) if latencies else None
+            ),
+            'p50': milliseconds(percentile(latencies, 50)),
+            'p95': milliseconds(percentile(latencies, 95)),
+            'p99': milliseconds(percentile(latencies, 99)),
+            'max': milliseconds(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def build_report(run, scenarios, options):
+    elapsed = run['elapsed']
+    all_latencies = []
+    all_statuses = Counter()
+    endpoints = {}
+    for key, result in sorted(run['endpoints'].items()):
+        all_latencies.extend(result['latencies'])
+        all_statuses.update(result['statuses'])
+        endpoints[key] = summarize(
+            result['latencies'], result['statuses'], elapsed
+        )
+    return {
+        'base_url': options['base_url'],
+        'concurrency': options['concurrency'],
+        'duration': options['duration'],
+        'elapsed': round(elapsed, 2),
+        'scenarios': {
+            name: {
+                'weight': scenario['weight'],
+                'iterations': run['iterations'][name],
+                'failed': run['failed_iterations'][name],
+            }
+            for name, scenario in scenarios.items()
+        },
+        'total': summarize(all_latencies, all_statuses, elapsed),
+        'endpoints': endpoints,
+    }
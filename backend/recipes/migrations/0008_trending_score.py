@@ -0,0 +1,61 @@
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Дата для уже существующих записей: время их добавления неизвестно, и
+# пересчет популярности не должен принять их за новые события
+BACKFILL_CREATED_AT = datetime.datetime(
+    2000, 1, 1, tzinfo=datetime.timezone.utc
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0007_update_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=BACKFILL_CREATED_AT,
+                verbose_name='Дата добавления'
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=BACKFILL_CREATED_AT,
+                verbose_name='Дата добавления'
+            ),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='RecipeTrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    primary_key=True,
+                    related_name='trending_score',
+                    serialize=False,
+                    to='recipes.Recipe',
+                    verbose_name='Рецепт'
+                )),
+                ('score', models.FloatField(db_index=True, default=0, verbose_name='Рейтинг популярности')),
+                ('refreshed_at', models.DateTimeField(db_index=True, verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг популярности',
+                'verbose_name_plural': 'Рейтинги популярности',
+                'ordering': ['-score'],
+            },
+        ),
+    ]
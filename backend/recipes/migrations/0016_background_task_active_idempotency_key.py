@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0015_ingredient_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundtask',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Ключ идемпотентности'),
+        ),
+        migrations.AddConstraint(
+            model_name='backgroundtask',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('idempotency_key',), name='task_active_idempotency_key_uniq'),
+        ),
+    ]
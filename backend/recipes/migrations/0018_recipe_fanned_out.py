@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def mark_fanned_out(apps, schema_editor):
+    # Разосланными считаются рецепты, уже попавшие в ленты; остальные
+    # (например, опубликованные автором с большим числом подписчиков)
+    # остаются в подмешивании при чтении
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe.objects.filter(
+        id__in=FeedEntry.objects.values('recipe_id')
+    ).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0017_changelogentry_transaction_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fanned_out',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Разослан по лентам'),
+        ),
+        migrations.RunPython(mark_fanned_out, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author', '-pub_date'], name='recipe_not_fanned_out_idx'),
+        ),
+    ]
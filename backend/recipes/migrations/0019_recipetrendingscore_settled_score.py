@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+def drop_scores(apps, schema_editor):
+    # Прежние рейтинги не делятся на устоявшуюся часть и окно перекрытия;
+    # без них следующий пересчет будет полным
+    apps.get_model('recipes', 'RecipeTrendingScore').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0018_recipe_fanned_out'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipetrendingscore',
+            name='settled_score',
+            field=models.FloatField(default=0, verbose_name='Рейтинг по устоявшимся событиям'),
+        ),
+        migrations.RunPython(drop_scores, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ import hashlib
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from django.db.models import UniqueConstraint, CheckConstraint, F, Q
 
 
@@ -134,11 +135,30 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    # Рецепт разослан по лентам подписчиков; остальные рецепты (автор с
+    # большим числом подписчиков или рассылка еще в очереди) подмешиваются
+    # в ленту при чтении
+    fanned_out = models.BooleanField(
+        'Разослан по лентам',
+        default=False,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                condition=models.Q(fanned_out=False),
+                name='recipe_not_fanned_out_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -172,6 +192,13 @@ class RecipeIngredient(models.Model):
                 name='unique_recipe_ingredient'
             )
         ]
+        indexes = [
+            # Покрывающий индекс для суммирования списка покупок
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='recipe_ingredient_amount_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient.name} ({self.amount} {self.ingredient.measurement_unit})'
@@ -189,6 +216,11 @@ class UserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         abstract = True
@@ -252,6 +284,318 @@ class ShoppingCart(UserRecipeRelation):
         return f'{self.user.username} - {self.recipe.name}'
 
 
+class RecipeTrendingScore(models.Model):
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending_score',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        'Рейтинг популярности',
+        default=0,
+        db_index=True,
+    )
+    # Вклад событий старше окна перекрытия; события из окна учитываются
+    # заново при каждом пересчете
+    settled_score = models.FloatField(
+        'Рейтинг по устоявшимся событиям',
+        default=0,
+    )
+    refreshed_at = models.DateTimeField(
+        'Дата пересчета',
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг популярности'
+        verbose_name_plural = 'Рейтинги популярности'
+        ordering = ['-score']
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.3f}'
+
+
+class RecipeSimilarity(models.Model):
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт'
+    )
+    similar_recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        'Сходство',
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ['recipe', '-score']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar_recipe'],
+                name='unique_recipe_similarity'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='recipe_similarity_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} → {self.similar_recipe_id}: {self.score:.3f}'
+
+
+class FeedEntry(models.Model):
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ['-pub_date', '-recipe']
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} ← {self.recipe_id}'
+
+
+class VersionStamp(models.Model):
+
+    key = models.CharField(
+        'Ключ',
+        max_length=100,
+        primary_key=True,
+    )
+    version = models.BigIntegerField(
+        'Версия',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
+
+
+class BackgroundTask(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    name = models.CharField(
+        'Задача',
+        max_length=200,
+    )
+    payload = models.JSONField(
+        'Параметры',
+        default=dict,
+        blank=True,
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    idempotency_key = models.CharField(
+        'Ключ идемпотентности',
+        max_length=255,
+        null=True,
+        blank=True,
+    )
+    attempts = models.PositiveIntegerField(
+        'Попыток',
+        default=0,
+    )
+    max_attempts = models.PositiveIntegerField(
+        'Максимум попыток',
+        default=5,
+    )
+    run_at = models.DateTimeField(
+        'Запуск не раньше',
+        default=timezone.now,
+    )
+    locked_at = models.DateTimeField(
+        'Взята в работу',
+        null=True,
+        blank=True,
+    )
+    locked_by = models.CharField(
+        'Обработчик',
+        max_length=100,
+        blank=True,
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        'Дата завершения',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='task_status_run_at_idx'
+            ),
+        ]
+        # Ключ занят, пока задача ждет или выполняется; после завершения
+        # его можно использовать снова
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='task_active_idempotency_key_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
+
+
+class ChangeLogEntry(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (UPSERT, 'Создание или изменение'),
+        (DELETE, 'Удаление'),
+    )
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    ENTITY_CHOICES = (
+        (RECIPE, 'Рецепт'),
+        (TAG, 'Тег'),
+        (INGREDIENT, 'Ингредиент'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    entity = models.CharField(
+        'Тип объекта',
+        max_length=20,
+        choices=ENTITY_CHOICES,
+    )
+    object_id = models.PositiveIntegerField(
+        'Идентификатор объекта',
+    )
+    # Изменения избранного, корзины и подписок видит только их владелец
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='change_log',
+        verbose_name='Пользователь',
+        null=True,
+        blank=True,
+    )
+    action = models.CharField(
+        'Действие',
+        max_length=10,
+        choices=ACTION_CHOICES,
+    )
+    # Номер транзакции PostgreSQL (txid_current), в которой сделана запись;
+    # в SQLite записи ведутся по одной транзакции за раз, здесь 0
+    transaction_id = models.BigIntegerField(
+        'Транзакция',
+        default=0,
+    )
+    created_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['entity', 'object_id'],
+                name='change_log_object_idx'
+            ),
+            models.Index(
+                fields=['transaction_id', 'id'],
+                name='change_log_position_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'#{self.id} {self.action} {self.entity}:{self.object_id}'
+
+
 class ShortLink(models.Model):
 
     recipe = models.ForeignKey(
@@ -0,0 +1,70 @@
+import re
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from api.filters import RecipeFilter
+from .models import Recipe, ShortLink, Tag
+from .shopping_list import ShoppingListArtifact
+
+User = get_user_model()
+
+# Полный проход по таблице: на PostgreSQL - Seq Scan, на SQLite - любой
+# SCAN, в том числе USING INDEX (обход всей таблицы в порядке индекса);
+# поиск по индексу SQLite называет SEARCH
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(
+        r'\bSCAN (?:TABLE )?(?!CONSTANT ROW|SUBQUERY)(\w+)'
+    ),
+}
+
+
+def filtered_recipes(user, **params):
+    request = SimpleNamespace(user=user)
+    return RecipeFilter(
+        data=params, queryset=Recipe.objects.all(), request=request
+    ).qs
+
+
+def build_queries(user, author_id):
+    queries = {
+        'recipes?author': filtered_recipes(user, author=author_id),
+        'recipes?is_favorited': filtered_recipes(user, is_favorited=1),
+        'recipes?is_in_shopping_cart': filtered_recipes(
+            user, is_in_shopping_cart=1
+        ),
+        'download_shopping_cart (корзина)': (
+            ShoppingListArtifact.cart_recipe_ids(user.pk)
+        ),
+        'download_shopping_cart (суммы)': ShoppingListArtifact(
+            user.pk, []
+        ).ingredient_totals(),
+        'subscriptions': User.objects.filter(subscribers__user=user),
+        'subscriptions (рецепты автора)': Recipe.objects.filter(
+            author_id=author_id
+        )[:3],
+        'redirect_short_link': ShortLink.objects.only('recipe_id').filter(
+            short_id='abc123'
+        ),
+    }
+    tag_slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+    if tag_slugs:
+        queries['recipes?tags'] = filtered_recipes(user, tags=tag_slugs)
+    return queries
+
+
+def explain(queryset):
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    # На маленькой базе планировщик честно выбирает Seq Scan, поэтому
+    # проверяется, что индекс вообще может быть использован
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def full_scans(plan):
+    return sorted(set(FULL_SCAN_PATTERNS[connection.vendor].findall(plan)))
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCart
+from .versions import get_versions, ingredient_version_key, recipe_version_key
+
+logger = logging.getLogger(__name__)
+
+SHOPPING_LIST_EXPORT_ROOT = Path(getattr(
+    settings, 'SHOPPING_LIST_EXPORT_ROOT',
+    Path(settings.MEDIA_ROOT).parent / 'exports'
+))
+SHOPPING_LIST_X_ACCEL_PREFIX = getattr(
+    settings, 'SHOPPING_LIST_X_ACCEL_PREFIX', ''
+)
+SHOPPING_LIST_ASYNC_THRESHOLD = getattr(
+    settings, 'SHOPPING_LIST_ASYNC_THRESHOLD', 200
+)
+
+# Список покупок всегда выгружался только текстом
+EXPORT_FORMATS = {
+    'txt': {
+        'content_type': 'text/plain; charset=utf-8',
+        'filename': 'shopping_cart.txt',
+    },
+}
+
+
+class ShoppingListArtifact:
+
+    def __init__(self, user_id, recipe_ids, export_format='txt'):
+        self.user_id = user_id
+        self.recipe_ids = sorted(recipe_ids)
+        self.export_format = export_format
+        self.ingredient_ids = sorted(set(
+            RecipeIngredient.objects.filter(
+                recipe_id__in=self.recipe_ids
+            ).values_list('ingredient_id', flat=True)
+        )) if self.recipe_ids else []
+        versions = get_versions(
+            *[recipe_version_key(recipe_id) for recipe_id in self.recipe_ids],
+            *[
+                ingredient_version_key(ingredient_id)
+                for ingredient_id in self.ingredient_ids
+            ]
+        )
+        self.recipe_versions = versions[:len(self.recipe_ids)]
+        self.ingredient_versions = versions[len(self.recipe_ids):]
+
+    @classmethod
+    def for_user(cls, user_id, export_format='txt'):
+        return cls(user_id, list(cls.cart_recipe_ids(user_id)), export_format)
+
+    @staticmethod
+    def cart_recipe_ids(user_id):
+        return ShoppingCart.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True)
+
+    @property
+    def is_empty(self):
+        return not self.recipe_ids
+
+    @property
+    def is_large(self):
+        return len(self.recipe_ids) > SHOPPING_LIST_ASYNC_THRESHOLD
+
+    @property
+    def digest(self):
+        # Содержимое корзины, версии рецептов (меняются при правке состава)
+        # и версии ингредиентов из них (название и единица измерения)
+        raw_key = ':'.join(map(str, [
+            self.user_id, self.export_format,
+            *[
+                f'r{recipe_id}={version}' for recipe_id, version
+                in zip(self.recipe_ids, self.recipe_versions)
+            ],
+            *[
+                f'i{ingredient_id}={version}' for ingredient_id, version
+                in zip(self.ingredient_ids, self.ingredient_versions)
+            ],
+        ]))
+        return hashlib.sha256(raw_key.encode()).hexdigest()[:20]
+
+    @property
+    def relative_path(self):
+        return f'{self.user_id}/{self.digest}.{self.export_format}'
+
+    @property
+    def path(self):
+        return SHOPPING_LIST_EXPORT_ROOT / self.relative_path
+
+    @property
+    def content_type(self):
+        return EXPORT_FORMATS[self.export_format]['content_type']
+
+    @property
+    def download_name(self):
+        return EXPORT_FORMATS[self.export_format]['filename']
+
+    @property
+    def x_accel_url(self):
+        if not SHOPPING_LIST_X_ACCEL_PREFIX:
+            return None
+        return f'{SHOPPING_LIST_X_ACCEL_PREFIX.rstrip("/")}/{self.relative_path}'
+
+    def exists(self):
+        return self.path.is_file()
+
+    def ingredient_totals(self):
+        return RecipeIngredient.objects.filter(
+            recipe__in_shopping_cart__user_id=self.user_id
+        ).values(
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
+
+    def render(self):
+        content = 'Список покупок:\n\n'
+        for ingredient in self.ingredient_totals():
+            content += (
+                f"{ingredient['ingredient__name']} "
+                f"({ingredient['ingredient__measurement_unit']}) — "
+                f"{ingredient['total_amount']}\n"
+            )
+        return content.encode()
+
+    def build(self):
+        if self.exists():
+            return self.path
+        content = self.render()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f'.{self.path.name}.{os.getpid()}')
+        temp_path.write_bytes(content)
+        os.replace(temp_path, self.path)
+        self.remove_stale()
+        return self.path
+
+    def remove_stale(self):
+        for old_path in self.path.parent.glob(f'*.{self.export_format}'):
+            if old_path != self.path:
+                try:
+                    old_path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    logger.warning(
+                        f"Не удалось удалить устаревший список {old_path}: {exc}"
+                    )
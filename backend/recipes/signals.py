@@ -0,0 +1,367 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import Signal, receiver
+
+from .cache_purge import (INGREDIENTS_KEY, RECIPES_KEY, TAGS_KEY, author_key,
+                          purge_keys_on_commit, recipe_key)
+from .changes import record_change, record_changes
+from .feed import trim_subscription
+from .ingredient_index import ingredient_index
+from .models import (ChangeLogEntry, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, RecipeSimilarity, ShoppingCart,
+                     Subscription, Tag, User)
+from .similarity import refresh_similar_on_commit
+from .versions import (CATALOG_VERSION, INGREDIENTS_VERSION, RECIPES_VERSION,
+                       bump_versions, cart_version_key, favorites_version_key,
+                       ingredient_version_key, recipe_version_key,
+                       subscriptions_version_key)
+from .task_queue import enqueue_on_commit
+
+# bulk_create не отправляет post_save и m2m_changed, поэтому массовое
+# создание рецептов (api.bulk_import) отправляет этот сигнал с аргументами
+# recipe_ids и ingredient_ids ({id рецепта: id ингредиентов}). Его
+# обработчики стоят рядом с обработчиками сохранения одного рецепта
+recipes_created = Signal()
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        enqueue_on_commit(
+            'feed.fan_out_recipe',
+            {'recipe_id': instance.id},
+            idempotency_key=f'feed:fan_out:{instance.id}'
+        )
+
+
+@receiver(recipes_created)
+def fan_out_created_recipes(sender, recipe_ids, **kwargs):
+    enqueue_on_commit(
+        'feed.fan_out_recipes',
+        {'recipe_ids': recipe_ids},
+        idempotency_key=f'feed:fan_out:{recipe_ids[0]}-{recipe_ids[-1]}'
+    )
+
+
+@receiver(recipes_created)
+def add_created_recipes_to_index(sender, ingredient_ids, **kwargs):
+    transaction.on_commit(
+        lambda: ingredient_index.update_recipes(ingredient_ids)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def drop_deleted_recipe_from_index(sender, instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: ingredient_index.remove_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_new_subscription(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        enqueue_on_commit(
+            'feed.backfill_subscription',
+            {'subscription_id': instance.id},
+            idempotency_key=f'feed:backfill:{instance.id}'
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def trim_removed_subscription(sender, instance, **kwargs):
+    trim_subscription(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_versions(RECIPES_VERSION, recipe_version_key(instance.id))
+
+
+@receiver(recipes_created)
+def bump_created_recipes_version(sender, **kwargs):
+    # У новых рецептов еще нет своих счетчиков версий
+    bump_versions(RECIPES_VERSION)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def bump_recipe_ingredient_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_versions(RECIPES_VERSION, recipe_version_key(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        recipe_ids = pk_set or []
+    else:
+        recipe_ids = [instance.id]
+    bump_versions(
+        RECIPES_VERSION,
+        *[recipe_version_key(recipe_id) for recipe_id in recipe_ids]
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_favorites_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_versions(favorites_version_key(instance.user_id))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def bump_cart_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_versions(cart_version_key(instance.user_id))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_subscriptions_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_versions(subscriptions_version_key(instance.user_id))
+
+
+# Поля автора, которые выводятся в рецептах
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name', 'avatar')
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    instance._author_fields = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(AUTHOR_FIELDS) & set(
+        update_fields
+    ):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_FIELDS
+    ).first()
+    if previous is not None:
+        instance._author_fields = previous[:-1] + (previous[-1] or '',)
+
+
+def _author_fields_changed(instance):
+    # Регистрация, вход, смена пароля и правки пользователя без рецептов
+    # ответы с рецептами не меняют
+    previous = getattr(instance, '_author_fields', None)
+    if previous is None:
+        return False
+    current = tuple(
+        (getattr(instance, field).name or '') if field == 'avatar'
+        else getattr(instance, field)
+        for field in AUTHOR_FIELDS
+    )
+    return current != previous and Recipe.objects.filter(
+        author=instance
+    ).exists()
+
+
+@receiver(post_save, sender=User)
+def bump_author_recipe_versions(sender, instance, created, raw=False,
+                                **kwargs):
+    # Устаревают только рецепты автора и списки; при удалении
+    # пользователя версии повышают каскадно удаленные рецепты
+    if created or raw or not _author_fields_changed(instance):
+        return
+    bump_versions(RECIPES_VERSION, *[
+        recipe_version_key(recipe_id)
+        for recipe_id in Recipe.objects.filter(
+            author=instance
+        ).values_list('id', flat=True)
+    ])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_catalog_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_versions(CATALOG_VERSION)
+        if sender is Ingredient:
+            bump_versions(
+                INGREDIENTS_VERSION, ingredient_version_key(instance.id)
+            )
+
+
+def _change_action(signal):
+    if signal is post_delete:
+        return ChangeLogEntry.DELETE
+    return ChangeLogEntry.UPSERT
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def log_recipe_change(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        record_change(
+            ChangeLogEntry.RECIPE, instance.id, _change_action(signal)
+        )
+
+
+@receiver(recipes_created)
+def log_created_recipes(sender, recipe_ids, **kwargs):
+    record_changes(ChangeLogEntry.RECIPE, recipe_ids)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def log_recipe_ingredient_change(sender, instance, raw=False, **kwargs):
+    # Состав рецепта клиент получает вместе с рецептом
+    if not raw:
+        record_change(ChangeLogEntry.RECIPE, instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def log_recipe_tags_change(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    record_changes(
+        ChangeLogEntry.RECIPE, (pk_set or []) if reverse else [instance.id]
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def log_catalog_change(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        entity = (
+            ChangeLogEntry.TAG if sender is Tag else ChangeLogEntry.INGREDIENT
+        )
+        record_change(entity, instance.id, _change_action(signal))
+
+
+@receiver(pre_delete, sender=Tag)
+def log_deleted_tag_recipes(sender, instance, **kwargs):
+    # Связи с рецептами удаляются каскадом без m2m_changed
+    recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    record_changes(ChangeLogEntry.RECIPE, recipe_ids)
+    refresh_similar_on_commit(recipe_ids)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def log_user_recipe_change(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        entity = (
+            ChangeLogEntry.FAVORITE if sender is Favorite
+            else ChangeLogEntry.SHOPPING_CART
+        )
+        record_change(
+            entity, instance.recipe_id, _change_action(signal),
+            user_id=instance.user_id
+        )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def log_subscription_change(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        record_change(
+            ChangeLogEntry.SUBSCRIPTION, instance.author_id,
+            _change_action(signal), user_id=instance.user_id
+        )
+
+
+# Анонимные ответы в кэше nginx помечены суррогатными ключами. Любое
+# изменение рецепта очищает и списки: от него зависят фильтры и порядок
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def purge_recipe_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge_keys_on_commit(recipe_key(instance.id), RECIPES_KEY)
+
+
+@receiver(recipes_created)
+def purge_created_recipes_cache(sender, **kwargs):
+    purge_keys_on_commit(RECIPES_KEY)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def purge_recipe_ingredient_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge_keys_on_commit(recipe_key(instance.recipe_id), RECIPES_KEY)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def purge_recipe_tags_cache(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if not action.startswith('post_'):
+        return
+    recipe_ids = (pk_set or []) if reverse else [instance.id]
+    purge_keys_on_commit(
+        RECIPES_KEY, *[recipe_key(recipe_id) for recipe_id in recipe_ids]
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def purge_catalog_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge_keys_on_commit(TAGS_KEY if sender is Tag else INGREDIENTS_KEY)
+
+
+# Ключ автора есть только у ответов с его рецептами. При удалении
+# пользователя его рецепты удаляются каскадом и очищают свои ключи
+@receiver(post_save, sender=User)
+def purge_author_cache(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw and _author_fields_changed(instance):
+        purge_keys_on_commit(author_key(instance.id))
+
+
+# Списки похожих рецептов пересчитывает воркер после фиксации. Состав
+# сохраняется через bulk_create без сигналов, но сериализатор в конце
+# сохраняет и сам рецепт
+@receiver(post_save, sender=Recipe)
+def refresh_saved_recipe_similarity(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_similar_on_commit([instance.id])
+
+
+@receiver(recipes_created)
+def refresh_created_recipes_similarity(sender, recipe_ids, **kwargs):
+    refresh_similar_on_commit(recipe_ids)
+
+
+@receiver(pre_delete, sender=Recipe)
+def refresh_deleted_recipe_similarity(sender, instance, **kwargs):
+    # Ссылки на рецепт удаляются каскадом, поэтому ссылавшиеся на него
+    # рецепты нужно найти до удаления
+    refresh_similar_on_commit(
+        RecipeSimilarity.objects.filter(
+            similar_recipe=instance
+        ).values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def refresh_recipe_ingredient_similarity(sender, instance, raw=False,
+                                         **kwargs):
+    if not raw:
+        refresh_similar_on_commit([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def refresh_recipe_tags_similarity(sender, instance, action, reverse, pk_set,
+                                   **kwargs):
+    if action.startswith('post_'):
+        refresh_similar_on_commit(
+            (pk_set or []) if reverse else [instance.id]
+        )
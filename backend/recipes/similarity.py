@@ -0,0 +1,355 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .cache_purge import SIMILAR_KEY, purge_keys_on_commit
+from .changes import ChangeLogExpired, changed_object_ids, latest_position
+from .models import ChangeLogEntry, Recipe, RecipeIngredient, RecipeSimilarity
+from .task_queue import enqueue_batch_on_commit
+from .versions import SIMILARITY_VERSION, bump_versions, get_versions
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_RECIPES_COUNT = getattr(settings, 'SIMILAR_RECIPES_COUNT', 12)
+SIMILAR_TAG_WEIGHT = getattr(settings, 'SIMILAR_TAG_WEIGHT', 0.5)
+SIMILAR_MIN_SCORE = getattr(settings, 'SIMILAR_MIN_SCORE', 0.05)
+# Матрица в памяти воркера перечитывается целиком не реже этого срока
+SIMILARITY_MATRIX_TTL = getattr(settings, 'SIMILARITY_MATRIX_TTL', 3600)
+SIMILARITY_CHUNK_SIZE = 10000
+SIMILARITY_BATCH_SIZE = 1000
+
+
+def _load_pairs(queryset, first, second):
+    pairs = queryset.order_by().values_list(first, second)
+    flat = np.fromiter(
+        (
+            value
+            for pair in pairs.iterator(chunk_size=SIMILARITY_CHUNK_SIZE)
+            for value in pair
+        ),
+        dtype=np.int64
+    )
+    return flat[0::2], flat[1::2]
+
+
+def _load_features(recipe_ids=None):
+    recipe_ingredients = RecipeIngredient.objects.all()
+    recipe_tags = Recipe.tags.through.objects.all()
+    if recipe_ids is not None:
+        recipe_ingredients = recipe_ingredients.filter(
+            recipe_id__in=recipe_ids
+        )
+        recipe_tags = recipe_tags.filter(recipe_id__in=recipe_ids)
+    recipe_ingredients = _load_pairs(
+        recipe_ingredients, 'recipe_id', 'ingredient_id'
+    )
+    recipe_tags = _load_pairs(recipe_tags, 'recipe_id', 'tag_id')
+    # Ингредиенты и теги занимают четные и нечетные номера признаков
+    return (
+        np.concatenate([recipe_ingredients[0], recipe_tags[0]]),
+        np.concatenate([recipe_ingredients[1] * 2, recipe_tags[1] * 2 + 1]),
+        np.concatenate([
+            np.ones(len(recipe_ingredients[0])),
+            np.full(len(recipe_tags[0]), SIMILAR_TAG_WEIGHT),
+        ]),
+    )
+
+
+class FeatureMatrix:
+    # Разреженная матрица рецепт × признак (ингредиенты и теги) в двух
+    # видах: по строкам - признаки рецепта, по столбцам - рецепты с
+    # признаком. Сходство - косинус взвешенных бинарных векторов.
+
+    def __init__(self, recipe_column, feature_column, weights):
+        # Тройки упорядочиваются, чтобы матрица после замены строк не
+        # отличалась от загруженной целиком, вплоть до порядка сложения
+        order = np.lexsort((feature_column, recipe_column))
+        recipe_column = recipe_column[order]
+        feature_column = feature_column[order]
+        weights = weights[order]
+        # Исходные тройки нужны, чтобы заменить строки измененных рецептов
+        self.features = (recipe_column, feature_column, weights)
+        self.recipe_ids, rows = np.unique(recipe_column, return_inverse=True)
+        self.positions = {
+            int(recipe_id): position
+            for position, recipe_id in enumerate(self.recipe_ids)
+        }
+        feature_ids, columns = np.unique(feature_column, return_inverse=True)
+        count = len(self.recipe_ids)
+
+        order = np.argsort(rows, kind='stable')
+        self.row_columns = columns[order]
+        self.row_weights = weights[order]
+        self.row_bounds = np.searchsorted(rows[order], np.arange(count + 1))
+
+        order = np.argsort(columns, kind='stable')
+        self.column_rows = rows[order]
+        self.column_weights = weights[order]
+        self.column_bounds = np.searchsorted(
+            columns[order], np.arange(len(feature_ids) + 1)
+        )
+
+        self.norms = np.sqrt(
+            np.bincount(rows, weights=weights ** 2, minlength=count)
+        )
+
+    @classmethod
+    def load(cls):
+        return cls(*_load_features())
+
+    def with_recipes(self, recipe_ids):
+        # Из базы читаются только строки перечисленных рецептов, остальные
+        # берутся из текущей матрицы; удаленные рецепты из нее выпадают
+        recipe_ids = sorted(recipe_ids)
+        keep = ~np.isin(self.features[0], recipe_ids)
+        return type(self)(*(
+            np.concatenate([current[keep], fresh])
+            for current, fresh in zip(
+                self.features, _load_features(recipe_ids)
+            )
+        ))
+
+    def scores(self, position):
+        start, end = self.row_bounds[position], self.row_bounds[position + 1]
+        columns = self.row_columns[start:end]
+        lengths = (
+            self.column_bounds[columns + 1] - self.column_bounds[columns]
+        )
+        entries = np.concatenate([
+            np.arange(self.column_bounds[column],
+                      self.column_bounds[column + 1])
+            for column in columns
+        ]) if len(columns) else np.empty(0, dtype=np.int64)
+        products = (
+            np.repeat(self.row_weights[start:end], lengths)
+            * self.column_weights[entries]
+        )
+        dots = np.bincount(
+            self.column_rows[entries], weights=products,
+            minlength=len(self.recipe_ids)
+        )
+        scores = dots / (self.norms * self.norms[position])
+        scores[position] = 0
+        return scores
+
+    def neighbors(self, position, count=SIMILAR_RECIPES_COUNT, scores=None):
+        if scores is None:
+            scores = self.scores(position)
+        candidates = np.flatnonzero(scores >= SIMILAR_MIN_SCORE)
+        if len(candidates) > count:
+            # Все равные последнему месту остаются в кандидатах, из них
+            # берутся рецепты с меньшим id
+            last = -np.partition(-scores[candidates], count - 1)[count - 1]
+            candidates = candidates[scores[candidates] >= last]
+        order = np.lexsort(
+            (self.recipe_ids[candidates], -scores[candidates])
+        )[:count]
+        return [
+            (int(self.recipe_ids[candidate]), float(scores[candidate]))
+            for candidate in candidates[order]
+        ]
+
+
+def _worst_score(scores):
+    # В неполный список попадает любой рецепт выше SIMILAR_MIN_SCORE
+    if len(scores) < SIMILAR_RECIPES_COUNT:
+        return 0
+    return min(scores)
+
+
+class SimilarityIndex:
+    # Состояние воркера между пересчетами: матрица признаков догоняет базу
+    # по журналу изменений рецептов, худшие оценки сохраненных списков -
+    # по версии SIMILARITY_VERSION. Устаревший журнал или слишком много
+    # изменений перестраивают матрицу целиком.
+
+    def __init__(self):
+        self.matrix = None
+        self._position = None
+        self._loaded_at = None
+        self._similarity_version = None
+        self._worst_scores = {}
+
+    def load_matrix(self):
+        position = latest_position()
+        self.matrix = FeatureMatrix.load()
+        self._position = position
+        self._loaded_at = time.monotonic()
+        return self.matrix
+
+    def sync_matrix(self, recipe_ids):
+        stale = (
+            self.matrix is None
+            or time.monotonic() - self._loaded_at > SIMILARITY_MATRIX_TTL
+        )
+        if stale:
+            return self.load_matrix()
+        try:
+            changed, position, has_more = changed_object_ids(
+                ChangeLogEntry.RECIPE, self._position
+            )
+        except ChangeLogExpired:
+            return self.load_matrix()
+        if has_more:
+            return self.load_matrix()
+        # Свои рецепты задача перечитывает, даже если их события журнал
+        # еще не отдает
+        changed |= set(recipe_ids)
+        if changed:
+            self.matrix = self.matrix.with_recipes(changed)
+        self._position = position
+        return self.matrix
+
+    def worst_scores(self):
+        version, = get_versions(SIMILARITY_VERSION)
+        if version != self._similarity_version:
+            rows = RecipeSimilarity.objects.order_by().values(
+                'recipe_id'
+            ).annotate(count=Count('id'), worst=Min('score'))
+            self._worst_scores = {
+                row['recipe_id']: (
+                    row['worst'] if row['count'] >= SIMILAR_RECIPES_COUNT
+                    else 0
+                )
+                for row in rows.iterator(chunk_size=SIMILARITY_CHUNK_SIZE)
+            }
+            self._similarity_version = version
+        return self._worst_scores
+
+    def save_lists(self, lists, replace_all=False):
+        # Строка версии заблокирована до конца транзакции: если версия
+        # выросла ровно на единицу, других записей с прошлой загрузки не
+        # было и оценки можно обновить без чтения всей таблицы
+        previous = self._similarity_version
+        bump_versions(SIMILARITY_VERSION)
+        version, = get_versions(SIMILARITY_VERSION)
+        worst_scores = {
+            recipe_id: _worst_score([score for _, score in neighbors])
+            for recipe_id, neighbors in lists.items()
+        }
+
+        def apply():
+            if replace_all:
+                self._worst_scores = worst_scores
+            elif previous is None or version != previous + 1:
+                self._similarity_version = None
+                return
+            else:
+                self._worst_scores.update(worst_scores)
+            self._similarity_version = version
+
+        transaction.on_commit(apply)
+
+
+similarity_index = SimilarityIndex()
+
+
+def _similarity_lists(matrix, recipe_ids):
+    return {
+        recipe_id: (
+            matrix.neighbors(matrix.positions[recipe_id])
+            if recipe_id in matrix.positions else []
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+def _save_lists(lists):
+    RecipeSimilarity.objects.bulk_create(
+        (
+            RecipeSimilarity(
+                recipe_id=recipe_id, similar_recipe_id=similar_id,
+                score=score
+            )
+            for recipe_id, neighbors in lists.items()
+            for similar_id, score in neighbors
+        ),
+        batch_size=SIMILARITY_BATCH_SIZE
+    )
+
+
+def _entering_recipes(matrix, recipe_ids, worst_scores):
+    # Рецепты, в чей список соседей измененный рецепт теперь попадает:
+    # его сходство не ниже худшего из сохраненных (при равенстве решает
+    # id) или список еще неполон.
+    # Оценки списков в памяти, поэтому кандидаты не перечисляются в
+    # запросе к базе
+    entering = set()
+    for recipe_id in recipe_ids:
+        position = matrix.positions.get(recipe_id)
+        if position is None:
+            continue
+        recipe_scores = matrix.scores(position)
+        candidates = np.flatnonzero(recipe_scores >= SIMILAR_MIN_SCORE)
+        worst = np.fromiter(
+            (
+                worst_scores.get(int(candidate_id), 0)
+                for candidate_id in matrix.recipe_ids[candidates]
+            ),
+            dtype=np.float64, count=len(candidates)
+        )
+        entering.update(
+            int(candidate_id) for candidate_id in matrix.recipe_ids[
+                candidates[recipe_scores[candidates] >= worst]
+            ]
+        )
+    return entering
+
+
+@transaction.atomic
+def rebuild_similar_recipes():
+    matrix = similarity_index.load_matrix()
+    lists = _similarity_lists(matrix, [int(i) for i in matrix.recipe_ids])
+    RecipeSimilarity.objects.all().delete()
+    _save_lists(lists)
+    similarity_index.save_lists(lists, replace_all=True)
+    purge_keys_on_commit(SIMILAR_KEY)
+    stats = {'recipes': len(matrix.recipe_ids)}
+    logger.info(f"Similar recipes rebuilt for {stats['recipes']} recipes")
+    return stats
+
+
+@transaction.atomic
+def refresh_similar_recipes(recipe_ids):
+    # Пересчитываются списки измененных рецептов, рецептов, которые на
+    # них ссылались, и рецептов, в чьи списки они теперь попадают
+    recipe_ids = set(recipe_ids)
+    matrix = similarity_index.sync_matrix(recipe_ids)
+    affected = recipe_ids | set(
+        RecipeSimilarity.objects.filter(
+            similar_recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)
+    )
+    affected |= _entering_recipes(
+        matrix, recipe_ids, similarity_index.worst_scores()
+    )
+
+    lists = _similarity_lists(matrix, sorted(affected))
+    RecipeSimilarity.objects.filter(recipe_id__in=affected).delete()
+    _save_lists(lists)
+    similarity_index.save_lists(lists)
+    purge_keys_on_commit(SIMILAR_KEY)
+    stats = {'changed': len(recipe_ids), 'refreshed': len(affected)}
+    logger.info(
+        f"Similar recipes refreshed: {stats['refreshed']} lists "
+        f"for {stats['changed']} changed recipes"
+    )
+    return stats
+
+
+def refresh_similar_on_commit(recipe_ids):
+    enqueue_batch_on_commit(
+        'similarity.refresh_recipes', 'recipe_ids', recipe_ids
+    )
+
+
+def similar_recipe_ids(recipe_id, limit=SIMILAR_RECIPES_COUNT):
+    return list(
+        RecipeSimilarity.objects.filter(recipe_id=recipe_id).order_by(
+            '-score', 'similar_recipe_id'
+        ).values_list('similar_recipe_id', flat=True)[:limit]
+    )
@@ -0,0 +1,397 @@
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (IntegrityError, close_old_connections, connection,
+                       transaction)
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE_EAGER = getattr(settings, 'TASK_QUEUE_EAGER', False)
+TASK_QUEUE_BATCH_SIZE = getattr(settings, 'TASK_QUEUE_BATCH_SIZE', 10)
+TASK_QUEUE_POLL_INTERVAL = getattr(settings, 'TASK_QUEUE_POLL_INTERVAL', 1.0)
+TASK_QUEUE_LOCK_TIMEOUT = getattr(settings, 'TASK_QUEUE_LOCK_TIMEOUT', 600)
+TASK_QUEUE_RETRY_BASE_DELAY = getattr(
+    settings, 'TASK_QUEUE_RETRY_BASE_DELAY', 5
+)
+TASK_QUEUE_RETRY_MAX_DELAY = getattr(
+    settings, 'TASK_QUEUE_RETRY_MAX_DELAY', 3600
+)
+TASK_QUEUE_RETENTION_DAYS = getattr(settings, 'TASK_QUEUE_RETENTION_DAYS', 7)
+MAINTENANCE_INTERVAL = 60
+
+_registry = {}
+
+
+def task(name, max_attempts=5):
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'Неизвестная задача: {name}')
+
+
+def enqueue(name, payload=None, idempotency_key=None, delay=0):
+    # Пока задача с тем же idempotency_key ждет или выполняется, возвращается
+    # она; завершенная задача ключ не занимает, и он ставит задачу заново
+    func = get_task(name)
+    payload = payload or {}
+
+    if TASK_QUEUE_EAGER:
+        try:
+            with transaction.atomic():
+                func(**payload)
+        except Exception as exc:
+            logger.exception(f"Error in task {name}: {exc}")
+        return None
+
+    try:
+        with transaction.atomic():
+            return BackgroundTask.objects.create(
+                name=name,
+                payload=payload,
+                idempotency_key=idempotency_key,
+                max_attempts=func.max_attempts,
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+    active_task = BackgroundTask.objects.filter(
+        idempotency_key=idempotency_key,
+        status__in=BackgroundTask.ACTIVE_STATUSES,
+    ).first()
+    if active_task is not None:
+        return active_task
+    # Занявшая ключ задача успела завершиться
+    return enqueue(name, payload, idempotency_key, delay)
+
+
+def enqueue_on_commit(name, payload=None, idempotency_key=None, delay=0):
+    # Задача попадает в очередь только после фиксации транзакции запроса,
+    # иначе обработчик может не увидеть еще не закоммиченные данные
+    get_task(name)
+    transaction.on_commit(
+        lambda: enqueue(name, payload, idempotency_key, delay)
+    )
+
+
+def enqueue_merged(name, argument, values, delay=0, window=0):
+    # Значения добавляются в ждущую задачу, которая запустится не раньше
+    # чем через delay секунд и не позже чем через delay + window: изменения
+    # многих транзакций обрабатываются одним запуском. Новая задача ждет
+    # window секунд, собирая значения следующих транзакций
+    get_task(name)
+    values = set(values)
+    if TASK_QUEUE_EAGER:
+        return enqueue(name, {argument: sorted(values)})
+
+    earliest = timezone.now() + timedelta(seconds=delay)
+    with transaction.atomic():
+        # Задачу, которую обработчик уже забирает, блокировка пропустит
+        # после его фиксации: статус у нее будет другой
+        pending_task = BackgroundTask.objects.select_for_update().filter(
+            name=name,
+            status=BackgroundTask.PENDING,
+            run_at__gte=earliest,
+            run_at__lte=earliest + timedelta(seconds=window),
+        ).order_by('run_at', 'id').first()
+        if pending_task is not None:
+            pending_task.payload[argument] = sorted(
+                values | set(pending_task.payload.get(argument, []))
+            )
+            pending_task.save(update_fields=['payload'])
+            return pending_task
+    return enqueue(name, {argument: sorted(values)}, delay=delay + window)
+
+
+class TaskBatch:
+    # Аргументы одной задачи, накопленные за транзакцию: в очередь она
+    # ставится один раз после фиксации. Со schedule - пары (delay, window)
+    # для enqueue_merged - задача ставится по разу на каждую пару
+
+    def __init__(self, name, argument, schedule=None):
+        self.name = name
+        self.argument = argument
+        self.schedule = schedule
+        self.values = set()
+        self.flushed = False
+
+    def flush(self):
+        self.flushed = True
+        values, self.values = sorted(self.values), set()
+        try:
+            if self.schedule is None:
+                enqueue(self.name, {self.argument: values})
+                return
+            for delay, window in self.schedule:
+                enqueue_merged(
+                    self.name, self.argument, values, delay, window
+                )
+        except Exception as exc:
+            logger.error(f"Error enqueueing batched task {self.name}: {exc}")
+
+
+def _is_pending(db_connection, batch):
+    # Отправленный пакет больше не пополняется, даже если его обработчик
+    # еще числится в run_on_commit
+    return not batch.flushed and db_connection.in_atomic_block and any(
+        callback == batch.flush for _, callback in db_connection.run_on_commit
+    )
+
+
+def enqueue_batch_on_commit(name, argument, values, schedule=None):
+    get_task(name)
+    db_connection = transaction.get_connection()
+    if not hasattr(db_connection, 'task_batches'):
+        db_connection.task_batches = {}
+    batch = db_connection.task_batches.get(name)
+    if batch is not None and _is_pending(db_connection, batch):
+        batch.values.update(values)
+        return
+    batch = TaskBatch(name, argument, schedule)
+    batch.values.update(values)
+    db_connection.task_batches[name] = batch
+    db_connection.on_commit(batch.flush)
+
+
+def retry_delay(attempts):
+    delay = min(
+        TASK_QUEUE_RETRY_MAX_DELAY,
+        TASK_QUEUE_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0)
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim_tasks(worker_id, limit=TASK_QUEUE_BATCH_SIZE):
+    now = timezone.now()
+    pending = BackgroundTask.objects.filter(
+        status=BackgroundTask.PENDING, run_at__lte=now
+    ).order_by('run_at', 'id')
+    claim = {
+        'status': BackgroundTask.RUNNING,
+        'locked_at': now,
+        'locked_by': worker_id,
+        'attempts': F('attempts') + 1,
+    }
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            task_ids = list(
+                pending.select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:limit]
+            )
+            BackgroundTask.objects.filter(id__in=task_ids).update(**claim)
+        else:
+            # SQLite не умеет блокировать строки: задачу забирает тот
+            # обработчик, чей условный UPDATE сработал первым
+            task_ids = [
+                task_id
+                for task_id in list(
+                    pending.values_list('id', flat=True)[:limit]
+                )
+                if BackgroundTask.objects.filter(
+                    id=task_id, status=BackgroundTask.PENDING
+                ).update(**claim)
+            ]
+
+    return list(
+        BackgroundTask.objects.filter(id__in=task_ids).order_by('run_at', 'id')
+    )
+
+
+class LockHeartbeat:
+    # Пока задача выполняется, locked_at продлевается: долгую задачу
+    # release_stale_tasks не вернет в очередь, пока жив ее обработчик
+
+    def __init__(self, task_id, worker_id,
+                 interval=TASK_QUEUE_LOCK_TIMEOUT / 3):
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    _owned(self.task_id, self.worker_id).update(
+                        locked_at=timezone.now()
+                    )
+                except Exception as exc:
+                    logger.error(
+                        f"Error extending lock of task #{self.task_id}: {exc}"
+                    )
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f'task-heartbeat-{self.task_id}',
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def _owned(task_id, worker_id):
+    # Задача, которую вернули в очередь и забрал другой обработчик, этому
+    # обработчику больше не принадлежит
+    return BackgroundTask.objects.filter(
+        id=task_id, locked_by=worker_id, status=BackgroundTask.RUNNING
+    )
+
+
+def run_task(background_task, worker_id):
+    # Задачи пакета выполняются по очереди, поэтому блокировка каждой
+    # обновляется перед запуском; если задачу уже забрали, она пропускается
+    owned = _owned(background_task.id, worker_id)
+    if not owned.update(locked_at=timezone.now()):
+        logger.warning(
+            f"Task {background_task.name} #{background_task.id} was "
+            f"released before it started, skipping"
+        )
+        return None
+    try:
+        func = get_task(background_task.name)
+        with LockHeartbeat(background_task.id, worker_id):
+            with transaction.atomic():
+                func(**background_task.payload)
+    except Exception as exc:
+        finished = (
+            isinstance(exc, LookupError)
+            or background_task.attempts >= background_task.max_attempts
+        )
+        if finished:
+            logger.exception(
+                f"Task {background_task.name} #{background_task.id} failed "
+                f"after {background_task.attempts} attempts: {exc}"
+            )
+            owned.update(
+                status=BackgroundTask.FAILED,
+                last_error=repr(exc),
+                finished_at=timezone.now(),
+            )
+        else:
+            delay = retry_delay(background_task.attempts)
+            logger.warning(
+                f"Task {background_task.name} #{background_task.id} failed, "
+                f"retry in {delay:.0f}s: {exc}"
+            )
+            owned.update(
+                status=BackgroundTask.PENDING,
+                last_error=repr(exc),
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+        return False
+
+    owned.update(
+        status=BackgroundTask.DONE,
+        last_error='',
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+def release_stale_tasks():
+    # Задачи упавшего обработчика возвращаются в очередь по таймауту
+    stale_before = timezone.now() - timedelta(seconds=TASK_QUEUE_LOCK_TIMEOUT)
+    stale = BackgroundTask.objects.filter(
+        status=BackgroundTask.RUNNING, locked_at__lt=stale_before
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=BackgroundTask.FAILED,
+        last_error='Превышено время выполнения',
+        finished_at=timezone.now(),
+    )
+    released = stale.update(status=BackgroundTask.PENDING)
+    return released + failed
+
+
+def purge_finished_tasks():
+    finished_before = timezone.now() - timedelta(
+        days=TASK_QUEUE_RETENTION_DAYS
+    )
+    deleted_count, _ = BackgroundTask.objects.filter(
+        status=BackgroundTask.DONE, finished_at__lt=finished_before
+    ).delete()
+    return deleted_count
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_worker(worker_id=None, batch_size=TASK_QUEUE_BATCH_SIZE,
+               poll_interval=TASK_QUEUE_POLL_INTERVAL, burst=False):
+    worker_id = worker_id or default_worker_id()
+    stats = {'done': 0, 'failed': 0}
+    stopping = []
+
+    def stop(signum, frame):
+        logger.info(f"Worker {worker_id} stopping after current task")
+        stopping.append(signum)
+
+    previous_handlers = {
+        signum: signal.signal(signum, stop)
+        for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    last_maintenance = 0
+    try:
+        while not stopping:
+            close_old_connections()
+            if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                release_stale_tasks()
+                purge_finished_tasks()
+                last_maintenance = time.monotonic()
+
+            claimed = claim_tasks(worker_id, batch_size)
+            if not claimed:
+                if burst:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            for index, background_task in enumerate(claimed):
+                if stopping:
+                    BackgroundTask.objects.filter(
+                        id__in=[item.id for item in claimed[index:]],
+                        locked_by=worker_id,
+                        status=BackgroundTask.RUNNING,
+                    ).update(
+                        status=BackgroundTask.PENDING,
+                        attempts=F('attempts') - 1,
+                    )
+                    break
+                result = run_task(background_task, worker_id)
+                if result:
+                    stats['done'] += 1
+                elif result is not None:
+                    stats['failed'] += 1
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+    return stats
@@ -0,0 +1,42 @@
+from .cache_purge import purge_cache_entries
+from .feed import backfill_subscription, fan_out_recipe
+from .models import Recipe, Subscription
+from .shopping_list import ShoppingListArtifact
+from .similarity import refresh_similar_recipes
+from .task_queue import task
+
+
+@task('feed.fan_out_recipe')
+def fan_out_recipe_task(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is not None:
+        fan_out_recipe(recipe)
+
+
+@task('feed.fan_out_recipes')
+def fan_out_recipes_task(recipe_ids):
+    for recipe in Recipe.objects.filter(id__in=recipe_ids):
+        fan_out_recipe(recipe)
+
+
+@task('feed.backfill_subscription')
+def backfill_subscription_task(subscription_id):
+    # Подписка могла быть отменена, пока задача ждала в очереди
+    subscription = Subscription.objects.filter(id=subscription_id).first()
+    if subscription is not None:
+        backfill_subscription(subscription.user_id, subscription.author_id)
+
+
+@task('exports.build_shopping_list', max_attempts=3)
+def build_shopping_list_task(user_id, export_format='txt'):
+    ShoppingListArtifact.for_user(user_id, export_format).build()
+
+
+@task('cache.purge_surrogate_keys')
+def purge_surrogate_keys_task(keys):
+    purge_cache_entries(keys)
+
+
+@task('similarity.refresh_recipes')
+def refresh_similar_recipes_task(recipe_ids):
+    refresh_similar_recipes(recipe_ids)
@@ -0,0 +1,163 @@
+import threading
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import batch
+from api.throttling import ActionTokenBucketThrottle
+from recipes.models import Tag, User
+
+
+def _user(username):
+    return User.objects.create(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+def _tag(slug, color):
+    return Tag.objects.create(name=slug, color=color, slug=slug)
+
+
+class BatchTestMixin:
+
+    def setUp(self):
+        # Состояние ограничителей хранится в файле и переживает тесты
+        patcher = mock.patch.object(
+            ActionTokenBucketThrottle, 'allow_request', return_value=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def post(self, requests, **kwargs):
+        return self.client.post(
+            '/api/batch/', {'requests': requests, **kwargs}, format='json'
+        )
+
+
+class BatchLimitsTest(BatchTestMixin, TestCase):
+
+    def test_request_count_is_limited(self):
+        items = [{'url': '/api/tags/'}] * batch.BATCH_MAX_REQUESTS
+        self.assertEqual(self.post(items).status_code, 200)
+        response = self.post(items + [{'url': '/api/tags/'}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_items_are_rejected(self):
+        for items in (
+            [],
+            [{'url': 'http://example.com/api/tags/'}],
+            [{'url': '/admin/'}],
+            [{'url': '/api/tags/', 'body': {}}],
+        ):
+            with self.subTest(items=items):
+                self.assertEqual(self.post(items).status_code, 400)
+
+    def test_item_errors_do_not_fail_batch(self):
+        response = self.post([
+            {'id': 'missing', 'url': '/api/missing/'},
+            {'id': 'nested', 'method': 'POST', 'url': '/api/batch/',
+             'body': {}},
+            {'id': 'tags', 'url': '/api/tags/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['id'], item['status'])
+             for item in response.data['responses']],
+            [('missing', 404), ('nested', 400), ('tags', 200)]
+        )
+
+
+class BatchAuthTest(BatchTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = _user('reader')
+        self.token = Token.objects.create(user=self.user).key
+
+    def test_batch_user_is_forwarded(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.post([{'url': '/api/users/me/'}])
+        me, = response.data['responses']
+        self.assertEqual(me['status'], 200)
+        self.assertEqual(me['body']['username'], 'reader')
+
+    def test_anonymous_batch_stays_anonymous(self):
+        response = self.post([{'url': '/api/users/me/'}])
+        self.assertEqual(response.data['responses'][0]['status'], 401)
+
+    def test_item_cannot_override_credentials(self):
+        response = self.post([{
+            'url': '/api/users/me/',
+            'headers': {'Authorization': 'Token ' + self.token},
+        }])
+        self.assertEqual(response.data['responses'][0]['status'], 401)
+
+
+@override_settings(ROOT_URLCONF='foodgram.urls_asgi')
+class BatchAsgiUrlconfTest(BatchTestMixin, TestCase):
+    # Под ASGI /api/tags/ обслуживает асинхронное представление, а
+    # подзапрос пакета - синхронное
+
+    def test_async_route_resolves_to_sync_view(self):
+        _tag('breakfast', '#E26C2D')
+        response = self.post([{'url': '/api/tags/'}])
+        self.assertEqual(response.status_code, 200)
+        tags, = response.data['responses']
+        self.assertEqual(tags['status'], 200)
+        self.assertEqual(tags['body'][0]['slug'], 'breakfast')
+
+
+class BatchConcurrentGetTest(BatchTestMixin, TransactionTestCase):
+
+    def test_consecutive_gets_run_in_parallel(self):
+        _tag('breakfast', '#E26C2D')
+        _tag('dinner', '#49B64E')
+        tags = list(Tag.objects.order_by('slug'))
+        urls = [f'/api/tags/{tag.id}/' for tag in tags] + ['/api/tags/']
+        # Каждый подзапрос ждет остальные: последовательное выполнение
+        # сломало бы барьер
+        barrier = threading.Barrier(len(urls), timeout=10)
+        run = batch.run_subrequest
+
+        def waiting_run(request, item):
+            barrier.wait()
+            return run(request, item)
+
+        with mock.patch.object(batch, 'run_subrequest', waiting_run):
+            response = self.post(
+                [{'id': str(i), 'url': url} for i, url in enumerate(urls)],
+                parallel=True
+            )
+        results = response.data['responses']
+        self.assertEqual(
+            [item['id'] for item in results], ['0', '1', '2']
+        )
+        self.assertEqual([item['status'] for item in results], [200] * 3)
+        self.assertEqual(
+            [item['body']['slug'] for item in results[:2]],
+            ['breakfast', 'dinner']
+        )
+
+    def test_writes_split_parallel_groups(self):
+        calls = []
+        run = batch.run_subrequest
+
+        def recording_run(request, item):
+            calls.append((item['method'], threading.get_ident()))
+            return run(request, item)
+
+        with mock.patch.object(batch, 'run_subrequest', recording_run):
+            response = self.post([
+                {'url': '/api/tags/'},
+                {'method': 'POST', 'url': '/api/tags/', 'body': {}},
+                {'url': '/api/tags/'},
+            ], parallel=True)
+        self.assertEqual(response.status_code, 200)
+        # Одиночные GET и запись выполняются в потоке пакета
+        self.assertEqual(
+            {ident for _, ident in calls}, {threading.get_ident()}
+        )
@@ -0,0 +1,177 @@
+import threading
+from unittest import mock, skipUnless
+
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes import changes
+from recipes.changes import (CHANGE_LOG_HORIZON,
+                             CHANGE_LOG_HORIZON_TRANSACTION, ChangeLogExpired,
+                             changes_since, format_cursor, latest_cursor,
+                             parse_cursor)
+from recipes.models import ChangeLogEntry, Tag, VersionStamp
+
+
+def _tag(slug):
+    return Tag.objects.create(name=slug, color='#E26C2D', slug=slug)
+
+
+def _entry(entry_id, transaction_id, object_id):
+    return ChangeLogEntry.objects.create(
+        id=entry_id, transaction_id=transaction_id,
+        entity=ChangeLogEntry.TAG, object_id=object_id,
+        action=ChangeLogEntry.UPSERT,
+    )
+
+
+def _finished_before(xmin):
+    # Незавершенные транзакции - все с номером не меньше xmin
+    return mock.patch.object(
+        changes, '_finished',
+        lambda queryset: queryset.filter(transaction_id__lt=xmin)
+    )
+
+
+class ChangeLogTransactionTest(TestCase):
+
+    def test_entries_written_with_changes(self):
+        tag = _tag('breakfast')
+        self.assertTrue(
+            ChangeLogEntry.objects.filter(
+                entity=ChangeLogEntry.TAG, object_id=tag.id
+            ).exists()
+        )
+
+    def test_rollback_discards_entries(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                _tag('dinner')
+                raise RuntimeError
+        self.assertFalse(ChangeLogEntry.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_failed_entry_cancels_change(self):
+        with mock.patch.object(
+            ChangeLogEntry.objects, 'using', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    _tag('lunch')
+        self.assertFalse(Tag.objects.exists())
+
+
+class ChangeLogOrderingTest(TestCase):
+    # id выдаются при вставке, фиксация идет в другом порядке: записи
+    # незавершенной транзакции не должны оказаться перед курсором
+
+    def test_later_commit_with_lower_id_is_delivered(self):
+        _entry(11, 102, object_id=2)
+        with _finished_before(101):
+            page = changes_since(None, (0, 0))
+        self.assertEqual(page['changes'], [])
+        self.assertEqual(page['cursor'], format_cursor((0, 0)))
+
+        _entry(10, 101, object_id=1)
+        with _finished_before(103):
+            page = changes_since(None, (0, 0))
+        self.assertEqual(
+            [change['id'] for change in page['changes']], [1, 2]
+        )
+        self.assertEqual(page['cursor'], format_cursor((102, 11)))
+
+    def test_cursor_stops_before_unfinished_transactions(self):
+        _entry(1, 100, object_id=1)
+        _entry(3, 102, object_id=3)
+        with _finished_before(101):
+            page = changes_since(None, (0, 0))
+            self.assertEqual(page['cursor'], format_cursor((100, 1)))
+            self.assertEqual(latest_cursor(), format_cursor((100, 1)))
+
+        _entry(2, 101, object_id=2)
+        with _finished_before(103):
+            page = changes_since(None, (100, 1))
+        self.assertEqual(
+            [change['id'] for change in page['changes']], [2, 3]
+        )
+
+    def test_pages_follow_positions(self):
+        for entry_id, transaction_id in ((5, 100), (4, 101), (6, 101)):
+            _entry(entry_id, transaction_id, object_id=entry_id)
+        with _finished_before(102):
+            first = changes_since(None, (0, 0), limit=2)
+            second = changes_since(None, (101, 4), limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([change['id'] for change in first['changes']], [5, 4])
+        self.assertEqual(first['cursor'], format_cursor((101, 4)))
+        self.assertFalse(second['has_more'])
+        self.assertEqual([change['id'] for change in second['changes']], [6])
+
+
+class ChangeLogExpiredTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        VersionStamp.objects.create(
+            key=CHANGE_LOG_HORIZON_TRANSACTION, version=100
+        )
+        VersionStamp.objects.create(key=CHANGE_LOG_HORIZON, version=5)
+
+    def test_cursor_before_horizon_expired(self):
+        with self.assertRaises(ChangeLogExpired):
+            changes_since(None, (100, 4))
+
+    def test_api_returns_gone_with_current_cursor(self):
+        for since in ('100-4', '99-10', '3'):
+            with self.subTest(since=since):
+                response = self.client.get('/api/changes/', {'since': since})
+                self.assertEqual(response.status_code, 410)
+                self.assertEqual(response.data['cursor'], '100-5')
+
+    def test_api_accepts_horizon_cursor(self):
+        response = self.client.get('/api/changes/', {'since': '100-5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cursor'], '100-5')
+
+    def test_api_rejects_malformed_cursor(self):
+        for since in ('abc', '1-', '-1', '1-2-3'):
+            with self.subTest(since=since):
+                response = self.client.get('/api/changes/', {'since': since})
+                self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Параллельные транзакции с записью проверяются только в PostgreSQL'
+)
+class ChangeLogConcurrentCommitTest(TransactionTestCase):
+
+    def test_entry_of_open_transaction_is_not_skipped(self):
+        written = threading.Event()
+        release = threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    _tag('slow')
+                    written.set()
+                    release.wait(10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=slow_writer)
+        thread.start()
+        try:
+            self.assertTrue(written.wait(10))
+            fast = _tag('fast')
+            page = changes_since(None, (0, 0))
+            self.assertEqual(page['changes'], [])
+        finally:
+            release.set()
+            thread.join()
+
+        page = changes_since(None, parse_cursor(page['cursor']))
+        self.assertEqual(
+            [change['id'] for change in page['changes']],
+            [Tag.objects.get(slug='slow').id, fast.id]
+        )
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from foodgram import db
+
+
+def _connection():
+    conn = mock.Mock(connection=object())
+    conn.settings_dict = {'CONN_HEALTH_CHECKS': True}
+    conn.is_usable.return_value = False
+    return conn
+
+
+class ConnectionHealthCheckTest(SimpleTestCase):
+
+    def check(self, conn, now):
+        with mock.patch.object(db.connections, 'all', return_value=[conn]), \
+                mock.patch.object(db.time, 'monotonic', return_value=now):
+            db.check_persistent_connections()
+
+    def test_recently_released_connection_is_not_pinged(self):
+        conn = _connection()
+        conn.released_at = 100
+        self.check(conn, 100 + db.DB_CONN_HEALTH_CHECK_IDLE - 1)
+        conn.is_usable.assert_not_called()
+        conn.close.assert_not_called()
+
+    def test_idle_connection_is_checked(self):
+        conn = _connection()
+        conn.released_at = 100
+        self.check(conn, 100 + db.DB_CONN_HEALTH_CHECK_IDLE)
+        conn.is_usable.assert_called_once()
+        conn.close.assert_called_once()
+
+    def test_release_is_recorded(self):
+        conn = _connection()
+        with mock.patch.object(db.connections, 'all', return_value=[conn]), \
+                mock.patch.object(db.time, 'monotonic', return_value=42):
+            db.mark_released_connections()
+        self.assertEqual(conn.released_at, 42)
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes import feed
+from recipes.feed import backfill_subscription, fan_out_recipe, get_feed_page
+from recipes.models import FeedEntry, Recipe, Subscription, User
+
+
+def _user(username):
+    return User.objects.create(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+class HeavyAuthorTransitionTest(TestCase):
+    # Рецепт, опубликованный, пока у автора было больше подписчиков, чем
+    # порог рассылки, должен остаться в ленте и после перехода порога
+
+    def setUp(self):
+        patcher = mock.patch.object(feed, 'FEED_FANOUT_MAX_SUBSCRIBERS', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = _user('author')
+        self.reader = _user('reader')
+        self.other = _user('other')
+
+    def subscribe(self, user):
+        subscription = Subscription.objects.create(
+            user=user, author=self.author
+        )
+        backfill_subscription(user.id, self.author.id)
+        return subscription
+
+    def publish(self, name):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text='Описание',
+            cooking_time=10, image='recipes/images/test.png',
+        )
+        fan_out_recipe(recipe)
+        recipe.refresh_from_db()
+        return recipe
+
+    def feed_ids(self, user):
+        recipe_ids, _ = get_feed_page(user, limit=10)
+        return recipe_ids
+
+    def test_recipe_published_while_heavy_survives_drop(self):
+        self.subscribe(self.reader)
+        other_subscription = self.subscribe(self.other)
+        heavy_recipe = self.publish('Для многих')
+        self.assertFalse(heavy_recipe.fanned_out)
+        self.assertFalse(FeedEntry.objects.exists())
+
+        other_subscription.delete()
+        light_recipe = self.publish('Для одного')
+        self.assertTrue(light_recipe.fanned_out)
+        self.assertEqual(
+            self.feed_ids(self.reader), [light_recipe.id, heavy_recipe.id]
+        )
+
+    def test_recipe_published_while_light_survives_growth(self):
+        self.subscribe(self.reader)
+        light_recipe = self.publish('Для одного')
+        self.subscribe(self.other)
+        heavy_recipe = self.publish('Для многих')
+        for user in (self.reader, self.other):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    self.feed_ids(user), [heavy_recipe.id, light_recipe.id]
+                )
+
+    def test_pending_fan_out_is_read_and_not_duplicated(self):
+        self.subscribe(self.reader)
+        recipe = Recipe.objects.create(
+            author=self.author, name='В очереди', text='Описание',
+            cooking_time=10, image='recipes/images/test.png',
+        )
+        self.assertEqual(self.feed_ids(self.reader), [recipe.id])
+        fan_out_recipe(recipe)
+        backfill_subscription(self.reader.id, self.author.id)
+        self.assertEqual(self.feed_ids(self.reader), [recipe.id])
+
+    def test_unsubscribe_hides_unfanned_recipes(self):
+        subscription = self.subscribe(self.reader)
+        self.subscribe(self.other)
+        self.publish('Для многих')
+        subscription.delete()
+        self.assertEqual(self.feed_ids(self.reader), [])
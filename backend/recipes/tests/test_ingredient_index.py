@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes import ingredient_index as module
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient, Recipe, RecipeIngredient, User
+
+
+def _user(username):
+    return User.objects.create(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+class IngredientIndexTest(TestCase):
+
+    def setUp(self):
+        author = _user('author')
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(4)
+        ]
+        self.recipes = []
+        for count in (1, 2, 3, 4):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {count}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png',
+            )
+            for ingredient in self.ingredients[:count]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+            self.recipes.append(recipe)
+        self.query = [ingredient.id for ingredient in self.ingredients[:2]]
+
+    def test_first_search_does_not_build_on_request(self):
+        index = IngredientIndex()
+        with mock.patch.object(module.threading, 'Thread') as thread:
+            self.assertIsNone(index.search(self.query))
+        thread.return_value.start.assert_called_once()
+        self.assertFalse(index.is_ready())
+
+    def test_version_check_is_rate_limited(self):
+        index = IngredientIndex()
+        index.build()
+        with self.assertNumQueries(0):
+            index.search(self.query)
+            index.search(self.query)
+        index._checked_at -= module.INGREDIENT_INDEX_CHECK_INTERVAL
+        with self.assertNumQueries(1):
+            index.search(self.query)
+
+    def test_database_fallback_matches_index(self):
+        index = IngredientIndex()
+        index.build()
+        expected = [
+            recipe_id for recipe_id, _ in index.search(self.query)
+        ]
+        client = APIClient()
+        url = '/api/recipes/?have_ingredients=' + ','.join(
+            str(ingredient_id) for ingredient_id in self.query
+        )
+        for max_missing in ('', '&max_missing=1'):
+            with self.subTest(max_missing=max_missing):
+                with mock.patch.object(
+                    module.ingredient_index, 'search', return_value=None
+                ):
+                    response = client.get(url + max_missing)
+                self.assertEqual(response.status_code, 200)
+                ids = [recipe['id'] for recipe in response.data['results']]
+                if max_missing:
+                    self.assertEqual(ids, expected[:3])
+                else:
+                    self.assertEqual(ids, expected)
@@ -0,0 +1,58 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.ingredient_search import IngredientNameIndex, fuzzy_search
+from recipes.models import Ingredient
+
+NAMES = (
+    'абрикосовое варенье', 'абрикосовое пюре', 'абрикосы',
+    'апельсиновое варенье', 'персиковое пюре', 'сахар',
+)
+
+
+class IngredientNameIndexTest(TestCase):
+
+    def setUp(self):
+        self.ids = {
+            name: Ingredient.objects.create(
+                name=name, measurement_unit='г'
+            ).id
+            for name in NAMES
+        }
+        self.index = IngredientNameIndex()
+        self.index.build()
+
+    def names(self, ingredient_ids):
+        names = {ingredient_id: name for name, ingredient_id in self.ids.items()}
+        return [names[ingredient_id] for ingredient_id in ingredient_ids]
+
+    def test_typo_ranks_intended_ingredients_first(self):
+        found = self.names(self.index.search('абрикосавое'))
+        self.assertCountEqual(
+            found[:2], ['абрикосовое варенье', 'абрикосовое пюре']
+        )
+        self.assertNotIn('сахар', found)
+
+    def test_prefix_hits_come_first(self):
+        found = self.names(self.index.search('Абрикосовое'))
+        self.assertEqual(
+            found[:2], ['абрикосовое варенье', 'абрикосовое пюре']
+        )
+
+    def test_blank_query_finds_nothing(self):
+        for query in ('', '   '):
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search(query), [])
+                self.assertFalse(
+                    fuzzy_search(Ingredient.objects.all(), query).exists()
+                )
+
+    def test_api_fuzzy_search(self):
+        response = APIClient().get(
+            '/api/ingredients/', {'name': 'абрикосавое', 'fuzzy': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        names = [ingredient['name'] for ingredient in response.data]
+        self.assertCountEqual(
+            names[:2], ['абрикосовое варенье', 'абрикосовое пюре']
+        )
@@ -0,0 +1,59 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShortLink, Subscription, Tag)
+from recipes.query_plans import (FULL_SCAN_PATTERNS, build_queries, explain,
+                                 full_scans)
+
+User = get_user_model()
+
+
+@skipUnless(
+    connection.vendor in FULL_SCAN_PATTERNS,
+    'Разбор планов есть только для PostgreSQL и SQLite'
+)
+class HotQueryPlansTest(TestCase):
+    # Горячие запросы должны находить строки по индексу, а не читать
+    # таблицу целиком
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Тестовый',
+        )
+        cls.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Тестовый',
+        )
+        tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'), ('dinner', '#49B64E'))
+        ]
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png',
+            )
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+            ShortLink.objects.create(recipe=recipe, short_id=f'abc12{number}')
+        Subscription.objects.create(user=cls.user, author=cls.author)
+
+    def test_hot_queries_use_indexes(self):
+        queries = build_queries(self.user, self.author.id)
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                plan = explain(queryset)
+                self.assertEqual(full_scans(plan), [], plan)
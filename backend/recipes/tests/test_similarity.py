@@ -0,0 +1,83 @@
+import random
+
+from django.test import TestCase
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeSimilarity, Tag, User)
+from recipes.similarity import SIMILAR_RECIPES_COUNT, rebuild_similar_recipes
+from recipes.task_queue import run_worker
+
+
+class IncrementalSimilarityTest(TestCase):
+    # Списки после точечных пересчетов совпадают с полным пересчетом
+
+    def setUp(self):
+        self.random = random.Random(4)
+        self.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия',
+        )
+        self.tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E'))
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ing{index}', measurement_unit='г')
+            for index in range(8)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes = [
+                self.create_recipe(index)
+                for index in range(SIMILAR_RECIPES_COUNT * 3)
+            ]
+        run_worker(burst=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_similar_recipes()
+
+    def create_recipe(self, index):
+        recipe = Recipe.objects.create(
+            author=self.author, name=f'Рецепт {index}', text='Описание',
+            cooking_time=10, image='recipes/images/test.png',
+        )
+        self.set_ingredients(recipe)
+        recipe.tags.set([self.random.choice(self.tags)])
+        return recipe
+
+    def set_ingredients(self, recipe):
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        for ingredient in self.random.sample(self.ingredients, 3):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=10
+            )
+
+    def lists(self):
+        return {
+            (recipe_id, similar_id, round(score, 9))
+            for recipe_id, similar_id, score in
+            RecipeSimilarity.objects.values_list(
+                'recipe_id', 'similar_recipe_id', 'score'
+            )
+        }
+
+    def assert_matches_rebuild(self):
+        run_worker(burst=True)
+        incremental = self.lists()
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_similar_recipes()
+        self.assertEqual(incremental, self.lists())
+
+    def test_delete_refills_referrers(self):
+        referenced = RecipeSimilarity.objects.values_list(
+            'similar_recipe_id', flat=True
+        ).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(id=referenced).delete()
+        self.assert_matches_rebuild()
+
+    def test_changes_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set_ingredients(self.recipes[0])
+            self.recipes[1].tags.set(self.tags)
+            self.create_recipe(100)
+            self.recipes[2].delete()
+        self.assert_matches_rebuild()
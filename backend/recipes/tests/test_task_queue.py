@@ -0,0 +1,97 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from recipes import task_queue
+from recipes.models import BackgroundTask
+from recipes.task_queue import (LockHeartbeat, claim_tasks, enqueue,
+                                release_stale_tasks, run_task, task)
+
+calls = []
+
+
+@task('tests.record_call')
+def record_call_task(value):
+    calls.append(value)
+
+
+class TaskLockTest(TestCase):
+    # Задачи пакета выполняются по очереди: задачу, которую вернули в
+    # очередь и забрал другой обработчик, первый не выполняет и не трогает
+
+    def setUp(self):
+        calls.clear()
+
+    def claim(self, worker_id):
+        claimed = claim_tasks(worker_id)
+        self.assertEqual(len(claimed), 1)
+        return claimed[0]
+
+    def expire_lock(self, background_task):
+        BackgroundTask.objects.filter(id=background_task.id).update(
+            locked_at=timezone.now() - timedelta(
+                seconds=task_queue.TASK_QUEUE_LOCK_TIMEOUT + 1
+            )
+        )
+
+    def test_released_task_is_skipped_by_previous_owner(self):
+        enqueue('tests.record_call', {'value': 1})
+        stale_copy = self.claim('first')
+        self.expire_lock(stale_copy)
+        release_stale_tasks()
+        self.claim('second')
+
+        self.assertIsNone(run_task(stale_copy, 'first'))
+        self.assertEqual(calls, [])
+        current = BackgroundTask.objects.get(id=stale_copy.id)
+        self.assertEqual(current.status, BackgroundTask.RUNNING)
+        self.assertEqual(current.locked_by, 'second')
+
+    def test_start_refreshes_lock(self):
+        enqueue('tests.record_call', {'value': 1})
+        background_task = self.claim('first')
+        self.expire_lock(background_task)
+        with mock.patch.object(
+            task_queue, 'get_task', side_effect=lambda name: (
+                lambda **payload: self.assertEqual(release_stale_tasks(), 0)
+            )
+        ):
+            self.assertTrue(run_task(background_task, 'first'))
+        self.assertEqual(
+            BackgroundTask.objects.get(id=background_task.id).status,
+            BackgroundTask.DONE
+        )
+
+    def test_result_of_lost_claim_is_not_written(self):
+        enqueue('tests.record_call', {'value': 1})
+        background_task = self.claim('first')
+
+        def steal(**payload):
+            BackgroundTask.objects.filter(id=background_task.id).update(
+                locked_by='second'
+            )
+
+        with mock.patch.object(task_queue, 'get_task', return_value=steal):
+            run_task(background_task, 'first')
+        current = BackgroundTask.objects.get(id=background_task.id)
+        self.assertEqual(current.status, BackgroundTask.RUNNING)
+        self.assertEqual(current.locked_by, 'second')
+
+
+class LockHeartbeatTest(TransactionTestCase):
+    # Продление блокировки идет из отдельного потока и соединения
+
+    def test_heartbeat_extends_lock(self):
+        enqueue('tests.record_call', {'value': 1})
+        background_task = claim_tasks('first')[0]
+        BackgroundTask.objects.filter(id=background_task.id).update(
+            locked_at=timezone.now() - timedelta(
+                seconds=task_queue.TASK_QUEUE_LOCK_TIMEOUT + 1
+            )
+        )
+        with LockHeartbeat(background_task.id, 'first', interval=0.01):
+            time.sleep(0.2)
+        self.assertEqual(release_stale_tasks(), 0)
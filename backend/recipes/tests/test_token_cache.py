@@ -0,0 +1,63 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from recipes.models import User
+from recipes.versions import AUTH_VERSION, auth_version_key, bump_versions
+
+
+def _user(username):
+    return User.objects.create(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+class TokenCacheInvalidationTest(TestCase):
+    # Изменение пользователя в другом процессе сбрасывает только его
+    # токены; общая версия сбрасывает кэш целиком
+
+    def setUp(self):
+        # Версии в БД откатываются после каждого теста, кэш процесса - нет
+        token_cache._entries.clear()
+        token_cache._keys_by_user.clear()
+        token_cache._user_versions.clear()
+        token_cache._version = None
+        token_cache._checked_at = None
+        self.first = _user('first')
+        self.second = _user('second')
+        self.tokens = {
+            user.id: Token.objects.create(user=user).key
+            for user in (self.first, self.second)
+        }
+
+    def me(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[user.id])
+        return client.get('/api/users/me/')
+
+    def cached(self, user):
+        token_cache._checked_at = None
+        return token_cache.get(self.tokens[user.id]) is not None
+
+    def test_user_change_drops_only_own_tokens(self):
+        for user in (self.first, self.second):
+            self.assertEqual(self.me(user).status_code, 200)
+        bump_versions(auth_version_key(self.first.id))
+        self.assertFalse(self.cached(self.first))
+        self.assertTrue(self.cached(self.second))
+
+    def test_global_version_drops_all_tokens(self):
+        for user in (self.first, self.second):
+            self.me(user)
+        bump_versions(AUTH_VERSION)
+        self.assertFalse(self.cached(self.first))
+        self.assertFalse(self.cached(self.second))
+
+    def test_changed_user_is_reloaded(self):
+        self.me(self.first)
+        User.objects.filter(id=self.first.id).update(first_name='Другое')
+        bump_versions(auth_version_key(self.first.id))
+        token_cache._checked_at = None
+        self.assertEqual(self.me(self.first).data['first_name'], 'Другое')
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, RecipeTrendingScore, User
+from recipes.trending import TRENDING_REFRESH_OVERLAP, refresh_trending_scores
+
+
+def _user(username):
+    return User.objects.create(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+class TrendingRefreshTest(TestCase):
+
+    def setUp(self):
+        self.author = _user('author')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png',
+        )
+        self.now = timezone.now()
+
+    def favorite(self, username, created_at):
+        favorite = Favorite.objects.create(
+            user=_user(username), recipe=self.recipe
+        )
+        Favorite.objects.filter(id=favorite.id).update(created_at=created_at)
+
+    def score(self):
+        return RecipeTrendingScore.objects.get(recipe=self.recipe).score
+
+    def full_score(self, now):
+        refresh_trending_scores(full=True, now=now)
+        return self.score()
+
+    def test_late_commit_counted_once(self):
+        self.favorite('first', self.now - timedelta(minutes=30))
+        refresh_trending_scores(now=self.now)
+        # Событие с датой до пересчета зафиксировано уже после него
+        self.favorite('late', self.now - timedelta(seconds=10))
+        later = self.now + timedelta(seconds=TRENDING_REFRESH_OVERLAP / 2)
+        refresh_trending_scores(now=later)
+        later_still = later + timedelta(seconds=TRENDING_REFRESH_OVERLAP * 3)
+        refresh_trending_scores(now=later_still)
+        incremental = self.score()
+        self.assertAlmostEqual(incremental, self.full_score(later_still))
+
+    def test_incremental_matches_full(self):
+        moments = [self.now + timedelta(minutes=minutes)
+                   for minutes in (0, 3, 20, 21, 90)]
+        for index, moment in enumerate(moments):
+            self.favorite(f'user{index}', moment - timedelta(seconds=1))
+            refresh_trending_scores(now=moment)
+        incremental = self.score()
+        self.assertAlmostEqual(incremental, self.full_score(moments[-1]))
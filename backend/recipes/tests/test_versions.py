@@ -0,0 +1,61 @@
+from django.test import TestCase
+
+from recipes.models import Recipe, User
+from recipes.versions import (CATALOG_VERSION, RECIPES_VERSION, get_versions,
+                              recipe_version_key)
+
+
+def _user(username):
+    return User.objects.create(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+class AuthorVersionTest(TestCase):
+    # Правки пользователей не должны сбрасывать ETag всего каталога
+
+    def setUp(self):
+        self.author = _user('author')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png',
+        )
+        self.other = Recipe.objects.create(
+            author=_user('other'), name='Чужой', text='Описание',
+            cooking_time=10, image='recipes/images/test.png',
+        )
+
+    def versions(self):
+        return get_versions(
+            CATALOG_VERSION, RECIPES_VERSION,
+            recipe_version_key(self.recipe.id),
+            recipe_version_key(self.other.id),
+        )
+
+    def test_signup_keeps_versions(self):
+        before = self.versions()
+        _user('newcomer')
+        self.assertEqual(self.versions(), before)
+
+    def test_non_rendered_change_keeps_versions(self):
+        before = self.versions()
+        self.author.set_password('new-password-123')
+        self.author.save()
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(self.versions(), before)
+
+    def test_user_without_recipes_keeps_versions(self):
+        reader = _user('reader')
+        before = self.versions()
+        reader.first_name = 'Другое'
+        reader.save()
+        self.assertEqual(self.versions(), before)
+
+    def test_author_change_bumps_own_recipes(self):
+        catalog, recipes, own, other = self.versions()
+        self.author.first_name = 'Другое'
+        self.author.save()
+        self.assertEqual(
+            self.versions(), [catalog, recipes + 1, own + 1, other]
+        )
@@ -0,0 +1,113 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Favorite, ShoppingCart, RecipeTrendingScore
+
+TRENDING_HALF_LIFE_HOURS = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 48)
+TRENDING_FAVORITE_WEIGHT = getattr(settings, 'TRENDING_FAVORITE_WEIGHT', 1.0)
+TRENDING_CART_WEIGHT = getattr(settings, 'TRENDING_CART_WEIGHT', 2.0)
+TRENDING_MIN_SCORE = getattr(settings, 'TRENDING_MIN_SCORE', 0.01)
+# Дольше этого транзакция с событием избранного или корзины не длится
+TRENDING_REFRESH_OVERLAP = getattr(settings, 'TRENDING_REFRESH_OVERLAP', 600)
+TRENDING_HORIZON_HALF_LIVES = 10
+EVENT_CHUNK_SIZE = 2000
+
+
+def _decay_rate():
+    return math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def _collect_deltas(since, until, now, rate):
+    deltas = defaultdict(float)
+    event_sources = (
+        (Favorite, TRENDING_FAVORITE_WEIGHT),
+        (ShoppingCart, TRENDING_CART_WEIGHT),
+    )
+    for model, weight in event_sources:
+        events = model.objects.filter(
+            created_at__gt=since, created_at__lte=until
+        ).values_list('recipe_id', 'created_at')
+        for recipe_id, created_at in events.iterator(chunk_size=EVENT_CHUNK_SIZE):
+            age = (now - created_at).total_seconds()
+            deltas[recipe_id] += weight * math.exp(-rate * age)
+    return deltas
+
+
+@transaction.atomic
+def refresh_trending_scores(full=False, now=None):
+    # Удаленные из избранного и корзины записи учитываются только при
+    # полном пересчете, который заново просматривает события за горизонт.
+    # created_at выставляется до фиксации транзакции, поэтому событие с
+    # ранней датой может появиться после пересчета. События последних
+    # TRENDING_REFRESH_OVERLAP секунд не накапливаются в settled_score, а
+    # учитываются заново при каждом пересчете: поздно зафиксированное
+    # событие не теряется и не считается дважды.
+    now = now or timezone.now()
+    rate = _decay_rate()
+    overlap = timedelta(seconds=TRENDING_REFRESH_OVERLAP)
+    last_refresh = RecipeTrendingScore.objects.aggregate(
+        last=Max('refreshed_at')
+    )['last']
+
+    if full or last_refresh is None:
+        RecipeTrendingScore.objects.all().delete()
+        horizon = timedelta(
+            hours=TRENDING_HALF_LIFE_HOURS * TRENDING_HORIZON_HALF_LIVES
+        )
+        settled_since = now - horizon
+    else:
+        elapsed = max((now - last_refresh).total_seconds(), 0)
+        decay = math.exp(-rate * elapsed)
+        RecipeTrendingScore.objects.update(
+            settled_score=F('settled_score') * decay,
+            score=F('settled_score') * decay,
+            refreshed_at=now
+        )
+        settled_since = last_refresh - overlap
+    settled_until = max(now - overlap, settled_since)
+
+    settled_deltas = _collect_deltas(settled_since, settled_until, now, rate)
+    recent_deltas = _collect_deltas(settled_until, now, now, rate)
+
+    recipe_ids = set(settled_deltas) | set(recent_deltas)
+    existing_scores = RecipeTrendingScore.objects.in_bulk(list(recipe_ids))
+    changed_scores = []
+    new_scores = []
+    for recipe_id in recipe_ids:
+        settled_delta = settled_deltas.get(recipe_id, 0)
+        recent_delta = recent_deltas.get(recipe_id, 0)
+        score_obj = existing_scores.get(recipe_id)
+        if score_obj is None:
+            new_scores.append(RecipeTrendingScore(
+                recipe_id=recipe_id,
+                settled_score=settled_delta,
+                score=settled_delta + recent_delta,
+                refreshed_at=now
+            ))
+        else:
+            score_obj.settled_score += settled_delta
+            score_obj.score = score_obj.settled_score + recent_delta
+            score_obj.refreshed_at = now
+            changed_scores.append(score_obj)
+
+    RecipeTrendingScore.objects.bulk_update(
+        changed_scores, ['settled_score', 'score', 'refreshed_at'],
+        batch_size=500
+    )
+    RecipeTrendingScore.objects.bulk_create(new_scores, batch_size=500)
+    pruned_count, _ = RecipeTrendingScore.objects.filter(
+        score__lt=TRENDING_MIN_SCORE
+    ).delete()
+
+    return {
+        'full': full or last_refresh is None,
+        'updated': len(changed_scores),
+        'created': len(new_scores),
+        'pruned': pruned_count,
+    }
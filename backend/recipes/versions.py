@@ -0,0 +1,71 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import VersionStamp
+
+RECIPES_VERSION = 'recipes'
+CATALOG_VERSION = 'catalog'
+SIMILARITY_VERSION = 'similarity'
+INGREDIENTS_VERSION = 'ingredients'
+RECIPE_INGREDIENTS_VERSION = 'recipe_ingredients'
+AUTH_VERSION = 'auth'
+
+
+def auth_version_key(user_id):
+    return f'auth:{user_id}'
+
+
+def ingredient_version_key(ingredient_id):
+    return f'ingredient:{ingredient_id}'
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def favorites_version_key(user_id):
+    return f'favorites:{user_id}'
+
+
+def cart_version_key(user_id):
+    return f'cart:{user_id}'
+
+
+def subscriptions_version_key(user_id):
+    return f'subscriptions:{user_id}'
+
+
+def user_version_keys(user):
+    if not user or not user.is_authenticated:
+        return []
+    return [
+        favorites_version_key(user.id),
+        cart_version_key(user.id),
+        subscriptions_version_key(user.id),
+    ]
+
+
+def bump_versions(*keys):
+    # Существующие счетчики повышаются одним UPDATE, недостающие создаются
+    keys = set(keys)
+    if not keys:
+        return
+    VersionStamp.objects.filter(key__in=keys).update(version=F('version') + 1)
+    existing = set(
+        VersionStamp.objects.filter(key__in=keys).values_list('key', flat=True)
+    )
+    for key in keys - existing:
+        try:
+            with transaction.atomic():
+                VersionStamp.objects.create(key=key, version=1)
+        except IntegrityError:
+            VersionStamp.objects.filter(key=key).update(
+                version=F('version') + 1
+            )
+
+
+def get_versions(*keys):
+    stored_versions = dict(
+        VersionStamp.objects.filter(key__in=keys).values_list('key', 'version')
+    )
+    return [stored_versions.get(key, 0) for key in keys]